@@ -1,9 +1,10 @@
-import gzip
-import json
 import sys
 from pathlib import Path
 
 import ipal_iids.settings as settings
+from ipal_iids.cache import open_cache
+from ipal_iids.compression import is_compressed, open_compressed
+from ipal_iids.reader import read_messages
 
 
 class Combiner:
@@ -11,6 +12,8 @@ class Combiner:
     _description = ""
     _requires_training = True
     _metacombiner_default_settings = {"model-file": None}
+    # Runtime state saved in checkpoints
+    _checkpoint_attributes = []
 
     def __init__(self):
         self.settings = settings.combiner
@@ -31,13 +34,23 @@ class Combiner:
         filename = str(filename)
         if filename is None:
             return None
-        elif filename.endswith(".gz"):
-            return gzip.open(filename, mode)
+        elif is_compressed(filename):
+            return open_compressed(filename, mode)
         elif filename == "-":
             return sys.stdin
         else:
             return open(filename, mode)
 
+    def _read_messages(self, filename):
+        # Stream the parsed messages of a (training) file one by one
+        cache = open_cache(filename)
+        if cache is not None:
+            yield from cache.messages()
+            return
+
+        with self._open_file(filename) as f:
+            yield from read_messages(f)
+
     def _relative_to_config(self, file: str) -> Path:
         """
         translate string of a file path to the resolved Path when
@@ -77,12 +90,9 @@ class Combiner:
         annotations = []
 
         settings.logger.info("Loading combiner training file")
-        with self._open_file(file, "r") as f:
-            for line in f.readlines():
-                js = json.loads(line)
-
-                events.append(self._get_activations(js["alerts"], js["scores"]))
-                annotations.append(js["malicious"] is not False)
+        for js in self._read_messages(file):
+            events.append(self._get_activations(js["alerts"], js["scores"]))
+            annotations.append(js["malicious"] is not False)
 
         return events, annotations
 
@@ -92,6 +102,14 @@ class Combiner:
     def combine(self, alerts, scores):
         raise NotImplementedError
 
+    # runtime state of the live detection for checkpoints, see MetaIDS.get_checkpoint
+    def get_checkpoint(self):
+        return {attr: getattr(self, attr) for attr in self._checkpoint_attributes}
+
+    def restore_checkpoint(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
     def save_trained_model(self):
         raise NotImplementedError
 
@@ -37,18 +37,15 @@ class HeuristicCombiner(Combiner):
         self.model = {}
 
         settings.logger.info("Loading combiner training file and fitting combiner")
-        with self._open_file(file, "r") as f:
-            for line in f.readlines():
-                js = json.loads(line)
-
-                if self.keys is None:
-                    self.keys = sorted(js["scores"].keys())
-                    self.model = {input: [0, 0] for input in self._get_input_order()}
-
-                # Count heuristic
-                vector = tuple(self._get_activations(js["alerts"]))
-                malicious = int(js["malicious"] is not False)
-                self.model[vector][malicious] += 1
+        for js in self._read_messages(file):
+            if self.keys is None:
+                self.keys = sorted(js["scores"].keys())
+                self.model = {input: [0, 0] for input in self._get_input_order()}
+
+            # Count heuristic
+            vector = tuple(self._get_activations(js["alerts"]))
+            malicious = int(js["malicious"] is not False)
+            self.model[vector][malicious] += 1
 
     def combine(self, alerts, scores):
         vector = tuple(self._get_activations(alerts))
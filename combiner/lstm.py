@@ -1,4 +1,3 @@
-import json
 import logging
 
 # Silence tensorflow
@@ -31,6 +30,7 @@ class LSTMCombiner(Combiner):
         "use_scores": False,
         "verbose": 0,
     }
+    _checkpoint_attributes = ["buffer"]
 
     def __init__(self):
         super().__init__()
@@ -67,23 +67,20 @@ class LSTMCombiner(Combiner):
         annotations = []
 
         settings.logger.info("Loading combiner training file")
-        with self._open_file(file, "r") as f:
-            for line in f.readlines():
-                js = json.loads(line)
-
-                if self.keys is None:
-                    self.keys = sorted(js["scores"].keys())
-
-                # Manage buffer
-                buffer.append(self._get_activations(js["alerts"], js["scores"]))
-                if len(buffer) < self.window_size:
-                    continue
-                elif len(buffer) > self.window_size:
-                    buffer.pop(0)
-
-                # Add training sequence
-                seq.append(buffer[:: -self.settings["stride"]])
-                annotations.append(js["malicious"] is not False)
+        for js in self._read_messages(file):
+            if self.keys is None:
+                self.keys = sorted(js["scores"].keys())
+
+            # Manage buffer
+            buffer.append(self._get_activations(js["alerts"], js["scores"]))
+            if len(buffer) < self.window_size:
+                continue
+            elif len(buffer) > self.window_size:
+                buffer.pop(0)
+
+            # Add training sequence
+            seq.append(buffer[:: -self.settings["stride"]])
+            annotations.append(js["malicious"] is not False)
 
         self.model = self._lstm_model(len(self.keys))
         settings.logger.info(f"Training LSTM for {self.settings['epochs']} epochs...")
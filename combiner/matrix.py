@@ -14,6 +14,7 @@ class MatrixCombiner(Combiner):
         "keys": [],  # name of the IIDSs determining the order of the weihts
         "lookahead": 0,  # Steps to look into the "future" (requires ipal-extend-alarms)
     }
+    _checkpoint_attributes = ["_latest_alerts"]
 
     def __init__(self):
         super().__init__()
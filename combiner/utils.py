@@ -1,27 +1,23 @@
-from .default import AnyCombiner
-from .gurobi import GurobiCombiner
-from .heuristic import HeuristicCombiner
-from .logisticregression import LogisticRegressionCombiner
-from .lstm import LSTMCombiner
-from .matrix import MatrixCombiner
-from .mlp import MLPCombiner
-from .svm import SVMCombiner
+from ipal_iids.registry import LazyRegistry
 
-combiners = [
-    # Default
-    AnyCombiner,  # Remains for simplicity as default combiner
-    # Unsupervised & Timeaware
-    MatrixCombiner,  # AllCombiner TemporalCombiner MajorityCombiner WeightsCombiner
-    # Supervised & Point-based
-    GurobiCombiner,
-    HeuristicCombiner,
-    LogisticRegressionCombiner,
-    MLPCombiner,
-    SVMCombiner,
-    # Supervised & Timeaware
-    LSTMCombiner,
-]
+# Combiners are only imported once they are used (name -> module.class)
+combiners = LazyRegistry(
+    {
+        # Default
+        "Any": "combiner.default.AnyCombiner",  # Remains for simplicity as default combiner
+        # Unsupervised & Timeaware
+        "Matrix": "combiner.matrix.MatrixCombiner",  # AllCombiner TemporalCombiner MajorityCombiner WeightsCombiner
+        # Supervised & Point-based
+        "Gurobi": "combiner.gurobi.GurobiCombiner",
+        "Heuristic": "combiner.heuristic.HeuristicCombiner",
+        "LogisticRegression": "combiner.logisticregression.LogisticRegressionCombiner",
+        "MLP": "combiner.mlp.MLPCombiner",
+        "SVM": "combiner.svm.SVMCombiner",
+        # Supervised & Timeaware
+        "LSTM": "combiner.lstm.LSTMCombiner",
+    }
+)
 
 
 def get_all_combiner():
-    return {combiner._name: combiner for combiner in combiners}
+    return combiners
@@ -1,9 +1,9 @@
-import json
-
+import numpy as np
 from ar import arsel
 
 import ipal_iids.settings as settings
 from ids.ids import MetaIDS
+from ipal_iids.reader import read_chunks
 
 
 class Autoregression(MetaIDS):
@@ -21,6 +21,7 @@ class Autoregression(MetaIDS):
         "eval": False,
     }
     _supports_preprocessor = False
+    _checkpoint_attributes = ["previous"]
 
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -35,21 +36,18 @@ class Autoregression(MetaIDS):
         return sum([val * coeff for val, coeff in zip(values, coefficients[::-1])])
 
     def train(self, ipal=None, state=None):
-        training_data = []
-
-        # Load training data for each sensor
-        with self._open_file(state) as f:
-            for line in f.readlines():
-                cur_state = json.loads(line)
-
-                if self.settings["sensor"] in cur_state["state"]:
-                    training_data.append(cur_state["state"][self.settings["sensor"]])
-                else:
-                    settings.logger.info(
-                        "Sensor {} not in current state.".format(
-                            self.settings["sensor"]
-                        )
-                    )
+        def get_sensor(cur_state):
+            if self.settings["sensor"] in cur_state["state"]:
+                return cur_state["state"][self.settings["sensor"]]
+
+            settings.logger.info(
+                "Sensor {} not in current state.".format(self.settings["sensor"])
+            )
+            return None
+
+        # Load training data for each sensor into compact numpy blocks
+        chunks = list(read_chunks(self._read_messages(state), get_sensor))
+        training_data = np.concatenate(chunks) if len(chunks) > 0 else np.empty(0)
 
         if self.settings["firstN"] is None:
             settings.logger.info("Setting firstN for default 80%")
@@ -77,7 +75,7 @@ class Autoregression(MetaIDS):
 
         self.delta = 0
 
-        for v in training_data[self.settings["firstN"] :]:
+        for v in training_data[self.settings["firstN"] :].tolist():
             self.previous.append(v)
             if self.model.submean:
                 self.previous[-1] -= self.model.mu[0]
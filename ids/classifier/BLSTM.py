@@ -39,6 +39,7 @@ class BLSTM(FeatureIDS):
         "verbose": 1,
         "adjust": True,  # to use the extend-alarms.py script afterward
     }
+    _checkpoint_attributes = ["buffer"]
 
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -82,7 +83,7 @@ class BLSTM(FeatureIDS):
         return model
 
     # the IDS is given the path to file(s) containing its requested training data
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         if ipal and state:
             settings.logger.error("Only state or message supported")
             exit(1)
@@ -90,7 +91,10 @@ class BLSTM(FeatureIDS):
         if state is None:
             state = ipal
 
-        events, annotation, _ = super().train(state=state)
+        return super().train_begin(state=state)
+
+    def train_finish(self):
+        events, annotation, _ = super().train_finish()
 
         events = np.array(events)
         annotation = np.array([a is not False for a in annotation])
@@ -205,6 +209,10 @@ class BLSTM(FeatureIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def partition_key(self, msg):
+        # Sequences of feature vectors are collected across messages
+        return ""
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
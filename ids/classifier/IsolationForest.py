@@ -26,7 +26,7 @@ class IsolationForest(FeatureIDS):
         self.ifc = None
 
     # the IDS is given the path to file(s) containing its requested training data
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         if ipal and state:
             settings.logger.error("Only state or message supported")
             exit(1)
@@ -34,7 +34,10 @@ class IsolationForest(FeatureIDS):
         if state is None:
             state = ipal
 
-        events, _, _ = super().train(state=state)  # Does not train on annotations
+        return super().train_begin(state=state)
+
+    def train_finish(self):
+        events, _, _ = super().train_finish()  # Does not train on annotations
 
         # Learn Isolation Forest
         settings.logger.info("Learning Isolation Forest")
@@ -63,6 +66,23 @@ class IsolationForest(FeatureIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def new_state_batch(self, msgs):
+        indices, states = self._preprocess_batch(msgs)
+        results = [(False, None)] * len(msgs)
+        if len(states) == 0:
+            return results
+
+        # Returns -1 for outliers and 1 for inliers.
+        for i, prediction in zip(indices, self.ifc.predict(states)):
+            alert = bool(prediction == -1)
+            results[i] = (alert, 1 if alert else 0)
+
+        return results
+
+    def new_ipal_batch(self, msgs):
+        # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
+        return self.new_state_batch(msgs)
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
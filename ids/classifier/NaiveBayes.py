@@ -27,7 +27,7 @@ class NaiveBayes(FeatureIDS):
         self.nbc = None
         self.classes = None
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         if ipal and state:
             settings.logger.error("Only state or message supported")
             exit(1)
@@ -35,7 +35,10 @@ class NaiveBayes(FeatureIDS):
         if state is None:
             state = ipal
 
-        events, annotation, _ = super().train(state=state)
+        return super().train_begin(state=state)
+
+    def train_finish(self):
+        events, annotation, _ = super().train_finish()
         annotation = [a is not False for a in annotation]
 
         if len(set(annotation)) <= 1:
@@ -85,6 +88,29 @@ class NaiveBayes(FeatureIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def new_state_batch(self, msgs):
+        indices, states = self._preprocess_batch(msgs)
+        results = [(False, False)] * len(msgs)
+        if len(states) == 0:
+            return results
+
+        alerts = self.nbc.predict(states)
+
+        if self.settings["no-probability"]:  # takes less time
+            for i, alert in zip(indices, alerts):
+                results[i] = (bool(alert), 1 if alert else 0)
+
+        else:
+            probabilities = self.nbc.predict_proba(states)[:, self.classes.index(True)]
+            for i, alert, probability in zip(indices, alerts, probabilities):
+                results[i] = (bool(alert), probability)
+
+        return results
+
+    def new_ipal_batch(self, msgs):
+        # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
+        return self.new_state_batch(msgs)
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
@@ -1,14 +1,89 @@
-import json
 import math
+import operator
 import time
 from collections.abc import Iterable
 
+import numpy as np
+
+import ipal_iids.codec as codec
 import ipal_iids.settings as settings
+from preprocessors.affine import fuse_affine
+from preprocessors.preprocessor import to_array, to_rows
 from preprocessors.utils import get_all_preprocessors
 
 from .ids import MetaIDS
 
 
+class FeaturePlan:
+    # Extraction of the features of a message, compiled once from the feature paths (e.g.,
+    # "state;sensor"). Features sharing their parent (e.g., all sensors in "state") are fetched
+    # with a single itemgetter call and converted to floats in one pass. Messages the plan does
+    # not cover (missing indices, None, NaN, or non-numeric values) are extracted feature by
+    # feature with FeatureIDS._get_val, which handles and logs them as before.
+
+    # Consecutive uncovered messages after which the plan is paused, and the number of
+    # messages it is paused for before it is tried again (e.g., if a sensor recovers)
+    MISSES = 64
+    PAUSE = 1024
+
+    def __init__(self, features):
+        self.features = features
+        self.hash = ["hash"] in features
+        self.n = len(features)
+        self._misses = 0
+        self._paused = 0  # Remaining messages the plan is not tried for
+
+        parents = {}
+        for i, feature in enumerate(features):
+            parents.setdefault(tuple(feature[:-1]), []).append((i, feature[-1]))
+
+        # (parent path, key of a single value or getter of a tuple of values, row indices)
+        self.groups = []
+        for parent, entries in parents.items():
+            keys = [key for _, key in entries]
+            getter = keys[0] if len(keys) == 1 else operator.itemgetter(*keys)
+            self.groups.append((parent, getter, [i for i, _ in entries]))
+
+    def extract(self, msg):
+        # Returns the features as a list of floats or None if the message is not covered
+        if self.n == 0:
+            return None
+        if self._paused > 0:
+            self._paused -= 1
+            return None
+
+        try:
+            if len(self.groups) == 1:
+                row = self._values(msg, *self.groups[0][:2])
+            else:
+                row = [0.0] * self.n
+                for parent, getter, indices in self.groups:
+                    for i, value in zip(indices, self._values(msg, parent, getter)):
+                        row[i] = value
+        except (KeyError, IndexError, TypeError, ValueError):
+            row = None
+
+        if row is not None:
+            total = sum(row)
+            if total != total:  # NaN
+                row = None
+
+        if row is None:
+            self._misses += 1
+            if self._misses >= self.MISSES:  # E.g., categorical string features
+                self._paused = self.PAUSE
+        else:
+            self._misses = 0
+        return row
+
+    def _values(self, msg, parent, getter):
+        for index in parent:
+            msg = msg[index]
+        if isinstance(getter, str):
+            return [float(msg[getter])]
+        return list(map(float, getter(msg)))
+
+
 class FeatureIDS(MetaIDS):
     _requires = ["train.ipal", "train.state", "live.ipal", "live.state"]
     _featureids_default_settings = {
@@ -21,6 +96,9 @@ class FeatureIDS(MetaIDS):
     _supports_preprocessor = True
 
     preprocessors = []
+    _plan = None  # FeaturePlan compiled from self.features
+    _stages = None  # Preprocessors of the live detection with affine ones fused
+    _widths = None  # Width of each value after the preprocessors (see _compile_layout)
 
     def __flatten(self, array):
         # https://stackoverflow.com/questions/2158395/flatten-an-irregular-list-of-lists?page=1&tab=votes#tab-top
@@ -66,63 +144,137 @@ class FeatureIDS(MetaIDS):
             return msg
 
     def _extract_features(self, msg):
-        if ["hash"] in self.features:
+        if self._plan is None or self._plan.features is not self.features:
+            self._plan = FeaturePlan(self.features)
+
+        if self._plan.hash:
             self._add_msg_hash(msg, nbytes=2)
 
-        return [self._get_val(msg, feature) for feature in self.features]
+        state = self._plan.extract(msg)
+        if state is None:
+            state = [self._get_val(msg, feature) for feature in self.features]
+        return state
 
-    # the IDS is given the path to file(s) containing its requested training data
-    def train(self, state=None):
+    # FeatureIDSs train on the state file. Subclasses decide between ipal and state in
+    # train_begin and receive the preprocessed training data from train_finish.
+    def train_begin(self, ipal=None, state=None):
         # Build preprocessors from settings
         for pre in self.settings["preprocessors"]:
             apply = [f in pre["features"] for f in self.settings["features"]]
-            self.preprocessors.append(get_all_preprocessors()[pre["method"]](apply))
+            preprocessor = get_all_preprocessors()[pre["method"]](apply)
+            preprocessor.settings.update(
+                {k: v for k, v in pre.items() if k not in ["method", "features"]}
+            )
+            self.preprocessors.append(preprocessor)
 
         self.features = [f.split(";") for f in self.settings["features"]]
 
-        events = []
-        annotations = []
-        timestamps = []
+        self._events = []
+        self._annotations = []
+        self._timestamps = []
 
         # Load features from training file
-        start = time.time()
-        settings.logger.info("Loading training file started at {}".format(start))
+        self._loading_start = time.time()
+        settings.logger.info(
+            "Loading training file started at {}".format(self._loading_start)
+        )
+
+        return state
 
-        with self._open_file(state) as state_file:
-            for msg in state_file.readlines():
-                msg = json.loads(msg)
-                state = self._extract_features(msg)
+    def train_step(self, msg):
+        state = self._extract_features(msg)
 
-                if None not in state or self.settings["allow-none"]:
-                    events.append(state)
-                    annotations.append(msg["malicious"])
-                    timestamps.append(msg["timestamp"])
-                else:
-                    settings.logger.info("None in state. Skipping message!")
+        if None not in state or self.settings["allow-none"]:
+            self._events.append(state)
+            self._annotations.append(msg["malicious"])
+            self._timestamps.append(msg["timestamp"])
+        else:
+            settings.logger.info("None in state. Skipping message!")
+
+    def train_columns(self, cache):
+        # Numeric features are taken from the cached columns directly. Features that need
+        # the message (hash, strings, missing values) fall back to train_step.
+        if ["hash"] in self.features:
+            return False
+
+        columns = [cache.numeric(feature) for feature in self.features]
+        if any(column is None for column in columns):
+            return False
+        if cache.column(["malicious"]) is None or cache.column(["timestamp"]) is None:
+            return False
+
+        for column in columns:
+            nans = np.isnan(column)
+            if nans.any():
+                settings.logger.warning(
+                    "Found {} Nan in data. Replacing with '0'".format(nans.sum())
+                )
+                column[nans] = 0
+
+        # Kept as array for the vectorized preprocessors (see train_finish)
+        if len(columns) > 0:
+            self._events = np.column_stack(columns)
+        else:
+            self._events = np.empty((len(cache), 0))
+        self._annotations = cache.values(["malicious"])
+        self._timestamps = cache.values(["timestamp"])
+
+        return True
+
+    def train_finish(self):
+        events = self._events
+        annotations = self._annotations
+        timestamps = self._timestamps
+        del self._events, self._annotations, self._timestamps
 
         end = time.time()
         settings.logger.info(
-            "Loading training file ended at {} ({}s)".format(end, end - start)
+            "Loading training file ended at {} ({}s)".format(
+                end, end - self._loading_start
+            )
         )
 
-        # Train and apply preprocessors
-        settings.logger.info("Raw features: {}".format(events[0]))
+        # Train and apply preprocessors. As long as all preprocessors are vectorized, the
+        # events are kept as one 2D array (see Preprocessor.fit_batch), afterwards as list.
+        batch = events if isinstance(events, np.ndarray) else None
+        # Indices of the events not removed by preprocessors
+        keep = np.arange(len(events))
+        vectorized = True
+
+        settings.logger.info("Raw features: {}".format(self._first(batch, events)))
         for pre in self.preprocessors:
-            pre.fit(events)
-            events = [pre.transform(e) for e in events]
-
-            # Remove events, annotations and timestamps if event got removed
-            events, annotations, timestamps = zip(
-                *[
-                    (e, a, t)
-                    for e, a, t in zip(events, annotations, timestamps)
-                    if e is not None
-                ]
+            vectorized = vectorized and pre._vectorized
+
+            if vectorized:
+                if batch is None:
+                    batch = to_array(events)
+                pre.fit_batch(batch)
+                batch, valid = pre.transform_batch(batch)
+                batch = to_array(batch)  # Numeric again, e.g., after encoding labels
+
+            else:
+                if batch is not None:
+                    events, batch = to_rows(batch), None
+                pre.fit(events)
+                events = [pre.transform(e) for e in events]
+                valid = np.array([e is not None for e in events], dtype=bool)
+                events = [e for e in events if e is not None]
+
+            # Remove annotations and timestamps if event got removed
+            keep = keep[valid]
+            settings.logger.info(
+                "{} features: {}".format(pre._name, self._first(batch, events))
             )
-            assert len(events) == len(annotations) == len(timestamps)
-            settings.logger.info("{} features: {}".format(pre._name, events[0]))
 
-        events = [list(self.__flatten(e)) for e in events]
+        if batch is not None:
+            events = to_rows(batch)
+        else:
+            self._compile_layout()
+            events = [self._flatten(e) for e in events]
+        if len(keep) < len(annotations):
+            annotations = [annotations[i] for i in keep]
+            timestamps = [timestamps[i] for i in keep]
+        assert len(events) == len(annotations) == len(timestamps)
         settings.logger.info("Final features: {}".format(events[0]))
 
         end2 = time.time()
@@ -142,7 +294,7 @@ class FeatureIDS(MetaIDS):
             ) as f:
                 for e, a, t in zip(events[:N], annotations[:N], timestamps[:N]):
                     f.write(
-                        json.dumps(
+                        codec.dumps(
                             {
                                 "timestamp": t,
                                 "state": {i: e[i] for i in range(len(e))},
@@ -154,22 +306,106 @@ class FeatureIDS(MetaIDS):
 
         for pre in self.preprocessors:
             pre.reset()  # reset preprocessors before going live
+        self._compile_preprocessors()
 
         return events[:N], annotations[:N], timestamps[:N]
 
+    def _first(self, batch, events):
+        # First event for logging
+        return to_rows(batch[:1])[0] if batch is not None else events[0]
+
     def new_state_msg(self, msg):
         state = self._extract_features(msg)
         if None in state and not self.settings["allow-none"]:
             settings.logger.info("None in state. Skipping message")
             return None
 
-        for pre in self.preprocessors:
+        stages = self.preprocessors if self._stages is None else self._stages
+        for pre in stages:
             state = pre.transform(state)
+            if state is None:  # Dropped or aggregated by the preprocessor
+                return None
 
-        if state is None:
+        # Preprocessors may introduce None as well, e.g., for unknown labels
+        state = self._flatten(state)
+        if None in state and not self.settings["allow-none"]:
+            settings.logger.info("None in preprocessed state. Skipping message")
             return None
-        else:
+        return state
+
+    def _compile_preprocessors(self):
+        # Prepares the fitted preprocessors for the live detection
+        self._stages = fuse_affine(self.preprocessors)
+        self._compile_layout()
+
+    def _compile_layout(self):
+        # Preprocessors such as categorical replace values by lists. Their widths (None for
+        # single values, see Preprocessor.output_widths) give the offset of each value in
+        # the flat feature vector, which is then filled without recursion.
+        widths = [None] * len(self.settings["features"])
+        for pre in self.preprocessors:
+            widths = pre.output_widths(widths)
+            if widths is None:  # Unknown layout, flattened recursively
+                break
+
+        self._widths = widths
+        if widths is not None:
+            self._offsets = []
+            self._width = 0
+            for width in widths:
+                self._offsets.append(self._width)
+                self._width += 1 if width is None else width
+            self._nested = [
+                (i, offset, width)
+                for i, (offset, width) in enumerate(zip(self._offsets, widths))
+                if width is not None
+            ]
+
+    def _flatten(self, state):
+        if self._widths is None or len(state) != len(self._widths):
             return list(self.__flatten(state))
+        if len(self._nested) == 0:
+            return state if isinstance(state, list) else list(state)
+
+        flat = [None] * self._width
+        for value, offset in zip(state, self._offsets):
+            flat[offset] = value
+        for i, offset, width in self._nested:
+            if len(state[i]) != width:
+                return list(self.__flatten(state))
+            flat[offset : offset + width] = state[i]
+        return flat
+
+    def partition_key(self, msg):
+        # Feature extraction is independent across messages unless a preprocessor keeps state
+        if any(pre._stateful for pre in self.preprocessors):
+            return ""
+        return None
+
+    def _preprocess_batch(self, msgs):
+        # Preprocess a batch of messages in order. Returns the indices of the messages that
+        # yielded a feature vector together with the feature vectors themselves.
+        indices = []
+        states = []
+
+        for i, msg in enumerate(msgs):
+            state = FeatureIDS.new_state_msg(self, msg)
+            if state is not None:
+                indices.append(i)
+                states.append(state)
+
+        return indices, states
+
+    def get_checkpoint(self):
+        state = super().get_checkpoint()
+        state["preprocessors"] = [pre.get_checkpoint() for pre in self.preprocessors]
+        return state
+
+    def restore_checkpoint(self, state):
+        state = dict(state)
+        for pre, pre_state in zip(self.preprocessors, state.pop("preprocessors", [])):
+            pre.restore_checkpoint(pre_state)
+        super().restore_checkpoint(state)
 
     def save_trained_model(self):
         model = {
@@ -194,3 +430,4 @@ class FeatureIDS(MetaIDS):
             )
 
         assert len(self.preprocessors) == len(self.settings["preprocessors"])
+        self._compile_preprocessors()
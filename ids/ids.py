@@ -1,10 +1,13 @@
-import gzip
 import hashlib
 import json
 import sys
 from pathlib import Path
 
 import ipal_iids.settings as settings
+from ipal_iids.cache import open_cache
+from ipal_iids.compression import is_compressed, open_compressed
+from ipal_iids.memory import approximate_size
+from ipal_iids.reader import read_messages
 
 
 class MetaIDS:
@@ -13,6 +16,11 @@ class MetaIDS:
     _requires = []
     _metaids_default_settings = {"model-file": "./model"}
     _supports_preprocessor = False
+    _disabled = False  # Set once the IDS exceeded its hard memory limit
+    # State is kept per host, may be sharded by --shard-key
+    _host_partitioned = False
+    # Runtime state saved in checkpoints (see get_checkpoint)
+    _checkpoint_attributes = []
 
     def __init__(self, name=None):
         self._name = name
@@ -34,13 +42,23 @@ class MetaIDS:
         filename = str(filename)
         if filename is None:
             return None
-        elif filename.endswith(".gz"):
-            return gzip.open(filename, mode)
+        elif is_compressed(filename):
+            return open_compressed(filename, mode)
         elif filename == "-":
             return sys.stdin
         else:
             return open(filename, mode)
 
+    def _read_messages(self, filename):
+        # Stream the parsed messages of a (training) file one by one
+        cache = open_cache(filename)
+        if cache is not None:
+            yield from cache.messages()
+            return
+
+        with self._open_file(filename) as f:
+            yield from read_messages(f)
+
     def _relative_to_config(self, file: str) -> Path:
         """
         translate string of a file path to the resolved Path when
@@ -85,10 +103,36 @@ class MetaIDS:
             )
         return dataformat in self._requires
 
-    # the IDS is given the path to file(s) containing its requested training data
+    # the IDS is given the path to file(s) containing its requested training data. IDSs implementing
+    # the incremental training functions below are trained by streaming the training file through them.
     def train(self, ipal=None, state=None):
+        filename = self.train_begin(ipal=ipal, state=state)
+
+        if filename is not None:
+            cache = open_cache(filename)
+            if cache is None or not self.train_columns(cache):
+                for msg in self._read_messages(filename):
+                    self.train_step(msg)
+
+        return self.train_finish()
+
+    # incremental training allows training multiple IDSs on a single pass over the training data.
+    # train_begin is given the same paths as train and returns the file the IDS trains on (or None),
+    # train_step is called with each message of that file, and train_finish after the last message.
+    def train_begin(self, ipal=None, state=None):
+        raise NotImplementedError
+
+    def train_step(self, msg):
+        raise NotImplementedError
+
+    def train_finish(self):
         raise NotImplementedError
 
+    # instead of single messages, an IDS may take its training data from the columns of a cached
+    # training file (see ipal_iids/cache.py) after train_begin. Return False to get the messages.
+    def train_columns(self, cache):
+        return False
+
     # if a new ipal message is available during the intrustion detection phase, this function is called
     # with the message in json format. Return if an alert is thrown by this IDS
     def new_ipal_msg(self, msg):
@@ -99,6 +143,48 @@ class MetaIDS:
     def new_state_msg(self, msg):
         raise NotImplementedError
 
+    # during the live phase, messages may be handed over in batches. This function is called with a list
+    # of ipal messages and returns one (alert, score) tuple per message in the same order. IDSs that can
+    # process multiple messages at once (e.g., a single classifier call) may override this function.
+    def new_ipal_batch(self, msgs):
+        return [self.new_ipal_msg(msg) for msg in msgs]
+
+    # same as new_ipal_batch but for a list of state messages
+    def new_state_batch(self, msgs):
+        return [self.new_state_msg(msg) for msg in msgs]
+
+    # during sharded live detection, messages are distributed across multiple copies of each IDS. All
+    # messages with the same partition key are handed to the same copy, such that state the IDS keeps
+    # across messages (e.g., per host pair) stays consistent. Return None if the IDS keeps no state
+    # between messages. By default, all messages are handed to a single copy. A --shard-key other
+    # than "ids" replaces non-empty keys, and the single partition of IDSs with _host_partitioned.
+    def partition_key(self, msg):
+        return ""
+
+    # approximate size in bytes of the state and model of the IDS, checked periodically during the
+    # live phase (see ipal_iids/memory.py). IDSs may override this function with a cheaper estimate.
+    def memory_usage(self):
+        return approximate_size(
+            {k: v for k, v in self.__dict__.items() if k not in ["settings"]}
+        )
+
+    # eviction policy called if the IDS exceeds its "memory-soft-limit". Shrink the state of the IDS
+    # to about limit bytes, e.g., by dropping the least recently used entries. Once the IDS exceeds its
+    # "memory-hard-limit", it is disabled and this function is called with limit 0.
+    def evict(self, limit):
+        raise NotImplementedError
+
+    # runtime state of the live detection that is not part of the trained model (e.g., sliding windows)
+    # for periodic checkpoints (see ipal_iids/checkpoint.py). By default, the attributes listed in
+    # _checkpoint_attributes are saved, which have to be picklable.
+    def get_checkpoint(self):
+        return {attr: getattr(self, attr) for attr in self._checkpoint_attributes}
+
+    # restores the runtime state returned by get_checkpoint after the trained model was loaded
+    def restore_checkpoint(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
     def save_trained_model(self):
         raise NotImplementedError
 
@@ -20,6 +20,7 @@ class InterArrivalTimeMean(MetaIDS):
     _requires = ["train.ipal", "live.ipal"]
     _interarrivaltimemean_default_settings = {"N": 4, "W": 5, "alert_unknown": True}
     _supports_preprocessor = False
+    _checkpoint_attributes = ["sliding_windows"]
 
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -39,20 +40,22 @@ class InterArrivalTimeMean(MetaIDS):
         identifier += msg["data"].keys()
         return "-".join([str(i) for i in identifier])
 
-    def train(self, ipal=None, state=None):
-        events = {}
+    def train_begin(self, ipal=None, state=None):
+        self._events = {}
+        return ipal
 
+    def train_step(self, ipal_msg):
         # Load timestamps for each identifier
-        with self._open_file(ipal) as f:
-            for line in f.readlines():
-                ipal_msg = json.loads(line)
+        timestamp = ipal_msg["timestamp"]
+        identifier = self._get_identifier(ipal_msg)
 
-                timestamp = ipal_msg["timestamp"]
-                identifier = self._get_identifier(ipal_msg)
+        if identifier not in self._events:
+            self._events[identifier] = []
+        self._events[identifier].append(timestamp)
 
-                if identifier not in events:
-                    events[identifier] = []
-                events[identifier].append(timestamp)
+    def train_finish(self):
+        events = self._events
+        del self._events
 
         # Calculate inter-arrival time and mean model
         settings.logger.info("Inter-arrival-time mean models:")
@@ -131,6 +134,23 @@ class InterArrivalTimeMean(MetaIDS):
 
             return alert, iet_mean - self.mean_model[identifier]["mu"]
 
+    def partition_key(self, msg):
+        # Sliding windows are kept per identifier
+        return self._get_identifier(msg)
+
+    def evict(self, limit):
+        # Empty the sliding windows of the least recently seen messages, they are refilled
+        # (without alerts) once these messages occur again
+        def last_seen(identifier):
+            timestamps = self.sliding_windows[identifier]["timestamp"]
+            return timestamps[-1] if len(timestamps) > 0 else float("-inf")
+
+        for identifier in sorted(self.sliding_windows, key=last_seen):
+            if self.memory_usage() <= limit:
+                break
+            for window in self.sliding_windows[identifier].values():
+                window.clear()
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
@@ -506,6 +506,18 @@ class incStatDB:
         hdrs = ["radius" + ID, "magnitude" + ID]
         return [str(Lambda) + "_" + s for s in hdrs]
 
+    # removes the n least recently updated streams and their covariances.
+    # returns number of removed streams.
+    def evict(self, n):
+        oldest = sorted(self.HT.items(), key=lambda item: item[1].lastTimestamp)[:n]
+        for key, incS in oldest:
+            for cov in incS.covs:
+                for other in cov.incStats:
+                    if other is not incS and cov in other.covs:
+                        other.covs.remove(cov)
+            del self.HT[key]
+        return len(oldest)
+
     # cleans out records that have a weight less than the cutoff.
     # returns number or removed records.
     def cleanOutOldRecords(self, cutoffWeight, curTime):
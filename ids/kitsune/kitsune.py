@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
-import json
+import math
 from typing import Any, Dict
 
+import ipal_iids.settings as settings
 from ids.ids import MetaIDS
+from ipal_iids.memory import approximate_size
 
 from .feature_extractor import FeatureExtractor
 from .KitNET.KitNET import KitNET
@@ -92,6 +94,10 @@ class Kitsune(MetaIDS):
         ],
     }
     _supports_preprocessor = False
+    # Streams of the incremental statistics are kept per host
+    _host_partitioned = True
+    # Incremental statistics of the streams
+    _checkpoint_attributes = ["_fe", "_ts_offset"]
     _fe: FeatureExtractor
     _detector: KitNET
 
@@ -102,7 +108,7 @@ class Kitsune(MetaIDS):
         self._last_training_ts_delta = 0.0
         self._ts_offset = 0.0
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         self._fe = FeatureExtractor(
             self.settings["features_regexp"],
             self.settings["lambdas"],
@@ -119,16 +125,18 @@ class Kitsune(MetaIDS):
             hidden_ratio=self.settings["hidden_ratio"],
         )
 
-        with self._open_file(ipal) as f:
-            for line in f.readlines():
-                ipal_msg = json.loads(line)
+        return ipal
 
-                ts = ipal_msg["timestamp"]
-                self._last_training_ts_delta = ts - self._last_training_ts
-                self._last_training_ts = ts
+    def train_step(self, ipal_msg):
+        ts = ipal_msg["timestamp"]
+        self._last_training_ts_delta = ts - self._last_training_ts
+        self._last_training_ts = ts
 
-                features = self._fe.extract_features(ipal_msg)
-                self._detector.train(features)
+        features = self._fe.extract_features(ipal_msg)
+        self._detector.train(features)
+
+    def train_finish(self):
+        pass
 
     def new_ipal_msg(self, msg: Dict[str, Any]):
         if self.settings["offset_live_timestamps"] and self._ts_offset == 0.0:
@@ -140,3 +148,19 @@ class Kitsune(MetaIDS):
         score = self._detector.execute(features)
 
         return (bool(score > self.settings["threshold"]), float(score))
+
+    def evict(self, limit: int):
+        # Drop the least recently updated streams of the incremental statistics, the
+        # autoencoders are kept
+        dbs = [stat["db"] for stat in self._fe._nstat._stats]
+        streams = sum(len(db.HT) for db in dbs)
+        tables = approximate_size(dbs)
+        excess = self.memory_usage() - limit
+        if streams == 0 or excess <= 0:
+            return
+
+        fraction = min(1.0, excess / max(tables, 1))
+        evicted = sum(db.evict(math.ceil(len(db.HT) * fraction)) for db in dbs)
+        settings.logger.info(
+            "Evicted {} of {} streams of {}".format(evicted, streams, self._name)
+        )
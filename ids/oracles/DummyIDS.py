@@ -18,7 +18,13 @@ class DummyIDS(MetaIDS):
         super().__init__(name=name)
         self._add_default_settings(self._optimalids_default_settings)
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
+        return None  # Nothing to train on
+
+    def train_step(self, msg):
+        pass
+
+    def train_finish(self):
         pass
 
     def new_ipal_msg(self, msg):
@@ -37,6 +43,9 @@ class DummyIDS(MetaIDS):
     def new_state_msg(self, msg):
         return self.new_ipal_msg(msg)
 
+    def partition_key(self, msg):
+        return None  # No state between messages
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
@@ -15,7 +15,13 @@ class OptimalIDS(MetaIDS):
         super().__init__(name=name)
         self._add_default_settings(self._optimalids_default_settings)
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
+        return None  # Nothing to train on
+
+    def train_step(self, msg):
+        pass
+
+    def train_finish(self):
         pass
 
     def new_ipal_msg(self, msg):
@@ -28,6 +34,9 @@ class OptimalIDS(MetaIDS):
         score = 1 if alert else 0
         return alert, score
 
+    def partition_key(self, msg):
+        return None  # No state between messages
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
@@ -30,30 +30,32 @@ class DecimalPlaces(MetaIDS):
             settings.logger.error(value)
             return None
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         # Figure out whether we train on ipal or state
         if ipal is not None and state is not None:
             settings.logger.warning("IPAL and State provided. Using state only!")
-        elif ipal is not None:
-            self.key = "data"
-            fd = ipal
-        elif state is not None:
+
+        if state is not None:
             self.key = "state"
-            fd = state
-
-        # Load trainig file and parse data
-        with self._open_file(fd) as f:
-            for line in f.readlines():
-                for k, v in json.loads(line)[self.key].items():
-                    decimal = self._get_decimal_places(v)
-                    if decimal is None:
-                        continue
-
-                    if k not in self.mins:
-                        self.mins[k] = sys.maxsize
-                        self.maxs[k] = -1
-                    self.mins[k] = min(self.mins[k], decimal)
-                    self.maxs[k] = max(self.maxs[k], decimal)
+            return state
+        else:
+            self.key = "data"
+            return ipal
+
+    def train_step(self, msg):
+        for k, v in msg[self.key].items():
+            decimal = self._get_decimal_places(v)
+            if decimal is None:
+                continue
+
+            if k not in self.mins:
+                self.mins[k] = sys.maxsize
+                self.maxs[k] = -1
+            self.mins[k] = min(self.mins[k], decimal)
+            self.maxs[k] = max(self.maxs[k], decimal)
+
+    def train_finish(self):
+        pass
 
     def new_state_msg(self, msg):
         likelihood = 0
@@ -77,6 +79,9 @@ class DecimalPlaces(MetaIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def partition_key(self, msg):
+        return None  # No state between messages
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
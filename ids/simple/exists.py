@@ -18,27 +18,29 @@ class ExistsIDS(MetaIDS):
         self.exists = {}
         self.count = 0
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         # Figure out whether we train on ipal or state
         if ipal is not None and state is not None:
             settings.logger.warning("IPAL and State provided. Using state only!")
-        elif ipal is not None:
-            self.key = "data"
-            fd = ipal
-        elif state is not None:
+
+        if state is not None:
             self.key = "state"
-            fd = state
+            return state
+        else:
+            self.key = "data"
+            return ipal
+
+    def train_step(self, msg):
+        for k, v in msg[self.key].items():
+            if k in self.settings["exclude"]:
+                continue
 
-        # Load trainig file and parse data
-        with self._open_file(fd) as f:
-            for line in f.readlines():
-                for k, v in json.loads(line)[self.key].items():
-                    if k in self.settings["exclude"]:
-                        continue
+            if k not in self.exists:
+                self.exists[k] = set()
+            self.exists[k].add(v)
 
-                    if k not in self.exists:
-                        self.exists[k] = set()
-                    self.exists[k].add(v)
+    def train_finish(self):
+        pass
 
     def new_state_msg(self, msg):
         anomaly = False
@@ -64,6 +66,19 @@ class ExistsIDS(MetaIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def evict(self, limit):
+        # Stop checking the keys with the most distinct values (e.g., continuous sensors)
+        while len(self.exists) > 0 and self.memory_usage() > limit:
+            key = max(self.exists, key=lambda k: len(self.exists[k]))
+            settings.logger.warning(
+                "{} no longer checks {} ({} values)".format(
+                    self._name, key, len(self.exists[key])
+                )
+            )
+            del self.exists[key]
+            # The list may be shared with the default settings, extend a copy
+            self.settings["exclude"] = self.settings["exclude"] + [key]
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
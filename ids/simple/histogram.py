@@ -13,6 +13,7 @@ class Histogram(FeatureIDS):
         "threshold": 1.0,
         "discrete_threshold": 10,
     }
+    _checkpoint_attributes = ["_cur", "_buffer"]
 
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -40,14 +41,17 @@ class Histogram(FeatureIDS):
 
         return len(self._buffer[sensor]) == self.settings["window_size"]
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         if ipal is not None and state is not None:
             settings.logger.warning("Only state OR ipal supported. Using state now.")
         elif state is None:
             state = ipal
 
+        return super().train_begin(state=state)
+
+    def train_finish(self):
         # Call preprocessor
-        events, annotations, _ = super().train(state=state)
+        events, annotations, _ = super().train_finish()
 
         # Check input
         if len(set(annotations) - set([False])) > 0:
@@ -149,6 +153,10 @@ class Histogram(FeatureIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def partition_key(self, msg):
+        # Windows of all sensors are kept across messages
+        return ""
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
@@ -18,14 +18,17 @@ class MinMax(FeatureIDS):
         self.mins = {}
         self.deltas = {}
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         if ipal is not None and state is not None:
             settings.logger.warning("Only state OR ipal supported. Using state now.")
         elif state is None:
             state = ipal
 
+        return super().train_begin(state=state)
+
+    def train_finish(self):
         # Call preprocessor
-        events, annotations, _ = super().train(state=state)
+        events, annotations, _ = super().train_finish()
 
         # Check input
         if len(set(annotations) - set([False])) > 0:
@@ -13,6 +13,7 @@ class SteadyTime(FeatureIDS):
         "discrete_threshold": 10,
         "adjust": True,  # to use the extend-alarms.py script afterward
     }
+    _checkpoint_attributes = ["_cur", "_cur_time"]
 
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -47,14 +48,17 @@ class SteadyTime(FeatureIDS):
 
             return True, oldvalue, oldtime
 
-    def train(self, ipal=None, state=None):
+    def train_begin(self, ipal=None, state=None):
         if ipal is not None and state is not None:
             settings.logger.warning("Only state OR ipal supported. Using state now.")
         elif state is None:
             state = ipal
 
+        return super().train_begin(state=state)
+
+    def train_finish(self):
         # Call preprocessor
-        events, annotations, _ = super().train(state=state)
+        events, annotations, _ = super().train_finish()
 
         # Check input
         if len(set(annotations) - set([False])) > 0:
@@ -170,6 +174,10 @@ class SteadyTime(FeatureIDS):
         # There is no difference for this IDS in state or message format! It only depends on the configuration which features are used.
         return self.new_state_msg(msg)
 
+    def partition_key(self, msg):
+        # Steady times of all sensors are tracked across messages
+        return ""
+
     def save_trained_model(self):
         if self.settings["model-file"] is None:
             return False
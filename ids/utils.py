@@ -1,43 +1,29 @@
-from .autoregression.Autoregression import Autoregression
-from .classifier.BLSTM import BLSTM
-from .classifier.DecisionTree import DecisionTree
-from .classifier.ExtraTrees import ExtraTrees
-from .classifier.IsolationForest import IsolationForest
-from .classifier.NaiveBayes import NaiveBayes
-from .classifier.RandomForest import RandomForest
-from .classifier.SVM import SVM
-from .interarrivaltime.Mean import InterArrivalTimeMean
-from .interarrivaltime.Range import InterArrivalTimeRange
-from .kitsune.kitsune import Kitsune
-from .oracles.DummyIDS import DummyIDS
-from .oracles.OptimalIDS import OptimalIDS
-from .simple.decimal import DecimalPlaces
-from .simple.exists import ExistsIDS
-from .simple.histogram import Histogram
-from .simple.minmax import MinMax
-from .simple.steadytime import SteadyTime
+from ipal_iids.registry import LazyRegistry
 
-idss = [
-    Autoregression,
-    BLSTM,
-    DecimalPlaces,
-    DecisionTree,
-    DummyIDS,
-    ExistsIDS,
-    ExtraTrees,
-    Histogram,
-    InterArrivalTimeMean,
-    InterArrivalTimeRange,
-    IsolationForest,
-    Kitsune,
-    MinMax,
-    NaiveBayes,
-    OptimalIDS,
-    RandomForest,
-    SVM,
-    SteadyTime,
-]
+# IDSs are only imported once they are used (name -> module.class)
+idss = LazyRegistry(
+    {
+        "Autoregression": "ids.autoregression.Autoregression.Autoregression",
+        "BLSTM": "ids.classifier.BLSTM.BLSTM",
+        "DecimalPlaces": "ids.simple.decimal.DecimalPlaces",
+        "DecisionTree": "ids.classifier.DecisionTree.DecisionTree",
+        "Dummy": "ids.oracles.DummyIDS.DummyIDS",
+        "Exists": "ids.simple.exists.ExistsIDS",
+        "ExtraTrees": "ids.classifier.ExtraTrees.ExtraTrees",
+        "Histogram": "ids.simple.histogram.Histogram",
+        "inter-arrival-mean": "ids.interarrivaltime.Mean.InterArrivalTimeMean",
+        "inter-arrival-range": "ids.interarrivaltime.Range.InterArrivalTimeRange",
+        "IsolationForest": "ids.classifier.IsolationForest.IsolationForest",
+        "Kitsune": "ids.kitsune.kitsune.Kitsune",
+        "MinMax": "ids.simple.minmax.MinMax",
+        "NaiveBayes": "ids.classifier.NaiveBayes.NaiveBayes",
+        "Optimal": "ids.oracles.OptimalIDS.OptimalIDS",
+        "RandomForest": "ids.classifier.RandomForest.RandomForest",
+        "SVM": "ids.classifier.SVM.SVM",
+        "Steadytime": "ids.simple.steadytime.SteadyTime",
+    }
+)
 
 
 def get_all_iidss():
-    return {ids._name: ids for ids in idss}
+    return idss
@@ -0,0 +1,372 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+import ipal_iids.settings as settings
+from ipal_iids.compression import is_compressed, open_compressed
+from ipal_iids.reader import read_messages
+
+# On-disk columnar cache of parsed training files. Each leaf of the (nested) messages is
+# stored as a column of value tags (int8) and 8-byte values, which are memory-mapped
+# on later runs. Strings are interned in a dictionary, and values without a column
+# representation (lists, empty dicts) are interned as JSON text. The key order of every
+# message is kept as a shape, such that messages can be reconstructed exactly.
+#
+# A cache entry is keyed by the path, size, mtime, and a hash of the beginning and end of
+# the training file. Modified files thus get a new entry; stale entries are not removed.
+
+VERSION = 1
+CHUNKSIZE = 65536
+HASHSIZE = 1 << 16
+
+# Value tags
+MISSING, NONE, BOOL, INT, FLOAT, STR, OBJ = range(7)
+NUMERIC = [BOOL, INT, FLOAT]
+
+_caches = {}  # Caches opened during this run
+
+
+def cache_key(filename):
+    stat = os.stat(filename)
+
+    h = hashlib.sha1()
+    h.update(
+        json.dumps(
+            [VERSION, os.path.realpath(filename), stat.st_size, stat.st_mtime_ns]
+        ).encode("utf-8")
+    )
+    with open(filename, "rb") as f:
+        h.update(f.read(HASHSIZE))
+        if stat.st_size > HASHSIZE:
+            f.seek(-HASHSIZE, os.SEEK_END)
+            h.update(f.read(HASHSIZE))
+
+    return h.hexdigest()
+
+
+def _flatten(msg, prefix=()):
+    # Returns (path, value) for all leafs of a message in key order
+    leafs = []
+    for key, value in msg.items():
+        if type(value) is dict and len(value) > 0:
+            leafs.extend(_flatten(value, prefix + (key,)))
+        else:
+            leafs.append((prefix + (key,), value))
+    return leafs
+
+
+class CacheBuilder:
+    def __init__(self, path):
+        self.path = path
+        self.path.mkdir(parents=True)
+
+        self.rows = 0
+        self.columns = {}  # path -> column index
+        self.shapes = {}  # tuple of column indices -> shape index
+        self.strings = {}
+        self.objects = {}
+
+        # Current chunk: values and rows per column, shape per row
+        self._values = []
+        self._rows = []
+        self._shapes = []
+
+    def _intern(self, table, value):
+        if value not in table:
+            table[value] = len(table)
+        return table[value]
+
+    def _encode(self, value):
+        # Returns the tag and 8-byte value of a single python value
+        if value is None:
+            return NONE, 0
+        elif isinstance(value, bool):
+            return BOOL, int(value)
+        elif isinstance(value, int) and -(2**63) <= value < 2**63:
+            return INT, value
+        elif isinstance(value, float):
+            return FLOAT, int(np.array(value, dtype=np.float64).view(np.int64))
+        elif isinstance(value, str):
+            return STR, self._intern(self.strings, value)
+        else:
+            return OBJ, self._intern(self.objects, json.dumps(value))
+
+    def add(self, msg):
+        row = len(self._shapes)
+        shape = []
+
+        for path, value in _flatten(msg):
+            column = self.columns.get(path)
+            if column is None:  # New column
+                column = self.columns[path] = len(self.columns)
+                self._values.append([])
+                self._rows.append([])
+
+            shape.append(column)
+            self._values[column].append(value)
+            self._rows[column].append(row)
+
+        self._shapes.append(self._intern(self.shapes, tuple(shape)))
+        if len(self._shapes) >= CHUNKSIZE:
+            self._flush()
+
+    def _encode_column(self, values):
+        # Returns the tags and 8-byte values of a list of python values
+        types = set(map(type, values))
+
+        try:
+            if types == {float}:
+                vals = np.array(values, dtype=np.float64).view(np.int64)
+                return np.full(len(values), FLOAT, dtype=np.int8), vals
+            elif types == {int}:
+                vals = np.array(values, dtype=np.int64)
+                return np.full(len(values), INT, dtype=np.int8), vals
+            elif types == {bool}:
+                vals = np.array(values, dtype=np.int64)
+                return np.full(len(values), BOOL, dtype=np.int8), vals
+            elif types == {str}:
+                vals = [self._intern(self.strings, value) for value in values]
+                vals = np.array(vals, dtype=np.int64)
+                return np.full(len(values), STR, dtype=np.int8), vals
+        except OverflowError:  # Integers exceeding 64 bit
+            pass
+
+        tags = np.zeros(len(values), dtype=np.int8)
+        vals = np.zeros(len(values), dtype=np.int64)
+        for i, value in enumerate(values):
+            tags[i], vals[i] = self._encode(value)
+        return tags, vals
+
+    def _flush(self):
+        n = len(self._shapes)
+
+        for column in range(len(self.columns)):
+            tags = np.zeros(n, dtype=np.int8)
+            vals = np.zeros(n, dtype=np.int64)
+
+            if len(self._values[column]) > 0:
+                rows = np.array(self._rows[column], dtype=np.int64)
+                tags[rows], vals[rows] = self._encode_column(self._values[column])
+
+            if self.rows > 0 and not (self.path / "tags-{}".format(column)).exists():
+                # Column appeared in this chunk, it is missing in all rows before
+                self._append(
+                    column,
+                    np.zeros(self.rows, dtype=np.int8),
+                    np.zeros(self.rows, dtype=np.int64),
+                )
+            self._append(column, tags, vals)
+
+            self._values[column] = []
+            self._rows[column] = []
+
+        with open(self.path / "shapes", "ab") as f:
+            np.array(self._shapes, dtype=np.int32).tofile(f)
+
+        self.rows += n
+        self._shapes = []
+
+    def _append(self, column, tags, vals):
+        with open(self.path / "tags-{}".format(column), "ab") as f:
+            tags.tofile(f)
+        with open(self.path / "vals-{}".format(column), "ab") as f:
+            vals.tofile(f)
+
+    def finish(self):
+        if len(self._shapes) > 0:
+            self._flush()
+
+        meta = {
+            "version": VERSION,
+            "rows": self.rows,
+            "columns": [list(path) for path in self.columns],
+            "shapes": [list(shape) for shape in self.shapes],
+            "strings": list(self.strings),
+            "objects": list(self.objects),
+        }
+        with open(self.path / "meta.json", "w") as f:
+            json.dump(meta, f)
+
+
+class TrainingCache:
+    def __init__(self, path):
+        self.path = path
+
+        with open(self.path / "meta.json", "r") as f:
+            meta = json.load(f)
+        assert meta["version"] == VERSION
+
+        self.rows = meta["rows"]
+        self.columns = {tuple(path): i for i, path in enumerate(meta["columns"])}
+        self.shapes = meta["shapes"]
+        self.strings = meta["strings"]
+        self.objects = meta["objects"]
+
+        self._memmaps = {}
+        self._shapes = self._memmap("shapes", np.int32)
+
+        # Templates to rebuild the nested messages of each shape
+        paths = list(self.columns)
+        self._templates = [
+            [(paths[column][:-1], paths[column][-1], column) for column in shape]
+            for shape in self.shapes
+        ]
+
+    def __len__(self):
+        return self.rows
+
+    def _memmap(self, name, dtype):
+        if self.rows == 0:
+            return np.zeros(0, dtype=dtype)
+
+        if name not in self._memmaps:
+            self._memmaps[name] = np.memmap(
+                self.path / name, dtype=dtype, mode="r", shape=(self.rows,)
+            )
+        return self._memmaps[name]
+
+    def column(self, path):
+        # Returns the value tags and raw 8-byte values of a column or None if unknown
+        path = tuple(path)
+        if path not in self.columns:
+            return None
+
+        column = self.columns[path]
+        tags = self._memmap("tags-{}".format(column), np.int8)
+        vals = self._memmap("vals-{}".format(column), np.int64)
+        return tags, vals
+
+    def numeric(self, path):
+        # Returns a column as float64 array or None if not all rows hold a number
+        column = self.column(path)
+        if column is None:
+            return None
+
+        tags, vals = column
+        if not np.isin(tags, NUMERIC).all():
+            return None
+
+        return np.where(
+            tags == FLOAT, vals.view(np.float64), vals.astype(np.float64)
+        ).astype(np.float64)
+
+    def values(self, path, start=0, end=None):
+        # Returns the python values of a column (None for missing values). Lists and
+        # dicts are decoded freshly for each row.
+        tags, vals = self.column(path)
+        return self._decode(tags[start:end], vals[start:end])
+
+    def _decode(self, tags, vals):
+        if len(tags) == 0:
+            return []
+
+        tag = tags[0]
+        if (tags == tag).all():  # Fast path for uniform columns
+            if tag == INT:
+                return vals.tolist()
+            elif tag == FLOAT:
+                return vals.view(np.float64).tolist()
+            elif tag == BOOL:
+                return (vals != 0).tolist()
+            elif tag == STR:
+                return [self.strings[i] for i in vals.tolist()]
+            elif tag in [NONE, MISSING]:
+                return [None] * len(tags)
+
+        floats = vals.view(np.float64).tolist()
+        return [
+            self._decode_value(t, v, f)
+            for t, v, f in zip(tags.tolist(), vals.tolist(), floats)
+        ]
+
+    def _decode_value(self, tag, val, f):
+        if tag == INT:
+            return val
+        elif tag == FLOAT:
+            return f
+        elif tag == BOOL:
+            return val != 0
+        elif tag == STR:
+            return self.strings[val]
+        elif tag == OBJ:
+            return json.loads(self.objects[val])
+        return None
+
+    def messages(self):
+        # Yields the cached messages, rebuilt chunk by chunk
+        paths = list(self.columns)
+
+        for start in range(0, self.rows, CHUNKSIZE):
+            end = min(start + CHUNKSIZE, self.rows)
+            columns = [self.values(path, start, end) for path in paths]
+
+            for row, shape in enumerate(self._shapes[start:end].tolist()):
+                msg = {}
+                for parents, key, column in self._templates[shape]:
+                    d = msg
+                    for parent in parents:
+                        if parent not in d:
+                            d[parent] = {}
+                        d = d[parent]
+
+                    d[key] = columns[column][row]
+
+                yield msg
+
+
+def _build(filename, path):
+    start = time.time()
+    settings.logger.info("Building training cache for {}".format(filename))
+
+    tmp = path.with_name("{}.tmp-{}".format(path.name, os.getpid()))
+    builder = CacheBuilder(tmp)
+
+    if is_compressed(filename):
+        fd = open_compressed(filename, "r")
+    else:
+        fd = open(filename, "r")
+
+    with fd:
+        for msg in read_messages(fd):
+            builder.add(msg)
+    builder.finish()
+
+    try:
+        os.rename(tmp, path)
+    except OSError:  # Built by another process in the meantime
+        shutil.rmtree(tmp)
+    settings.logger.info(
+        "Built training cache of {} messages in {}s".format(
+            builder.rows, time.time() - start
+        )
+    )
+
+
+def open_cache(filename):
+    # Returns the training cache of a file, building it if necessary. Returns None if
+    # caching is disabled or the file cannot be cached (e.g., stdin).
+    if settings.train_cache is None or filename is None:
+        return None
+
+    filename = str(filename)
+    if filename == "-" or not os.path.isfile(filename):
+        return None
+
+    key = cache_key(filename)
+    if key not in _caches:
+        path = Path(settings.train_cache) / key
+        if not (path / "meta.json").exists():
+            _build(filename, path)
+        else:
+            settings.logger.info(
+                "Using training cache {} for {}".format(path, filename)
+            )
+
+        _caches[key] = TrainingCache(path)
+
+    return _caches[key]
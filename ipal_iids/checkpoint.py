@@ -0,0 +1,204 @@
+import hashlib
+import os
+import pickle
+import time
+
+import ipal_iids.settings as settings
+from ipal_iids.compression import is_compressed, open_compressed
+
+# Checkpoints of the live detection. Besides the trained models, windowed IDSs and combiners
+# keep runtime state (e.g., sliding windows) that is lost on a restart, such that they miss
+# attacks while warming up again. Every interval seconds (and at the end of the live input),
+# the runtime state of each IDS and the combiner (MetaIDS.get_checkpoint) is written to a
+# pickled snapshot ('*.gz', '*.zst', and '*.lz4' compressed) together with the id and
+# timestamp of the last processed IPAL and state message.
+#
+# With --resume, the state is restored after the models were loaded and the live messages up
+# to the last processed message are skipped. The state of an IDS is only restored if its type
+# and model file are unchanged since the checkpoint was written, since the state of an old
+# model may not fit a retrained one (e.g., other identifiers or histogram buckets). Since
+# checkpoints are pickled, only resume from checkpoints of trusted sources.
+
+FORMAT = 1  # Version of the checkpoint layout
+_fingerprints = {}  # (path, size, mtime) -> hash of the model file
+
+
+def model_fingerprint(obj):
+    # Hash of the model file of an IDS or combiner, None without a model file
+    if obj.settings.get("model-file") is None:
+        return None
+
+    try:
+        path = str(obj._resolve_model_file_path())
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _fingerprints:
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        _fingerprints[key] = sha1.hexdigest()
+    return _fingerprints[key]
+
+
+def get_checkpoint(obj):
+    return {
+        "type": type(obj).__name__,
+        "model": model_fingerprint(obj),
+        "state": obj.get_checkpoint(),
+    }
+
+
+def checkpoint_idss(idss):
+    # Runtime state of the IDSs in this process
+    return {ids._name: get_checkpoint(ids) for ids in idss}
+
+
+def _restore(obj, name, checkpoint):
+    if checkpoint is None:
+        settings.logger.warning(
+            "Checkpoint holds no state of {}, starting without".format(name)
+        )
+    elif checkpoint["type"] != type(obj).__name__:
+        settings.logger.warning(
+            "{} is of another type than in the checkpoint, starting without its state".format(
+                name
+            )
+        )
+    elif checkpoint["model"] != model_fingerprint(obj):
+        settings.logger.warning(
+            "Model of {} changed since the checkpoint, starting without its state".format(
+                name
+            )
+        )
+    else:
+        obj.restore_checkpoint(checkpoint["state"])
+        settings.logger.info("Restored state of {}".format(name))
+
+
+def load_checkpoint(path, idss, combiner):
+    # Restores the state of the IDSs and the combiner. Returns the checkpoint or None.
+    try:
+        with _open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+    except FileNotFoundError:
+        settings.logger.warning("No checkpoint at {}, starting cold".format(path))
+        return None
+    except Exception as e:
+        settings.logger.error("Cannot read checkpoint {}: {}".format(path, e))
+        exit(1)
+
+    if not isinstance(checkpoint, dict) or checkpoint.get("format") != FORMAT:
+        settings.logger.error("{} is not a checkpoint of this version".format(path))
+        exit(1)
+
+    for ids in idss:
+        _restore(ids, ids._name, checkpoint["idss"].get(ids._name))
+    _restore(combiner, "combiner", checkpoint["combiner"])
+
+    settings.logger.info(
+        "Resuming from checkpoint {} after {} messages".format(
+            path, checkpoint["messages"]
+        )
+    )
+    return checkpoint
+
+
+def _open(path, mode):
+    if is_compressed(path):
+        return open_compressed(path, mode, compresslevel=settings.compresslevel)
+    return open(path, mode)
+
+
+def skip_processed(messages, position):
+    # Skips the live messages of each type up to the last one processed before the checkpoint.
+    # Skipping stops at that message (same id and timestamp) or at the first later message,
+    # e.g., if the input is a new stream rather than a replay.
+    skipping = {True: position.get("ipal"), False: position.get("state")}
+    skipped = {True: 0, False: 0}
+
+    for is_ipal, msg in messages:
+        last = skipping[is_ipal]
+        if last is not None:
+            timestamp = msg.get("timestamp")
+            if [msg.get("id"), timestamp] == last:
+                skipping[is_ipal] = None
+                skipped[is_ipal] += 1
+                continue
+            elif timestamp is None or last[1] is None or timestamp <= last[1]:
+                skipped[is_ipal] += 1
+                continue
+
+            skipping[is_ipal] = None
+
+        if skipped[is_ipal] > 0:
+            settings.logger.info(
+                "Skipped {} {} messages processed before the checkpoint".format(
+                    skipped[is_ipal], "IPAL" if is_ipal else "state"
+                )
+            )
+            skipped[is_ipal] = 0
+
+        yield is_ipal, msg
+
+
+class Checkpointer:
+    # Writes a checkpoint of the live detection every interval seconds between batches
+
+    def __init__(self, path, interval, idss, combiner, checkpoint=None):
+        self.path = path
+        self.interval = interval
+        self.idss = idss  # Shared with the model reloader, which replaces IDSs in place
+        self.combiner = combiner
+        self.workers = None  # Collect the state from the live workers if set
+        self.writer = None  # Output written up to the checkpoint if set
+
+        # Continue the position of a resumed checkpoint
+        self.position = {} if checkpoint is None else dict(checkpoint["position"])
+        self.messages = 0 if checkpoint is None else checkpoint["messages"]
+        self._next = time.time() + interval
+
+    def next_batch(self, batch, is_ipal):
+        self.messages += len(batch)
+        self.position["ipal" if is_ipal else "state"] = [
+            batch[-1].get("id"),
+            batch[-1].get("timestamp"),
+        ]
+
+        if self.interval > 0 and time.time() >= self._next:
+            self.write()
+            self._next = time.time() + self.interval
+
+    def write(self):
+        # Messages processed before the checkpoint must not be lost from the output
+        if self.writer is not None:
+            self.writer.sync()
+
+        if self.workers is not None:
+            idss = self.workers.checkpoint()
+        else:
+            idss = checkpoint_idss(self.idss)
+
+        checkpoint = {
+            "format": FORMAT,
+            "version": settings.version,
+            "timestamp": time.time(),
+            "messages": self.messages,
+            "position": self.position,
+            "idss": idss,
+            "combiner": get_checkpoint(self.combiner),
+        }
+
+        # Replace the previous checkpoint atomically (keeping the extension of the file)
+        directory, filename = os.path.split(self.path)
+        tmp = os.path.join(directory, ".tmp-{}".format(filename))
+        with _open(tmp, "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+        settings.logger.info(
+            "Wrote checkpoint after {} messages to {}".format(self.messages, self.path)
+        )
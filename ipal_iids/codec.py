@@ -0,0 +1,91 @@
+import json
+
+# JSON codec for IPAL and state messages. Python's json module is used by default, such
+# that the output does not depend on the installed libraries. Faster backends are opt-in,
+# 'auto' selects the fastest installed one. Model and config files are always handled by
+# python's json module since they require its formatting options.
+#
+# Note that orjson encodes NaN and Infinity as null, whereas python's json module
+# emits the (non-standard) NaN and Infinity literals.
+
+BACKENDS = ["auto", "orjson", "ujson", "json"]
+
+backend = None
+
+
+def _json_loads(s):
+    return json.loads(s)
+
+
+def _json_dumps(obj):
+    return json.dumps(obj)
+
+
+loads = _json_loads
+dumps = _json_dumps
+
+
+def _orjson_codec():
+    import orjson
+
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def orjson_loads(s):
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:  # e.g., NaN is not supported by orjson
+            return json.loads(s)
+
+    def orjson_dumps(obj):
+        try:
+            return orjson.dumps(obj, option=options).decode("utf-8")
+        except TypeError:  # Unsupported type, let python's json module decide
+            return json.dumps(obj)
+
+    return orjson_loads, orjson_dumps
+
+
+def _ujson_codec():
+    import ujson
+
+    def ujson_loads(s):
+        try:
+            return ujson.loads(s)
+        except ValueError:
+            return json.loads(s)
+
+    def ujson_dumps(obj):
+        try:
+            return ujson.dumps(obj, ensure_ascii=False)
+        except (TypeError, OverflowError):  # e.g., NaN or numpy types
+            return json.dumps(obj)
+
+    return ujson_loads, ujson_dumps
+
+
+_codecs = {
+    "orjson": _orjson_codec,
+    "ujson": _ujson_codec,
+    "json": lambda: (_json_loads, _json_dumps),
+}
+
+
+def set_backend(name="json"):
+    # Select the JSON backend. Raises ImportError if the requested backend is not installed.
+    global backend, loads, dumps
+
+    if name not in BACKENDS:
+        raise ValueError("Unknown JSON backend {}".format(name))
+
+    if name == "auto":
+        for candidate in ["orjson", "ujson", "json"]:
+            try:
+                loads, dumps = _codecs[candidate]()
+            except ImportError:
+                continue
+            backend = candidate
+            return backend
+
+    loads, dumps = _codecs[name]()
+    backend = name
+    return backend
@@ -0,0 +1,180 @@
+import collections
+import gzip
+import io
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Compressed files, chosen by the file extension. Besides gzip (.gz), zstandard (.zst) and
+# lz4 (.lz4) are supported if the zstandard or lz4 packages are installed. For .zst, python's
+# compression.zstd module (python >= 3.14) is used if the package is missing.
+#
+# As with gzip.open, mode 'r' and 'w' open binary files and 'rt' and 'wt' text files.
+# Compressed files are read through a large buffer, such that lines are split by the C
+# implementation of BufferedReader rather than in small steps through the decompressor.
+# With multiple threads, gzip output is compressed in independent blocks in parallel (zlib
+# releases the GIL while compressing), which are concatenated into a single gzip member.
+
+EXTENSIONS = [".gz", ".zst", ".lz4"]
+BLOCKSIZE = 1 << 20
+WINDOW = 1 << 15  # Size of the deflate window, used as dictionary of the next block
+
+
+def is_compressed(filename):
+    return str(filename).endswith(tuple(EXTENSIONS))
+
+
+def _zstd():
+    try:
+        import zstandard
+
+        return zstandard
+    except ImportError:
+        pass
+
+    try:
+        from compression import zstd
+
+        return zstd
+    except ImportError:
+        raise ImportError("Reading and writing .zst files requires zstandard")
+
+
+def _lz4():
+    try:
+        import lz4.frame
+
+        return lz4.frame
+    except ImportError:
+        raise ImportError("Reading and writing .lz4 files requires lz4")
+
+
+def _compress_block(block, zdict, level, finish):
+    # Compresses a block to raw deflate data ending on a byte boundary
+    if len(zdict) > 0:
+        compressor = zlib.compressobj(
+            level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, 0, zdict
+        )
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    return compressor.compress(block) + compressor.flush(
+        zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH
+    )
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    # Writes a gzip file, compressing blocks of BLOCKSIZE bytes in a thread pool. Each
+    # block is primed with the last 32 KiB of the previous one (like pigz), such that the
+    # compression ratio is close to sequential compression.
+
+    def __init__(self, filename, compresslevel=9, threads=2, blocksize=BLOCKSIZE):
+        self.fd = open(filename, "wb")
+        self.compresslevel = compresslevel
+        self.threads = threads
+        self.blocksize = blocksize
+
+        self._pool = ThreadPoolExecutor(threads)
+        self._pending = collections.deque()  # Compressed blocks in order
+        self._buffer = []
+        self._size = 0
+        self._crc = 0
+        self._length = 0
+        self._zdict = b""
+
+        # Header without file name and modification time
+        self.fd.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._size += len(data)
+
+        if self._size >= self.blocksize:
+            self._submit()
+        return len(data)
+
+    def _submit(self, finish=False):
+        block = b"".join(self._buffer)
+        self._buffer = []
+        self._size = 0
+
+        self._crc = zlib.crc32(block, self._crc)
+        self._length += len(block)
+        self._pending.append(
+            self._pool.submit(
+                _compress_block, block, self._zdict, self.compresslevel, finish
+            )
+        )
+        self._zdict = (self._zdict + block)[-WINDOW:]
+
+        # Write finished blocks, wait if too many blocks are pending
+        while len(self._pending) > 0 and (
+            self._pending[0].done() or len(self._pending) > 2 * self.threads
+        ):
+            self.fd.write(self._pending.popleft().result())
+
+    def flush(self):
+        if self.fd.closed:  # Finished by close()
+            return
+
+        if self._size > 0:
+            self._submit()
+        while len(self._pending) > 0:
+            self.fd.write(self._pending.popleft().result())
+        self.fd.flush()
+
+    def close(self):
+        if self.closed:
+            return
+
+        self._submit(finish=True)
+        while len(self._pending) > 0:
+            self.fd.write(self._pending.popleft().result())
+        self.fd.write(struct.pack("<II", self._crc, self._length & 0xFFFFFFFF))
+
+        self._pool.shutdown()
+        self.fd.close()
+        super().close()
+
+
+def open_compressed(filename, mode="r", compresslevel=9, threads=1):
+    filename = str(filename)
+    text = "t" in mode
+    binary_mode = mode.replace("t", "").replace("b", "")
+
+    if filename.endswith(".gz"):
+        if binary_mode == "r":
+            f = io.BufferedReader(gzip.GzipFile(filename, "rb"), BLOCKSIZE)
+        elif binary_mode == "w" and threads > 1:
+            f = io.BufferedWriter(
+                ParallelGzipWriter(filename, compresslevel, threads), BLOCKSIZE
+            )
+        else:
+            f = gzip.GzipFile(filename, binary_mode + "b", compresslevel)
+
+    elif filename.endswith(".zst"):
+        zstd = _zstd()
+        if binary_mode == "r":
+            f = io.BufferedReader(zstd.open(filename, "rb"), BLOCKSIZE)
+        elif zstd.__name__ == "zstandard":
+            compressor = zstd.ZstdCompressor(
+                level=max(1, compresslevel), threads=threads if threads > 1 else 0
+            )
+            f = zstd.open(filename, binary_mode + "b", cctx=compressor)
+        else:
+            f = zstd.open(filename, binary_mode + "b", level=max(1, compresslevel))
+
+    elif filename.endswith(".lz4"):
+        lz4 = _lz4()
+        if binary_mode == "r":
+            f = io.BufferedReader(lz4.open(filename, "rb"), BLOCKSIZE)
+        else:
+            f = lz4.open(filename, binary_mode + "b", compression_level=compresslevel)
+
+    else:
+        raise ValueError("{} is not a compressed file".format(filename))
+
+    return io.TextIOWrapper(f) if text else f
@@ -1,30 +1,95 @@
 #!/usr/bin/env python3
 import argparse
-import gzip
 import json
 import logging
 import os
+import queue
 import random
+import signal
 import socket
 import sys
+import threading
 import time
 from pathlib import Path
 
+import ipal_iids.codec as codec
 import ipal_iids.settings as settings
 from combiner.utils import get_all_combiner
 from ids.utils import get_all_iidss
-
-
-# Wrapper for hiding .gz files
-def open_file(filename, mode):
+from ipal_iids.cache import open_cache
+from ipal_iids.checkpoint import Checkpointer, load_checkpoint, skip_processed
+from ipal_iids.compression import is_compressed, open_compressed
+from ipal_iids.memory import MemoryGuard
+from ipal_iids.merge import merge_live_messages
+from ipal_iids.metrics import (
+    Metrics,
+    MetricsServer,
+    StatsWriter,
+    instrument_codec,
+    instrument_combiner,
+    instrument_idss,
+)
+from ipal_iids.network import NetworkListener, is_network_address
+from ipal_iids.profiling import PHASES as PROFILE_PHASES
+from ipal_iids.profiling import Profiler
+from ipal_iids.reader import read_messages
+from ipal_iids.reload import ModelReloader, ModelWatcher
+from ipal_iids.training import train_parallel
+from ipal_iids.workers import SHARD_KEYS, LiveWorkers, ShardedWorkers, WorkerError
+from ipal_iids.writer import OutputWriter, parse_flush_policy, parse_output_fields
+
+
+# Wrapper for hiding compressed files
+def open_file(filename, mode, buffering=1):
     if filename is None:
         return None
-    elif filename.endswith(".gz"):
-        return gzip.open(filename, mode=mode, compresslevel=settings.compresslevel)
+    elif is_compressed(filename):
+        try:
+            return open_compressed(
+                filename,
+                mode,
+                compresslevel=settings.compresslevel,
+                threads=settings.compress_threads,
+            )
+        except ImportError as e:
+            settings.logger.error(str(e))
+            exit(1)
     elif filename == "-":
         return sys.stdin
     else:
-        return open(filename, mode=mode, buffering=1)
+        return open(filename, mode=mode, buffering=buffering)
+
+
+def live_files(files):
+    # Live inputs are given as a single file or a list of files
+    if files is None:
+        return []
+    elif isinstance(files, str):
+        return [files]
+    return files
+
+
+def open_live_file(filename):
+    if filename in ["-", "stdin"]:
+        return sys.stdin
+    elif is_network_address(filename):
+        try:
+            return NetworkListener(filename, settings.live_queue_size)
+        except (ValueError, OSError) as e:
+            settings.logger.error("Cannot listen on {}: {}".format(filename, e))
+            exit(1)
+    return open_file(filename, "r")
+
+
+def stop_live_listeners(signum, frame):
+    # Stop receiving live messages from the network, the remaining ones are still processed
+    settings.logger.info("Stopping live network inputs")
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    for fd in settings.live_ipalfds + settings.live_statefds:
+        if isinstance(fd, NetworkListener):
+            fd.stop()
 
 
 def copy_file_to_tmp_file(filein):
@@ -130,14 +195,32 @@ def prepare_arg_parser(parser):
         "--live.ipal",
         dest="live_ipal",
         metavar="FILE",
-        help="input file of IPAL messages to perform the live detection on ('-' stdin, '*.gz' compressed).",
+        action="append",
+        help="input file of IPAL messages to perform the live detection on ('-' stdin, '*.gz' compressed, 'tcp://HOST:PORT', 'udp://HOST:PORT', or 'unix:///PATH' to listen for producers). Can be given multiple times, all live inputs are merged by timestamp.",
         required=False,
     )
     parser.add_argument(
         "--live.state",
         dest="live_state",
         metavar="FILE",
-        help="input file of IPAL state messages to perform the live detection on ('-' stdin, '*.gz' compressed).",
+        action="append",
+        help="input file of IPAL state messages to perform the live detection on ('-' stdin, '*.gz' compressed, 'tcp://HOST:PORT', 'udp://HOST:PORT', or 'unix:///PATH' to listen for producers). Can be given multiple times, all live inputs are merged by timestamp.",
+        required=False,
+    )
+    parser.add_argument(
+        "--live.reorder-window",
+        dest="live_reorder_window",
+        metavar="TIME",
+        default=0,
+        help="maximum delay (in timestamp units) by which messages of a single live input may be out of order when merging multiple live inputs. (Default: 0)",
+        required=False,
+    )
+    parser.add_argument(
+        "--live.queue-size",
+        dest="live_queue_size",
+        metavar="INT",
+        default=64,
+        help="number of received chunks buffered per network input. If the queue is full, producers are throttled (TCP, Unix sockets) or datagrams dropped (UDP). (Default: 64)",
         required=False,
     )
     parser.add_argument(
@@ -189,6 +272,226 @@ def prepare_arg_parser(parser):
         action="store_true",
         required=False,
     )
+    parser.add_argument(
+        "--train-jobs",
+        dest="train_jobs",
+        metavar="INT",
+        default=1,
+        help="train and save up to INT IDSs in parallel processes. The trained models are loaded back for the live detection. (Default: 1)",
+        required=False,
+    )
+    parser.add_argument(
+        "--train-cache",
+        dest="train_cache",
+        metavar="DIR",
+        help="cache parsed training files as memory-mapped columns in DIR and reuse them on later runs. (Default: none)",
+        required=False,
+    )
+
+    # Live batching
+    parser.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        metavar="INT",
+        default=1,
+        help="number of live messages handed to the IDSs at once. Larger batches reduce the per-message overhead, e.g., of classifiers. (Default: 1)",
+        required=False,
+    )
+    parser.add_argument(
+        "--batch-timeout",
+        dest="batch_timeout",
+        metavar="MS",
+        default=None,
+        help="process an incomplete batch after waiting the given number of milliseconds since its first message. (Default: wait until the batch is full)",
+        required=False,
+    )
+
+    # Output writing
+    parser.add_argument(
+        "--flush",
+        dest="flush",
+        metavar="POLICY",
+        default="always",
+        help="when to flush the output: 'always', every N messages ('every-N'), every T milliseconds ('every-Tms'), or 'on-alert'. (Default: always)",
+        required=False,
+    )
+    parser.add_argument(
+        "--flush-latency",
+        dest="flush_latency",
+        metavar="MS",
+        default=0,
+        help="maximum time in milliseconds until an alert is flushed to the output when using --output-queue. Without a queue alerts are flushed immediately. (Default: 0)",
+        required=False,
+    )
+    parser.add_argument(
+        "--output-queue",
+        dest="output_queue",
+        metavar="INT",
+        default=0,
+        help="serialize and write the output in a background thread fed through a queue holding up to INT messages. (Default: 0, write in the main thread)",
+        required=False,
+    )
+    parser.add_argument(
+        "--output-fields",
+        dest="output_fields",
+        metavar="LIST",
+        default=None,
+        help="comma-separated list of message fields written to the output, e.g., 'id,timestamp,ids,alerts,scores'. Annotations for ipal-extend-alarms are always kept. (Default: all fields)",
+        required=False,
+    )
+    parser.add_argument(
+        "--output-alerts-only",
+        dest="output_alerts_only",
+        action="store_true",
+        help="only write messages with an alert (and messages with annotations for ipal-extend-alarms) to the output.",
+        required=False,
+    )
+    parser.add_argument(
+        "--output-summary",
+        dest="output_summary",
+        metavar="INT",
+        default=0,
+        help="log the number of processed messages, alerts, and written messages every INT messages (at log level INFO). (Default: 0, only at the end with --output-alerts-only)",
+        required=False,
+    )
+
+    # Metrics
+    parser.add_argument(
+        "--stats-file",
+        dest="stats_file",
+        metavar="FILE",
+        default=None,
+        help="periodically write latency histograms (p50, p99, max) per IDS, preprocessor, combiner, and JSON decoding/encoding together with the message and alert rates to FILE as JSON. (Default: none)",
+        required=False,
+    )
+    parser.add_argument(
+        "--stats-interval",
+        dest="stats_interval",
+        metavar="SECONDS",
+        default=10,
+        help="interval in which the stats file is written. (Default: 10)",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        dest="metrics_port",
+        metavar="PORT",
+        default=None,
+        help="serve the metrics in the Prometheus text format on http://127.0.0.1:PORT/metrics. (Default: none)",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-sample",
+        dest="metrics_sample",
+        metavar="INT",
+        default=64,
+        help="time every INT-th batch only, such that the overhead of the metrics stays small. Message and alert counts are exact. (Default: 64)",
+        required=False,
+    )
+    parser.add_argument(
+        "--memory-interval",
+        dest="memory_interval",
+        metavar="SECONDS",
+        default=60,
+        help="interval in which the approximate memory of each IDS is logged, added to the metrics, and checked against the 'memory-soft-limit' and 'memory-hard-limit' of its config (0: off). (Default: 60)",
+        required=False,
+    )
+
+    # Checkpoints
+    parser.add_argument(
+        "--checkpoint",
+        dest="checkpoint",
+        metavar="FILE",
+        default=None,
+        help="periodically write the runtime state of the IDSs and the combiner (e.g., sliding windows) during live detection to FILE ('*.gz' compressed). (Default: none)",
+        required=False,
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        dest="checkpoint_interval",
+        metavar="SECONDS",
+        default=60,
+        help="interval in which the checkpoint is written. It is also written at the end of the live input. (Default: 60, 0: at the end only)",
+        required=False,
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        help="restore the state of the checkpoint, skip the live messages processed before it, and append to the output.",
+        required=False,
+    )
+
+    # Profiling
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        metavar="PHASE",
+        default=None,
+        help="profile the training and/or live callbacks of each IDS separately ({}). One pstats file per IDS and phase and a combined collapsed-stack file for flame graphs are written to the profile directory. (Default: none)".format(
+            ", ".join(PROFILE_PHASES)
+        ),
+        required=False,
+    )
+    parser.add_argument(
+        "--profile-dir",
+        dest="profile_dir",
+        metavar="DIR",
+        default="profile",
+        help="directory the profiles are written to. (Default: profile)",
+        required=False,
+    )
+    parser.add_argument(
+        "--profile-sampler",
+        dest="profile_sampler",
+        metavar="MS",
+        default=None,
+        help="profile the live phase with a low-overhead sampling profiler recording the stack every MS milliseconds instead of profiling every call. (Default: none)",
+        required=False,
+    )
+
+    # Daemon mode
+    parser.add_argument(
+        "--daemon",
+        dest="daemon",
+        action="store_true",
+        help="keep the IDSs running while their models are retrained: changed model files (or all model files on SIGHUP) are loaded in the background and swapped in between two live messages.",
+        required=False,
+    )
+    parser.add_argument(
+        "--reload-interval",
+        dest="reload_interval",
+        metavar="SECONDS",
+        default=5,
+        help="interval to check the model files for changes in daemon mode. A changed file is reloaded once it did not change for another interval. (Default: 5)",
+        required=False,
+    )
+
+    # Live worker processes
+    parser.add_argument(
+        "--live-workers",
+        dest="live_workers",
+        metavar="INT",
+        default=None,
+        help="run the IDSs in the given number of worker processes during live detection. IDSs are distributed round-robin across the workers. (Default: run all IDSs in the main process)",
+        required=False,
+    )
+    parser.add_argument(
+        "--live-shards",
+        dest="live_shards",
+        metavar="INT",
+        default=None,
+        help="run all IDSs in the given number of worker processes during live detection, each owning a disjoint partition of the state of the IDSs. Messages are distributed by the partition key of each IDS. (Default: run all IDSs in the main process)",
+        required=False,
+    )
+    parser.add_argument(
+        "--shard-key",
+        dest="shard_key",
+        metavar="STR",
+        default="ids",
+        help="partition key of stateful IDSs with --live-shards: 'ids' (the key of each IDS, e.g., the message identifier of the inter-arrival IDSs), 'src' or 'dest' (IP address), or 'hosts' (pair of IP addresses). (Default: ids)",
+        required=False,
+    )
 
     parser.add_argument(
         "--hostname",
@@ -215,13 +518,33 @@ def prepare_arg_parser(parser):
         required=False,
     )
 
-    # Gzip compress level
+    # JSON backend
+    parser.add_argument(
+        "--json-backend",
+        dest="json_backend",
+        metavar="STR",
+        default="json",
+        help="JSON library used for reading and writing messages ({}). 'auto' uses the fastest installed library. (Default: json)".format(
+            ", ".join(codec.BACKENDS)
+        ),
+        required=False,
+    )
+
+    # Compression
     parser.add_argument(
         "--compresslevel",
         dest="compresslevel",
         metavar="INT",
         default=9,
-        help="set the gzip compress level. 0 no compress, 1 fast/large, ..., 9 slow/tiny. (Default: 9)",
+        help="set the compress level of '*.gz', '*.zst', and '*.lz4' files. 0 no compress, 1 fast/large, ..., 9 slow/tiny. (Default: 9)",
+        required=False,
+    )
+    parser.add_argument(
+        "--compress-threads",
+        dest="compress_threads",
+        metavar="INT",
+        default=1,
+        help="number of threads compressing the output ('*.gz' in parallel blocks, '*.zst' natively). (Default: 1)",
         required=False,
     )
 
@@ -256,7 +579,7 @@ def load_settings(args):  # noqa: C901
     if args.defaultcombinerconfig:
         dump_combiner_default_config(args.defaultcombinerconfig)
 
-    # Gzip compress level
+    # Compression
     if args.compresslevel:
         try:
             settings.compresslevel = int(args.compresslevel)
@@ -272,6 +595,215 @@ def load_settings(args):  # noqa: C901
             )
             exit(1)
 
+    try:
+        settings.compress_threads = int(args.compress_threads)
+    except ValueError:
+        settings.logger.error("Option '--compress-threads' must be a positive integer")
+        exit(1)
+    if settings.compress_threads < 1:
+        settings.logger.error("Option '--compress-threads' must be a positive integer")
+        exit(1)
+
+    # JSON backend
+    settings.json_backend = args.json_backend
+    try:
+        codec.set_backend(settings.json_backend)
+    except ValueError:
+        settings.logger.error(
+            "Option '--json-backend' must be one of {}".format(
+                ", ".join(codec.BACKENDS)
+            )
+        )
+        exit(1)
+    except ImportError:
+        settings.logger.error(
+            "JSON backend {} is not installed".format(settings.json_backend)
+        )
+        exit(1)
+    settings.logger.info("Using JSON backend {}".format(codec.backend))
+
+    # Live batching
+    try:
+        settings.batch_size = int(args.batch_size)
+    except ValueError:
+        settings.logger.error("Option '--batch-size' must be a positive integer")
+        exit(1)
+    if settings.batch_size < 1:
+        settings.logger.error("Option '--batch-size' must be a positive integer")
+        exit(1)
+
+    if args.batch_timeout is not None:
+        try:
+            settings.batch_timeout = float(args.batch_timeout)
+        except ValueError:
+            settings.logger.error("Option '--batch-timeout' must be a number")
+            exit(1)
+        if settings.batch_timeout < 0:
+            settings.logger.error("Option '--batch-timeout' must not be negative")
+            exit(1)
+
+    # Live worker processes
+    if args.live_workers is not None:
+        try:
+            settings.live_workers = int(args.live_workers)
+        except ValueError:
+            settings.logger.error("Option '--live-workers' must be a positive integer")
+            exit(1)
+        if settings.live_workers < 1:
+            settings.logger.error("Option '--live-workers' must be a positive integer")
+            exit(1)
+
+    # Sharded live detection
+    if args.live_shards is not None:
+        try:
+            settings.live_shards = int(args.live_shards)
+        except ValueError:
+            settings.logger.error("Option '--live-shards' must be a positive integer")
+            exit(1)
+        if settings.live_shards < 1:
+            settings.logger.error("Option '--live-shards' must be a positive integer")
+            exit(1)
+        if settings.live_workers is not None:
+            settings.logger.error(
+                "Options '--live-workers' and '--live-shards' cannot be combined"
+            )
+            exit(1)
+
+    if args.shard_key not in SHARD_KEYS:
+        settings.logger.error(
+            "Option '--shard-key' must be one of {}".format(", ".join(SHARD_KEYS))
+        )
+        exit(1)
+    settings.shard_key = args.shard_key
+
+    # Daemon mode
+    settings.daemon = args.daemon
+    try:
+        settings.reload_interval = float(args.reload_interval)
+    except ValueError:
+        settings.logger.error("Option '--reload-interval' must be a positive number")
+        exit(1)
+    if settings.reload_interval <= 0:
+        settings.logger.error("Option '--reload-interval' must be a positive number")
+        exit(1)
+
+    # Output writing
+    try:
+        parse_flush_policy(args.flush)
+    except ValueError:
+        settings.logger.error(
+            "Option '--flush' must be one of always, every-N, every-Tms, on-alert"
+        )
+        exit(1)
+    settings.flush = args.flush
+
+    try:
+        settings.flush_latency = float(args.flush_latency)
+        settings.output_queue = int(args.output_queue)
+    except ValueError:
+        settings.logger.error(
+            "Options '--flush-latency' and '--output-queue' must be numbers"
+        )
+        exit(1)
+    if settings.flush_latency < 0 or settings.output_queue < 0:
+        settings.logger.error(
+            "Options '--flush-latency' and '--output-queue' must not be negative"
+        )
+        exit(1)
+
+    # Metrics
+    settings.stats_file = args.stats_file
+    try:
+        settings.stats_interval = float(args.stats_interval)
+        settings.metrics_sample = int(args.metrics_sample)
+        if args.metrics_port is not None:
+            settings.metrics_port = int(args.metrics_port)
+    except ValueError:
+        settings.logger.error(
+            "Options '--stats-interval', '--metrics-port', and '--metrics-sample' must be numbers"
+        )
+        exit(1)
+    if settings.stats_interval <= 0 or settings.metrics_sample < 1:
+        settings.logger.error(
+            "Options '--stats-interval' and '--metrics-sample' must be positive"
+        )
+        exit(1)
+
+    # Memory accounting
+    try:
+        settings.memory_interval = float(args.memory_interval)
+    except ValueError:
+        settings.logger.error("Option '--memory-interval' must be a number")
+        exit(1)
+    if settings.memory_interval < 0:
+        settings.logger.error("Option '--memory-interval' must not be negative")
+        exit(1)
+
+    # Checkpoints
+    settings.checkpoint = args.checkpoint
+    settings.resume = args.resume
+    try:
+        settings.checkpoint_interval = float(args.checkpoint_interval)
+    except ValueError:
+        settings.logger.error("Option '--checkpoint-interval' must be a number")
+        exit(1)
+    if settings.checkpoint_interval < 0:
+        settings.logger.error("Option '--checkpoint-interval' must not be negative")
+        exit(1)
+    if settings.resume and settings.checkpoint is None:
+        settings.logger.error("Option '--resume' requires '--checkpoint'")
+        exit(1)
+    if settings.checkpoint is not None and settings.live_shards is not None:
+        settings.logger.error(
+            "Option '--checkpoint' cannot be combined with '--live-shards'"
+        )
+        exit(1)
+
+    # Profiling
+    if args.profile is not None and args.profile not in PROFILE_PHASES:
+        settings.logger.error(
+            "Option '--profile' must be one of {}".format(", ".join(PROFILE_PHASES))
+        )
+        exit(1)
+    settings.profile = args.profile
+    settings.profile_dir = args.profile_dir
+
+    if args.profile_sampler is not None:
+        if settings.profile not in ["live", "all"]:
+            settings.logger.error(
+                "Option '--profile-sampler' requires '--profile live' or '--profile all'"
+            )
+            exit(1)
+        try:
+            settings.profile_sampler = float(args.profile_sampler)
+        except ValueError:
+            settings.profile_sampler = 0
+        if settings.profile_sampler <= 0:
+            settings.logger.error(
+                "Option '--profile-sampler' must be a positive number"
+            )
+            exit(1)
+
+    # Output projection
+    if args.output_fields is not None:
+        try:
+            settings.output_fields = parse_output_fields(args.output_fields)
+        except ValueError:
+            settings.logger.error(
+                "Option '--output-fields' must list at least one field"
+            )
+            exit(1)
+    settings.output_alerts_only = args.output_alerts_only
+
+    try:
+        settings.output_summary = int(args.output_summary)
+    except ValueError:
+        settings.logger.error("Option '--output-summary' must be an integer")
+        exit(1)
+    if settings.output_summary < 0:
+        settings.logger.error("Option '--output-summary' must not be negative")
+        exit(1)
+
     # Catch incompatible combinations
     if not args.config:
         settings.logger.error("no IDS configuration provided, exiting")
@@ -285,37 +817,76 @@ def load_settings(args):  # noqa: C901
     if args.train_combiner:
         settings.train_combiner = args.train_combiner
 
-    # Parse live ipal input
+    # Parse live ipal and state inputs
     if args.live_ipal:
-        settings.live_ipal = args.live_ipal
-    if settings.live_ipal:
-        if settings.live_ipal != "stdout" and settings.live_ipal != "-":
-            settings.live_ipalfd = open_file(settings.live_ipal, "r")
-        else:
-            settings.live_ipalfd = sys.stdin
-
-    # Parse live state input
+        settings.live_ipal = (
+            args.live_ipal[0] if len(args.live_ipal) == 1 else args.live_ipal
+        )
     if args.live_state:
-        settings.live_state = args.live_state
-    if settings.live_state:
-        if settings.live_state != "stdin" and settings.live_state != "-":
-            settings.live_statefd = open_file(settings.live_state, "r")
-        else:
-            settings.live_statefd = sys.stdin
+        settings.live_state = (
+            args.live_state[0] if len(args.live_state) == 1 else args.live_state
+        )
+
+    try:
+        settings.live_queue_size = int(args.live_queue_size)
+    except ValueError:
+        settings.logger.error("Option '--live.queue-size' must be a positive integer")
+        exit(1)
+    if settings.live_queue_size < 1:
+        settings.logger.error("Option '--live.queue-size' must be a positive integer")
+        exit(1)
+
+    live_inputs = live_files(settings.live_ipal) + live_files(settings.live_state)
+    if len([f for f in live_inputs if f in ["-", "stdin"]]) > 1:
+        settings.logger.error("Only a single live input can be read from stdin")
+        exit(1)
+
+    settings.live_ipalfds = [open_live_file(f) for f in live_files(settings.live_ipal)]
+    settings.live_statefds = [
+        open_live_file(f) for f in live_files(settings.live_state)
+    ]
+    if any(map(is_network_address, live_inputs)):
+        signal.signal(signal.SIGINT, stop_live_listeners)
+        signal.signal(signal.SIGTERM, stop_live_listeners)
+
+    try:
+        settings.live_reorder_window = float(args.live_reorder_window)
+    except ValueError:
+        settings.logger.error("Option '--live.reorder-window' must be a number")
+        exit(1)
+    if settings.live_reorder_window < 0:
+        settings.logger.error("Option '--live.reorder-window' must not be negative")
+        exit(1)
 
     # Parse retrain
     if args.retrain:
         settings.retrain = True
         settings.logger.info("Retraining models")
 
+    if args.train_cache:
+        settings.train_cache = args.train_cache
+
+    try:
+        settings.train_jobs = int(args.train_jobs)
+    except ValueError:
+        settings.logger.error("Option '--train-jobs' must be a positive integer")
+        exit(1)
+    if settings.train_jobs < 1:
+        settings.logger.error("Option '--train-jobs' must be a positive integer")
+        exit(1)
+
     # Parse output
     if args.output:
         settings.output = args.output
     if settings.output:
-        if settings.output != "stdout" and settings.output != "-":
+        if settings.resume and settings.output != "stdout" and settings.output != "-":
+            # Continue the output of the run the checkpoint was written by
+            settings.outputfd = open_file(settings.output, "at", buffering=-1)
+        elif settings.output != "stdout" and settings.output != "-":
             # clear the file we are about to write to
             open_file(settings.output, "wt").close()
-            settings.outputfd = open_file(settings.output, "wt")
+            # Flushing is left to the flush policy of the output writer
+            settings.outputfd = open_file(settings.output, "wt", buffering=-1)
         else:
             settings.outputfd = sys.stdout
 
@@ -359,6 +930,87 @@ def load_settings(args):  # noqa: C901
         settings.combiner = {"_type": "Any"}
 
 
+def copy_training_stdin(tmpfiles):
+    # Because training multiple IIDSs on stdin is not possible since stdin can only be read once
+    tmpfile = None
+    for attr in ["train_ipal", "train_state"]:
+        if getattr(settings, attr) == "-":
+            settings.logger.info("Copying training stdin to temporary file.")
+            tmpfile = copy_file_to_tmp_file("-")
+            setattr(settings, attr, tmpfile)
+            tmpfiles.append(tmpfile)
+
+    return tmpfile
+
+
+def begin_training(idss):
+    # IDSs supporting incremental training share a single pass over their training file.
+    # All other IDSs fall back to reading the training file on their own.
+    starts = {}
+    shared = {}
+    fallback = []
+
+    for ids in idss:
+        start = time.time()
+        try:
+            filename = ids.train_begin(
+                ipal=settings.train_ipal, state=settings.train_state
+            )
+        except NotImplementedError:
+            fallback.append(ids)
+            continue
+
+        starts[ids._name] = start
+        settings.logger.info("Training of {} started at {}".format(ids._name, start))
+
+        if filename not in shared:
+            shared[filename] = []
+        shared[filename].append(ids)
+
+    return starts, shared, fallback
+
+
+def train_shared(shared):
+    # Parse each training file once and hand each message to all of its IDSs
+    for filename, group in shared.items():
+        if filename is None:
+            continue
+
+        # IDSs may train on the columns of a cached training file directly
+        cache = open_cache(filename)
+        if cache is not None:
+            group = [ids for ids in group if not ids.train_columns(cache)]
+            if len(group) == 0:
+                continue
+
+        settings.logger.info(
+            "Training {} on a shared pass over {}".format(
+                ", ".join(ids._name for ids in group), filename
+            )
+        )
+
+        if cache is not None:
+            for msg in cache.messages():
+                for ids in group:
+                    ids.train_step(msg)
+        else:
+            with open_file(filename, "r") as f:
+                for msg in read_messages(f):
+                    for ids in group:
+                        ids.train_step(msg)
+
+
+def save_trained_model(ids):
+    # Try to save the trained model
+    try:
+        if ids.save_trained_model():
+            settings.logger.info("Saved trained model of {} to file.".format(ids._name))
+    except NotImplementedError:
+        settings.logger.info(
+            "Saving model to file not implemented for {}.".format(ids._name)
+        )
+
+
 def train_idss(idss):
     # Try to load an existing model from file
     loaded_from_file = []
@@ -391,57 +1043,50 @@ def train_idss(idss):
         )
         exit(1)
 
-    # If training file is stdin, read stdin and save it to a temporary file
-    # Because training multiple IIDSs on stdin is not possible since stdin can only be read once
-    if settings.train_ipal == "-" and len(idss) > 1:
-        settings.logger.info("Copying training stdin to temporary file.")
-        tmpipalfile = copy_file_to_tmp_file(settings.train_ipal)
-        settings.train_ipal = tmpipalfile
-    else:
-        tmpipalfile = None
-
-    if settings.train_state == "-" and len(idss) > 1:
-        settings.logger.info("Copying training stdin to temporary file.")
-        tmpstatefile = copy_file_to_tmp_file(settings.train_state)
-        settings.train_state = tmpstatefile
-    else:
-        tmpstatefile = None
+    to_train = [ids for ids in idss if ids not in loaded_from_file]
+    tmpfiles = []
 
     try:
-        # Give the various IDSs the dataset they need in their learning phase
-        for ids in idss:
-            if ids in loaded_from_file:
-                continue
+        # Train in parallel processes, each reading the training file on its own
+        if settings.train_jobs > 1 and len(to_train) > 1:
+            copy_training_stdin(tmpfiles)
+            to_train = train_parallel(to_train, settings.train_jobs)
 
-            start = time.time()
-            settings.logger.info(
-                "Training of {} started at {}".format(ids._name, start)
-            )
+        starts, shared, fallback = begin_training(to_train)
 
-            ids.train(ipal=settings.train_ipal, state=settings.train_state)
+        # If training file is stdin and is read more than once, save it to a temporary file
+        readers = len(fallback) + (1 if "-" in shared else 0)
+        if readers > 1:
+            tmpfile = copy_training_stdin(tmpfiles)
+            if "-" in shared:
+                shared[tmpfile] = shared.pop("-")
+
+        train_shared(shared)
+
+        # Give the various IDSs the dataset they need in their learning phase
+        for ids in to_train:
+            if ids in fallback:
+                starts[ids._name] = time.time()
+                settings.logger.info(
+                    "Training of {} started at {}".format(ids._name, starts[ids._name])
+                )
+                ids.train(ipal=settings.train_ipal, state=settings.train_state)
+            else:
+                ids.train_finish()
 
             end = time.time()
             settings.logger.info(
-                "Training of {} ended at {} ({}s)".format(ids._name, end, end - start)
+                "Training of {} ended at {} ({}s)".format(
+                    ids._name, end, end - starts[ids._name]
+                )
             )
 
-            # Try to save the trained model
-            try:
-                if ids.save_trained_model():
-                    settings.logger.info(
-                        "Saved trained model of {} to file.".format(ids._name)
-                    )
-            except NotImplementedError:
-                settings.logger.info(
-                    "Saving model to file not implemented for {}.".format(ids._name)
-                )
+            save_trained_model(ids)
 
     finally:
         # Remove temporary files
-        if tmpipalfile is not None:
-            os.remove(tmpipalfile)
-        if tmpstatefile is not None:
-            os.remove(tmpstatefile)
+        for tmpfile in tmpfiles:
+            os.remove(tmpfile)
 
 
 def train_combiner(combiner):
@@ -497,103 +1142,290 @@ def train_combiner(combiner):
         )
 
 
-def live_idss(idss, combiner):  # noqa: C901
-    # Keep track of the last state and message information. Then we are capable of delivering them in the right order.
-    ipal_msg = None
-    state_msg = None
-    _first_ipal_msg = True
-    _first_state_msg = True
+def read_live_messages():
+    # Merge all live inputs into a single stream ordered by timestamp
+    sources = [(True, fd) for fd in settings.live_ipalfds]
+    sources += [(False, fd) for fd in settings.live_statefds]
+
+    if len(sources) == 0:
+        return
+
+    yield from merge_live_messages(sources, settings.live_reorder_window)
+
+
+def _read_live_messages_threaded(messages):
+    # Read messages in a background thread such that batches can be closed after a timeout
+    # even if the input blocks (e.g., stdin)
+    buffer = queue.Queue(maxsize=max(1, 4 * settings.batch_size))
+
+    def reader():
+        try:
+            for message in messages:
+                buffer.put(message)
+        except Exception as e:
+            buffer.put(e)
+        buffer.put(None)
+
+    threading.Thread(target=reader, daemon=True).start()
+    return buffer
+
+
+def batch_live_messages(messages):
+    # Group consecutive messages of the same type into batches of up to settings.batch_size
+    # messages. If settings.batch_timeout (in ms) is set, a batch is emitted as soon as the
+    # timeout since its first message expired, even if it is not full yet.
+    batch = []
+    batch_is_ipal = None
+    deadline = None
+
+    if settings.batch_timeout is not None:
+        buffer = _read_live_messages_threaded(messages)
+    else:
+        messages = iter(messages)
 
     while True:
-        # load a new ipal message
-        if ipal_msg is None and settings.live_ipal:
-            line = settings.live_ipalfd.readline()
-            if line:
-                ipal_msg = json.loads(line)
-
-        # load a new state
-        if state_msg is None and settings.live_state:
-            line = settings.live_statefd.readline()
-            if line:
-                state_msg = json.loads(line)
-
-        # Determine smallest timestamp ipal or state?
-        if ipal_msg and state_msg:
-            is_ipal_smaller = ipal_msg.timestamp < state_msg.timestamp
-        elif ipal_msg:
-            is_ipal_smaller = True
-        elif state_msg:
-            is_ipal_smaller = False
-        else:  # handled all messages from files
+        # Get next message (or None if the batch timed out or the input ended)
+        if settings.batch_timeout is None:
+            message = next(messages, None)
+            finished = message is None
+        else:
+            try:
+                if deadline is None:
+                    message = buffer.get()
+                else:
+                    message = buffer.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                message = None
+                finished = False
+            else:
+                if isinstance(message, Exception):
+                    raise message
+                finished = message is None
+
+        # Emit current batch if it timed out or the message type changes
+        if len(batch) > 0 and (message is None or message[0] != batch_is_ipal):
+            yield batch_is_ipal, batch
+            batch = []
+            deadline = None
+
+        if finished:
             break
+        if message is None:
+            continue
 
-        # Process next message
-        if is_ipal_smaller:
-            if "scores" not in ipal_msg:
-                ipal_msg["scores"] = {}
-            if "alerts" not in ipal_msg:
-                ipal_msg["alerts"] = {}
-
-            for ids in idss:
-                if ids.requires("live.ipal"):
-                    alert, score = ids.new_ipal_msg(ipal_msg)
-                    ipal_msg["alerts"][ids._name] = alert
-                    ipal_msg["scores"][ids._name] = score
-
-            alert, score, offset = combiner.combine(
-                ipal_msg["alerts"], ipal_msg["scores"]
-            )
-            if offset == 0:
-                ipal_msg["ids"] = alert
-                ipal_msg["scores"][combiner._name] = score
-            else:
-                ipal_msg["ids"] = False
-                if "adjust" not in ipal_msg:
-                    ipal_msg["adjust"] = {}
-                ipal_msg["adjust"][combiner._name] = [[offset, alert, score]]
+        batch_is_ipal, msg = message
+        batch.append(msg)
+
+        # Emit a full batch right away, the next message may take a while (e.g., stdin)
+        if len(batch) >= settings.batch_size:
+            yield batch_is_ipal, batch
+            batch = []
+            deadline = None
+            continue
+
+        if deadline is None and settings.batch_timeout is not None:
+            deadline = time.time() + settings.batch_timeout / 1000
 
-            if settings.output:
-                if _first_ipal_msg:
-                    ipal_msg["_iids-config"] = settings.iids_settings_to_dict()
-                    _first_ipal_msg = False
 
-                settings.outputfd.write(json.dumps(ipal_msg) + "\n")
-                settings.outputfd.flush()
+def prepare_live_batch(batch):
+    for msg in batch:
+        if "scores" not in msg:
+            msg["scores"] = {}
+        if "alerts" not in msg:
+            msg["alerts"] = {}
 
-            ipal_msg = None
 
+def detect_live_batch(idss, batch, is_ipal):
+    for ids in idss:
+        if not ids.requires("live.ipal" if is_ipal else "live.state"):
+            continue
+        elif ids._disabled:  # Exceeded its hard memory limit
+            results = [(False, None)] * len(batch)
+        elif is_ipal:
+            results = ids.new_ipal_batch(batch)
         else:
-            if "scores" not in state_msg:
-                state_msg["scores"] = {}
-            if "alerts" not in state_msg:
-                state_msg["alerts"] = {}
-
-            for ids in idss:
-                if ids.requires("live.state"):
-                    alert, score = ids.new_state_msg(state_msg)
-                    state_msg["alerts"][ids._name] = alert
-                    state_msg["scores"][ids._name] = score
-
-            alert, score, offset = combiner.combine(
-                state_msg["alerts"], state_msg["scores"]
-            )
-            if offset == 0:
-                state_msg["ids"] = alert
-                state_msg["scores"][combiner._name] = score
+            results = ids.new_state_batch(batch)
+
+        assert len(results) == len(batch)
+        for msg, (alert, score) in zip(batch, results):
+            msg["alerts"][ids._name] = alert
+            msg["scores"][ids._name] = score
+
+
+def combine_live_batch(combiner, batch):
+    for msg in batch:
+        alert, score, offset = combiner.combine(msg["alerts"], msg["scores"])
+        if offset == 0:
+            msg["ids"] = alert
+            msg["scores"][combiner._name] = score
+        else:
+            msg["ids"] = False
+            if "adjust" not in msg:
+                msg["adjust"] = {}
+            msg["adjust"][combiner._name] = [[offset, alert, score]]
+
+    if settings.metrics is not None:
+        settings.metrics.next_batch(batch)
+
+
+def start_live_metrics(idss, combiner):
+    # Enables the metrics of the live detection. Returns the functions to call at its end.
+    settings.metrics = Metrics(settings.metrics_sample)
+    closers = [instrument_codec(settings.metrics)]
+    instrument_idss(settings.metrics, idss)
+    instrument_combiner(settings.metrics, combiner)
+
+    if settings.stats_file is not None:
+        stats = StatsWriter(
+            settings.metrics, settings.stats_file, settings.stats_interval
+        )
+        closers.append(stats.close)
+    if settings.metrics_port is not None:
+        server = MetricsServer(settings.metrics, settings.metrics_port)
+        closers.append(server.close)
+
+    return closers
+
+
+def swap_live_models(reloader, idss):
+    swapped = reloader.swap()
+    if settings.profiler is not None:
+        settings.profiler.instrument(idss, "live", swapped)
+    if settings.metrics is not None:
+        instrument_idss(settings.metrics, idss, swapped)
+
+
+def start_live_workers(idss):
+    if settings.live_workers is not None:
+        return LiveWorkers(idss, settings.live_workers)
+    elif settings.live_shards is not None:
+        return ShardedWorkers(idss, settings.live_shards, settings.shard_key)
+    return None
+
+
+def start_live_checkpoints(idss, combiner, messages):
+    # Restores the state of the checkpoint if requested. Returns the checkpointer and the live
+    # messages without the ones processed before the checkpoint.
+    checkpoint = None
+    if settings.resume:
+        checkpoint = load_checkpoint(settings.checkpoint, idss, combiner)
+        if checkpoint is not None:
+            messages = skip_processed(messages, checkpoint["position"])
+
+    checkpointer = Checkpointer(
+        settings.checkpoint, settings.checkpoint_interval, idss, combiner, checkpoint
+    )
+    return checkpointer, messages
+
+
+def start_live_reloading(idss, workers):
+    # Returns the reloader (None if the workers reload their IDSs) and the model watcher
+    reloader = None
+    if workers is None:
+        reloader = ModelReloader(idss)
+    watcher = ModelWatcher(
+        idss,
+        settings.reload_interval,
+        reloader.reload if workers is None else workers.reload,
+    )
+    signal.signal(signal.SIGHUP, lambda signum, frame: watcher.trigger())
+    return reloader, watcher
+
+
+def write_live_batch(writer, batch, is_ipal, configured):
+    # The configuration is attached to the first message of the ipal and the state output
+    if is_ipal not in configured:
+        batch[0]["_iids-config"] = settings.iids_settings_to_dict()
+        configured.add(is_ipal)
+
+    for msg in batch:
+        writer.write(msg)
+
+
+def live_idss(idss, combiner):
+    configured = set()  # Outputs (ipal or state) the configuration was written to
+
+    # Prepare output
+    writer = None
+    if settings.output:
+        writer = OutputWriter(
+            settings.outputfd,
+            policy=settings.flush,
+            alert_latency=settings.flush_latency,
+            queue_size=settings.output_queue,
+            fields=settings.output_fields,
+            alerts_only=settings.output_alerts_only,
+            summary=settings.output_summary,
+        )
+
+    # Collect latency and throughput metrics if requested
+    closers = []
+    if settings.stats_file is not None or settings.metrics_port is not None:
+        closers = start_live_metrics(idss, combiner)
+
+    # Check the memory of the IDSs, in the worker processes if there are any
+    guard = None
+    if settings.memory_interval > 0:
+        guard = MemoryGuard(idss, settings.memory_interval)
+
+    # Continue from the state of a checkpoint (before the workers inherit the IDSs)
+    messages = read_live_messages()
+    checkpointer = None
+    if settings.checkpoint is not None:
+        checkpointer, messages = start_live_checkpoints(idss, combiner, messages)
+
+    # Run the IDSs in worker processes if requested
+    workers = start_live_workers(idss)
+    if checkpointer is not None:
+        checkpointer.workers = workers
+        checkpointer.writer = writer
+
+    # Swap in new models of the IDSs while the detection keeps running
+    reloader = None
+    watcher = None
+    if settings.daemon:
+        reloader, watcher = start_live_reloading(idss, workers)
+
+    failed = False
+    try:
+        for is_ipal, batch in batch_live_messages(messages):
+            if reloader is not None:
+                swap_live_models(reloader, idss)
+
+            prepare_live_batch(batch)
+            if workers is None:
+                detect_live_batch(idss, batch, is_ipal)
+                if guard is not None:
+                    guard.next_batch()
             else:
-                state_msg["ids"] = False
-                if "adjust" not in state_msg:
-                    state_msg["adjust"] = {}
-                state_msg["adjust"][combiner._name] = [[offset, alert, score]]
+                workers.detect(batch, is_ipal)
+            combine_live_batch(combiner, batch)
 
             if settings.output:
-                if _first_state_msg:
-                    state_msg["_iids-config"] = settings.iids_settings_to_dict()
-                    _first_state_msg = False
+                write_live_batch(writer, batch, is_ipal, configured)
+
+            if checkpointer is not None:
+                checkpointer.next_batch(batch, is_ipal)
 
-                settings.outputfd.write(json.dumps(state_msg) + "\n")
-                settings.outputfd.flush()
-            state_msg = None
+        if checkpointer is not None:
+            checkpointer.write()
+
+    except WorkerError as e:  # The error of the worker is logged by LiveWorkers
+        settings.logger.critical("{}. Stopping the live detection".format(e))
+        failed = True
+
+    finally:
+        if watcher is not None:
+            watcher.close()
+        if workers is not None:
+            workers.close()
+        if writer is not None:
+            writer.close()
+        for close in closers:
+            close()
+
+    if failed:
+        exit(1)
 
 
 def main():
@@ -611,6 +1443,13 @@ def main():
     idss = parse_ids_arguments()
     combiner = parse_combiner_arguments()
 
+    # Profile the IDSs if requested
+    if settings.profile is not None:
+        settings.profiler = Profiler(
+            settings.profile_dir, settings.profile, settings.profile_sampler
+        )
+        settings.profiler.instrument(idss, "train")
+
     try:
         # Train IDSs
         settings.logger.info("Start IDS training...")
@@ -619,18 +1458,20 @@ def main():
 
         # Live IDS
         settings.logger.info("Start IDS live...")
+        if settings.profiler is not None:
+            settings.profiler.instrument(idss, "live")
         live_idss(idss, combiner)
     except BrokenPipeError:
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
 
     # Finalize and close
+    if settings.profiler is not None:
+        settings.profiler.close()
     if settings.output and settings.outputfd != sys.stdout:
         settings.outputfd.close()
-    if settings.live_ipal:
-        settings.live_ipalfd.close()
-    if settings.live_state:
-        settings.live_statefd.close()
+    for fd in settings.live_ipalfds + settings.live_statefds:
+        fd.close()
 
 
 if __name__ == "__main__":
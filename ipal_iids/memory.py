@@ -0,0 +1,196 @@
+import collections
+import itertools
+import os
+import re
+import sys
+import time
+import types
+
+import numpy as np
+
+import ipal_iids.settings as settings
+
+# Memory accounting of the IDSs during the live detection. Every interval seconds, the
+# approximate size of each IDS's state and model (MetaIDS.memory_usage) is logged and,
+# if metrics are enabled, exposed with them. Sizes are estimated by walking the objects
+# of an IDS, where large containers are extrapolated from a sample of their elements,
+# such that a check takes about the same time for small and large models.
+#
+# An IDS config may set a soft and a hard memory limit ("memory-soft-limit" and
+# "memory-hard-limit", in bytes or with a K, M, or G suffix). Above the soft limit, the
+# IDS's eviction policy (MetaIDS.evict) shrinks its state to EVICT_TO of the limit. Above
+# the hard limit (after eviction), the IDS is disabled: it raises no alerts anymore and
+# its score is None, while the other IDSs keep running. With live workers or shards, the
+# limits apply to the copy of the IDS in each process.
+
+SAMPLE = 16  # Elements measured per container (even, such that dicts keep pairs)
+MAXDEPTH = 16
+EVICT_TO = 0.75  # Fraction of the soft limit to evict to
+SUFFIXES = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+SCALARS = (str, bytes, int, float, bool, complex, type(None))
+SKIPPED = (
+    types.ModuleType,
+    type,
+    types.FunctionType,
+    types.MethodType,
+    types.BuiltinFunctionType,
+)
+
+
+def parse_size(value):
+    # Returns the bytes of a size such as 1048576, "512K", "1.5G", or "64MiB"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        size = value
+    else:
+        match = re.fullmatch(
+            r"\s*([0-9]*\.?[0-9]+)\s*([KMGT]?)(?:i?B)?\s*", str(value), re.IGNORECASE
+        )
+        if match is None:
+            raise ValueError("Invalid size {}".format(value))
+        size = float(match.group(1)) * SUFFIXES[match.group(2).upper()]
+
+    if size <= 0:
+        raise ValueError("Invalid size {}".format(value))
+    return int(size)
+
+
+def approximate_size(obj, sample=SAMPLE):
+    # Approximate size in bytes of an object and everything it references
+    seen = set()
+
+    def size(obj, depth):
+        if isinstance(obj, SCALARS):
+            return sys.getsizeof(obj)
+        if isinstance(obj, SKIPPED) or id(obj) in seen or depth > MAXDEPTH:
+            return 0
+        seen.add(id(obj))
+
+        total = sys.getsizeof(obj)  # Includes the data of numpy arrays
+        if isinstance(obj, np.ndarray):
+            return total
+
+        if isinstance(obj, dict):
+            elements = itertools.chain.from_iterable(obj.items())
+            n = 2 * len(obj)
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            elements = iter(obj)
+            n = len(obj)
+        else:
+            elements = iter(
+                [getattr(obj, "__dict__", {})]
+                + [
+                    getattr(obj, slot)
+                    for slot in getattr(type(obj), "__slots__", [])
+                    if hasattr(obj, slot)
+                ]
+            )
+            n = None
+
+        # Extrapolate the elements of containers from the first sample elements
+        measured = [
+            size(element, depth + 1)
+            for element in itertools.islice(elements, None if n is None else sample)
+        ]
+        if len(measured) > 0:
+            total += sum(measured) * (len(measured) if n is None else n) / len(measured)
+        return total
+
+    return int(size(obj, 0))
+
+
+class MemoryGuard:
+    # Checks the memory of the IDSs in this process every interval seconds between batches
+
+    def __init__(self, idss, interval):
+        self.idss = idss  # Shared with the model reloader, which replaces IDSs in place
+        self.interval = interval
+        self.limits = {}  # Name -> (soft, hard)
+        self.evictions = collections.Counter()
+        self._warned = set()  # IDSs exceeding the soft limit without eviction policy
+        self._next = time.time() + interval
+
+        for ids in idss:
+            limits = []
+            for key in ["memory-soft-limit", "memory-hard-limit"]:
+                value = ids.settings.get(key)
+                try:
+                    limits.append(None if value is None else parse_size(value))
+                except ValueError:
+                    settings.logger.error(
+                        "Option '{}' of IDS {} must be a positive size, e.g., 512M".format(
+                            key, ids._name
+                        )
+                    )
+                    exit(1)
+            self.limits[ids._name] = tuple(limits)
+
+    def next_batch(self):
+        if time.time() >= self._next:
+            self._next = time.time() + self.interval
+            self.check()
+
+    def check(self):
+        for ids in self.idss:
+            soft, hard = self.limits.get(ids._name, (None, None))
+            limit = soft if soft is not None else hard
+            usage = ids.memory_usage()
+
+            if not ids._disabled and limit is not None and usage > limit:
+                usage = self._evict(ids, usage, limit)
+
+            if not ids._disabled and hard is not None and usage > hard:
+                self._disable(ids, usage, hard)
+                usage = ids.memory_usage()
+
+            settings.logger.info(
+                "Memory of {}: {} bytes{}".format(
+                    ids._name, usage, " (disabled)" if ids._disabled else ""
+                )
+            )
+
+            if settings.metrics is not None:
+                settings.metrics.observe_memory(
+                    ids._name,
+                    os.getpid(),
+                    {
+                        "bytes": usage,
+                        "evictions": self.evictions[ids._name],
+                        "disabled": ids._disabled,
+                    },
+                )
+
+    def _evict(self, ids, usage, limit):
+        try:
+            ids.evict(int(limit * EVICT_TO))
+        except NotImplementedError:
+            if ids._name not in self._warned:
+                settings.logger.warning(
+                    "{} exceeds its memory limit ({} > {} bytes) but has no eviction policy".format(
+                        ids._name, usage, limit
+                    )
+                )
+                self._warned.add(ids._name)
+            return usage
+
+        evicted = ids.memory_usage()
+        self.evictions[ids._name] += 1
+        settings.logger.warning(
+            "Evicted state of {} exceeding its memory limit ({} -> {} bytes)".format(
+                ids._name, usage, evicted
+            )
+        )
+        return evicted
+
+    def _disable(self, ids, usage, limit):
+        settings.logger.error(
+            "{} exceeds its hard memory limit ({} > {} bytes) and is disabled. It raises no alerts from now on.".format(
+                ids._name, usage, limit
+            )
+        )
+        ids._disabled = True
+
+        # Release as much of the state as the IDS is able to
+        try:
+            ids.evict(0)
+        except NotImplementedError:
+            pass
@@ -0,0 +1,72 @@
+import heapq
+
+import ipal_iids.codec as codec
+import ipal_iids.settings as settings
+
+# Merges any number of live IPAL and state inputs into a single stream ordered by the
+# message timestamps. Each input is expected to be ordered up to the reorder window,
+# i.e., a message may arrive at most `window` (in timestamp units) after messages with a
+# larger timestamp of the same input. Messages are only released once all inputs have
+# advanced past their timestamp plus the window, such that an input which stalls also
+# stalls the merged stream.
+
+
+def _read(fd):
+    line = fd.readline()
+    while line and not line.strip():  # Skip empty lines
+        line = fd.readline()
+
+    if line:
+        return codec.loads(line)
+    return None
+
+
+def merge_live_messages(sources, window=0):
+    # sources is a list of (is_ipal, fd). Yields (is_ipal, msg) in timestamp order.
+    if len(sources) == 1:  # Nothing to merge
+        is_ipal, fd = sources[0]
+        msg = _read(fd)
+        while msg is not None:
+            yield is_ipal, msg
+            msg = _read(fd)
+        return
+
+    # Messages read but not yet released: (timestamp, input, sequence, msg)
+    pending = []
+    # Largest timestamp read so far of each input that is not exhausted: (timestamp, input)
+    frontier = [(float("-inf"), i) for i in range(len(sources))]
+    seq = 0
+    last = float("-inf")
+    late = 0
+
+    while len(frontier) > 0:
+        # Advance the input that holds back the merged stream the most
+        timestamp, i = heapq.heappop(frontier)
+        msg = _read(sources[i][1])
+
+        if msg is not None:
+            heapq.heappush(pending, (msg["timestamp"], i, seq, msg))
+            heapq.heappush(frontier, (max(timestamp, msg["timestamp"]), i))
+            seq += 1
+
+        # Release all messages that no input can precede anymore
+        watermark = frontier[0][0] - window if len(frontier) > 0 else float("inf")
+        while len(pending) > 0 and pending[0][0] <= watermark:
+            timestamp, i, _, msg = heapq.heappop(pending)
+
+            if timestamp < last:
+                late += 1
+                if late == 1:
+                    settings.logger.warning(
+                        "Message with timestamp {} arrived after {}. Consider increasing the reorder window.".format(
+                            timestamp, last
+                        )
+                    )
+            last = max(last, timestamp)
+
+            yield sources[i][0], msg
+
+    if late > 0:
+        settings.logger.warning(
+            "{} messages were out of order beyond the reorder window".format(late)
+        )
@@ -0,0 +1,393 @@
+import bisect
+import http.server
+import json
+import os
+import threading
+import time
+
+import ipal_iids.codec as codec
+import ipal_iids.settings as settings
+
+# Latency and throughput metrics of the live detection. Durations are collected per stage
+# (decode, ids, preprocessor, combiner, encode) and name (e.g., the IDS) into histograms
+# with fixed buckets, such that recording is a bisect and three additions. Batches are
+# recorded as len(batch) observations of the mean duration per message. The metrics are
+# written periodically to a JSON stats file and/or served in the Prometheus text format.
+#
+# Durations are measured by wrappers around the IDSs, preprocessors, combiner, and JSON
+# codec. Only every sample-th batch is timed; for the other batches, the wrappers are
+# removed again, such that the overhead is limited to the sampled batches. The number of
+# messages and alerts is always exact, whereas the count of a histogram is the number of
+# timed messages. If metrics are disabled (settings.metrics is None), no instrumentation
+# is installed at all. Worker processes collect metrics into their own copy and hand them
+# back with each result (see drain).
+# The memory of the IDSs is reported per process by the memory guard (ipal_iids/memory.py).
+
+BUCKETS = [1e-6 * 2**i for i in range(25)]  # Upper bounds from 1us to ~16.8s
+
+
+class Histogram:
+    __slots__ = ["counts", "count", "sum", "max"]
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last bucket holds larger values
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value, n=1):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += n
+        self.count += n
+        self.sum += value * n
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the quantile, at most the maximum
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count > 0 else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    def __init__(self, sample=1):
+        self.histograms = {}  # (stage, name) -> Histogram
+        self.memory = {}  # (IDS, pid) -> {"bytes", "evictions", "disabled"}
+        self.messages = 0
+        self.alerts = 0
+        self.start = time.time()
+
+        self.sample = sample  # Time every sample-th batch, starting with the first
+        self.timing = True  # Whether the current batch is timed
+        self._batches = 0
+        self._instrumentation = {}  # Key -> (enable, disable)
+
+    def instrument(self, key, enable, disable):
+        # Registers functions switching the timing of a component on and off. Replaces
+        # (and disables) the functions previously registered under the same key.
+        if key in self._instrumentation and self.timing:
+            self._instrumentation[key][1]()
+
+        if enable is None:
+            self._instrumentation.pop(key, None)
+        else:
+            self._instrumentation[key] = (enable, disable)
+            if self.timing:
+                enable()
+
+    def next_batch(self, batch=None):
+        # Counts the messages of a processed batch, decides whether the next batch is
+        # timed, and switches the instrumentation accordingly
+        if batch is not None:
+            self.messages += len(batch)
+            for msg in batch:
+                if msg["ids"] is True:
+                    self.alerts += 1
+
+        self._batches += 1
+        timing = self._batches % self.sample == 0
+
+        if timing != self.timing:
+            self.timing = timing
+            for enable, disable in list(self._instrumentation.values()):
+                if timing:
+                    enable()
+                else:
+                    disable()
+
+    def observe(self, stage, name, duration, n=1):
+        histogram = self.histograms.get((stage, name))
+        if histogram is None:
+            histogram = self.histograms.setdefault((stage, name), Histogram())
+        histogram.observe(duration, n)
+
+    def observe_memory(self, name, pid, report):
+        self.memory[name, pid] = report
+
+    def drain(self):
+        # Returns and resets the histograms and memory reports, e.g., to hand them from a
+        # worker to the parent
+        drained = (self.histograms, self.memory)
+        self.histograms, self.memory = {}, {}
+        return drained
+
+    def merge(self, drained):
+        histograms, memory = drained
+        for key, histogram in histograms.items():
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].merge(histogram)
+        self.memory.update(memory)
+
+    def _memory(self):
+        # Memory per IDS, summed over the processes running a copy of it
+        memory = {}
+        for (name, _), report in sorted(self.memory.items()):
+            total = memory.setdefault(
+                name, {"bytes": 0, "evictions": 0, "disabled": False}
+            )
+            total["bytes"] += report["bytes"]
+            total["evictions"] += report["evictions"]
+            total["disabled"] |= report["disabled"]
+        return memory
+
+    def to_dict(self):
+        uptime = time.time() - self.start
+        latency = {}
+        for (stage, name), histogram in sorted(self.histograms.items()):
+            latency.setdefault(stage, {})[name] = histogram.to_dict()
+
+        return {
+            "timestamp": time.time(),
+            "uptime": uptime,
+            "messages": self.messages,
+            "alerts": self.alerts,
+            "messages_per_second": self.messages / uptime if uptime > 0 else 0,
+            "alerts_per_second": self.alerts / uptime if uptime > 0 else 0,
+            "latency": latency,
+            "memory": self._memory(),
+        }
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP ipal_iids_messages_total Live messages processed.",
+            "# TYPE ipal_iids_messages_total counter",
+            "ipal_iids_messages_total {}".format(self.messages),
+            "# HELP ipal_iids_alerts_total Live messages with an alert.",
+            "# TYPE ipal_iids_alerts_total counter",
+            "ipal_iids_alerts_total {}".format(self.alerts),
+            "# HELP ipal_iids_latency_seconds Processing time per message and stage.",
+            "# TYPE ipal_iids_latency_seconds histogram",
+        ]
+
+        for (stage, name), histogram in sorted(self.histograms.items()):
+            labels = 'stage="{}",name="{}"'.format(stage, name.replace('"', '\\"'))
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(
+                    'ipal_iids_latency_seconds_bucket{{{},le="{:g}"}} {}'.format(
+                        labels, bound, cumulative
+                    )
+                )
+            lines.append(
+                'ipal_iids_latency_seconds_bucket{{{},le="+Inf"}} {}'.format(
+                    labels, histogram.count
+                )
+            )
+            lines.append(
+                "ipal_iids_latency_seconds_sum{{{}}} {}".format(labels, histogram.sum)
+            )
+            lines.append(
+                "ipal_iids_latency_seconds_count{{{}}} {}".format(
+                    labels, histogram.count
+                )
+            )
+
+        memory = self._memory()
+        if len(memory) > 0:
+            for metric, key, kind, description in [
+                ("memory_bytes", "bytes", "gauge", "Approximate memory of the IDS."),
+                ("evictions_total", "evictions", "counter", "Evictions of the IDS."),
+                ("disabled", "disabled", "gauge", "Whether the IDS is disabled."),
+            ]:
+                lines.append("# HELP ipal_iids_{} {}".format(metric, description))
+                lines.append("# TYPE ipal_iids_{} {}".format(metric, kind))
+                for name, report in memory.items():
+                    lines.append(
+                        'ipal_iids_{}{{name="{}"}} {}'.format(
+                            metric, name.replace('"', '\\"'), int(report[key])
+                        )
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+def _timed(function, stage, name, metrics):
+    def timed(*args):
+        start = time.perf_counter()
+        result = function(*args)
+        metrics.observe(stage, name, time.perf_counter() - start)
+        return result
+
+    return timed
+
+
+def _timed_batch(function, stage, name, metrics, running):
+    # running is shared by the wrappers of an IDS, such that nested calls (e.g., a
+    # new_ipal_batch calling new_state_batch) are timed by the outer call only
+    def timed(msgs):
+        if running[0]:
+            return function(msgs)
+
+        running[0] = True
+        try:
+            start = time.perf_counter()
+            result = function(msgs)
+        finally:
+            running[0] = False
+        if len(msgs) > 0:
+            duration = (time.perf_counter() - start) / len(msgs)
+            metrics.observe(stage, name, duration, len(msgs))
+        return result
+
+    return timed
+
+
+def _instrument_methods(metrics, key, wrappers):
+    # wrappers is a list of (object, method name, timed method). Disabling restores
+    # methods set on the object before, e.g., by the profiler.
+    original = [obj.__dict__.get(method) for obj, method, _ in wrappers]
+
+    def enable():
+        for obj, method, timed in wrappers:
+            setattr(obj, method, timed)
+
+    def disable():
+        for (obj, method, _), function in zip(wrappers, original):
+            if function is None:
+                obj.__dict__.pop(method, None)
+            else:
+                setattr(obj, method, function)
+
+    metrics.instrument(key, enable, disable)
+
+
+def instrument_codec(metrics):
+    # Time the JSON codec of live messages. Returns a function restoring the codec.
+    loads, dumps = codec.loads, codec.dumps
+    timed_loads = _timed(loads, "decode", "json", metrics)
+    timed_dumps = _timed(dumps, "encode", "json", metrics)
+
+    def enable():
+        codec.loads, codec.dumps = timed_loads, timed_dumps
+
+    def disable():
+        codec.loads, codec.dumps = loads, dumps
+
+    metrics.instrument("codec", enable, disable)
+    return lambda: metrics.instrument("codec", None, None)
+
+
+def instrument_idss(metrics, idss, names=None):
+    # Time the IDSs and their preprocessors (or of the IDSs with the given names)
+    for ids in idss:
+        if names is not None and ids._name not in names:
+            continue
+
+        running = [False]
+        wrappers = [
+            (
+                ids,
+                method,
+                _timed_batch(getattr(ids, method), "ids", ids._name, metrics, running),
+            )
+            for method in ["new_ipal_batch", "new_state_batch"]
+        ]
+        # Fused preprocessors (see preprocessors/affine.py) are timed together
+        stages = getattr(ids, "_stages", None)
+        if stages is None:
+            stages = getattr(ids, "preprocessors", [])
+        for pre in stages:
+            name = "{}.{}".format(ids._name, pre._name)
+            timed = _timed(pre.transform, "preprocessor", name, metrics)
+            wrappers.append((pre, "transform", timed))
+
+        _instrument_methods(metrics, ("ids", ids._name), wrappers)
+
+
+def instrument_combiner(metrics, combiner):
+    timed = _timed(combiner.combine, "combiner", combiner._name, metrics)
+    _instrument_methods(
+        metrics, ("combiner", combiner._name), [(combiner, "combine", timed)]
+    )
+
+
+class StatsWriter:
+    # Writes the metrics to a JSON file every interval seconds and when closed. The file is
+    # replaced atomically, such that readers never see a partial file.
+
+    def __init__(self, metrics, filename, interval):
+        self.metrics = metrics
+        self.filename = filename
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self):
+        tmp = "{}.tmp".format(self.filename)
+        with open(tmp, "w") as f:
+            json.dump(self.metrics.to_dict(), f, indent=4)
+        os.replace(tmp, self.filename)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                settings.logger.warning("Writing stats file failed: {}".format(e))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+class MetricsServer:
+    # Serves the metrics in the Prometheus text format on http://HOST:PORT/metrics
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ["/", "/metrics"]:
+                    self.send_error(404)
+                    return
+
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                settings.logger.debug(format % args)
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        settings.logger.info(
+            "Serving metrics on http://{}:{}/metrics".format(
+                host, self.server.server_address[1]
+            )
+        )
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import threading
+from urllib.parse import urlparse
+
+import ipal_iids.settings as settings
+
+# Network listeners for live IPAL and state messages. A listener runs an asyncio event
+# loop in a background thread and accepts any number of concurrent producers sending
+# newline-delimited JSON (tcp://HOST:PORT, unix:///PATH) or datagrams holding one or more
+# complete messages (udp://HOST:PORT). Received data is handed to the detection through
+# a bounded queue of chunks, each holding complete lines only. If the queue is full, TCP
+# and Unix socket producers are no longer read from, such that the kernel buffers fill up
+# and the producers block (backpressure). UDP has no flow control and datagrams received
+# while the queue is full are dropped.
+#
+# The listener is read like a file with readline(), returning one message as bytes (the
+# JSON codecs parse bytes directly) and b"" once the listener was stopped and drained.
+
+SCHEMES = ["tcp", "udp", "unix"]
+READSIZE = 1 << 16
+GRACE = 1  # Time in s to let connected producers finish after the listener is stopped
+
+
+def is_network_address(filename):
+    return isinstance(filename, str) and filename.split("://")[0] in SCHEMES
+
+
+class NetworkListener:
+    def __init__(self, address, queue_size=64):
+        self.address = address
+        self.queue_size = queue_size
+
+        url = urlparse(address)
+        self.scheme = url.scheme
+        if self.scheme == "unix":
+            self.path = url.netloc + url.path
+        else:
+            self.host = url.hostname or "0.0.0.0"
+            self.port = url.port
+            if self.port is None:
+                raise ValueError("No port given in {}".format(address))
+
+        self._lines = []  # Lines of the current chunk
+        self._next = 0
+        self._eof = False
+
+        self.dropped = 0  # UDP datagrams dropped due to a full queue
+        self._servers = []
+        self._connections = set()
+        self._stopped = False
+
+        # Start the event loop and wait until the listener is bound
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+        if self._error is not None:
+            raise self._error
+        settings.logger.info("Listening for live messages on {}".format(address))
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+
+        try:
+            self._loop.run_until_complete(self._listen())
+        except Exception as e:
+            self._error = e
+            self._started.set()
+            return
+
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _listen(self):
+        if self.scheme == "tcp":
+            server = await asyncio.start_server(
+                self._handle, self.host, self.port, limit=READSIZE
+            )
+        elif self.scheme == "unix":
+            server = await asyncio.start_unix_server(
+                self._handle, self.path, limit=READSIZE
+            )
+        else:
+            server, _ = await self._loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(self.host, self.port)
+            )
+        self._servers.append(server)
+
+    async def _handle(self, reader, writer):
+        # Splits the stream of a single producer at the last newline of each read, such
+        # that chunks only hold complete lines. Only an incomplete tail is copied.
+        task = asyncio.current_task()
+        self._connections.add(task)
+        tail = b""
+
+        try:
+            while True:
+                data = await reader.read(READSIZE)
+                if not data:
+                    break
+
+                end = data.rfind(b"\n") + 1
+                if end == 0:  # No complete line yet
+                    tail += data
+                    continue
+
+                if end == len(data):
+                    chunk = tail + data if tail else data
+                    tail = b""
+                else:
+                    chunk = tail + data[:end]
+                    tail = data[end:]
+                await self._queue.put(chunk)
+
+            if tail.strip():  # Last message without newline
+                await self._queue.put(tail)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._connections.discard(task)
+
+    def _datagram(self, data):
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1:
+                settings.logger.warning(
+                    "Live input queue of {} is full, dropping datagrams".format(
+                        self.address
+                    )
+                )
+
+    async def _stop(self):
+        for server in self._servers:
+            server.close()
+        if self.scheme == "unix" and os.path.exists(self.path):
+            os.remove(self.path)
+
+        # Let connected producers finish sending before closing their connections
+        if len(self._connections) > 0:
+            _, pending = await asyncio.wait(list(self._connections), timeout=GRACE)
+            for task in pending:
+                task.cancel()
+
+        await self._queue.put(None)
+
+    def stop(self):
+        # Stops accepting messages. Already received messages are still read.
+        if not self._stopped:
+            self._stopped = True
+            asyncio.run_coroutine_threadsafe(self._stop(), self._loop)
+
+    def readline(self):
+        while True:
+            while self._next < len(self._lines):
+                line = self._lines[self._next]
+                self._next += 1
+                if line.strip():
+                    return line
+
+            if self._eof:
+                return b""
+
+            chunk = asyncio.run_coroutine_threadsafe(
+                self._queue.get(), self._loop
+            ).result()
+            if chunk is None:
+                self._eof = True
+                chunk = b""
+            self._lines = chunk.split(b"\n")
+            self._next = 0
+
+    def close(self):
+        if not self._stopped:
+            self.stop()
+        if not self._eof:  # Drain until the listener is stopped
+            while self.readline():
+                pass
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+        if self.dropped > 0:
+            settings.logger.warning(
+                "{} datagrams were dropped on {}".format(self.dropped, self.address)
+            )
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, listener):
+        self.listener = listener
+
+    def datagram_received(self, data, addr):
+        self.listener._datagram(data)
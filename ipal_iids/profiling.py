@@ -0,0 +1,216 @@
+import cProfile
+import glob
+import os
+import pstats
+import re
+import signal
+from collections import Counter
+
+import ipal_iids.settings as settings
+
+# Profiling of the IDSs. With --profile train|live|all, the training and/or live callbacks
+# of each IDS run under a cProfile profiler of their own, and one pstats file per IDS and
+# phase is written to the profile directory (<IDS>.<phase>.pstats, e.g., for snakeviz or
+# python -m pstats). IDSs trained or run in worker processes write their profiles from
+# there. All profiles are combined into a single collapsed-stack file (profile.collapsed,
+# in microseconds) for flame graph tools such as flamegraph.pl or speedscope, with the
+# phase and IDS as the two outermost frames. Since cProfile only records caller-callee
+# pairs, the stacks are reconstructed by splitting the time of each function among its
+# callers (as flameprof does).
+#
+# For long live runs, the sampling profiler (--profile-sampler MS) replaces cProfile in the
+# live phase. A SIGPROF timer interrupts the main process every MS milliseconds of CPU time
+# and the interrupted stack is attributed to the IDS running at that moment. The number of
+# samples per stack is written to live-samples.collapsed. The overhead does not depend on
+# the number of function calls, but IDSs in worker processes are not sampled.
+
+PHASES = ["train", "live", "all"]
+METHODS = {
+    "train": ["train", "train_begin", "train_step", "train_columns", "train_finish"],
+    "live": ["new_ipal_batch", "new_state_batch"],
+}
+COLLAPSED = "profile.collapsed"
+SAMPLES = "live-samples.collapsed"
+MAXDEPTH = 128
+
+
+def _filename(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def _frame(filename, line, name):
+    # Frame label in collapsed stacks
+    if filename == "~":  # Built-in function
+        label = name
+    else:
+        label = "{}:{}".format(os.path.basename(filename), name)
+    return label.replace(";", ",").replace(" ", "_")
+
+
+def collapse(stats, prefix):
+    # Reconstructs the stacks of a pstats.Stats object. Returns a Counter of collapsed
+    # stacks (starting with prefix) and their time in microseconds.
+    stacks = Counter()
+    entries = {
+        func: entry
+        for func, entry in stats.stats.items()
+        if "_lsprof.Profiler" not in func[2]
+    }
+
+    children = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            if caller in entries:
+                children.setdefault(caller, []).append((func, edge[3]))
+
+    def walk(func, cumulative, stack):
+        _, _, tt, ct, _ = entries[func]
+        stack = stack + [_frame(*func)]
+        scale = cumulative / ct if ct > 0 else 0
+
+        stacks[";".join(stack)] += tt * scale * 1e6
+        if len(stack) >= MAXDEPTH:
+            return
+
+        for child, edge in children.get(func, []):
+            if _frame(*child) in stack:  # Recursion, time already accounted
+                continue
+            if edge * scale * 1e6 >= 1:
+                walk(child, edge * scale, stack)
+
+    roots = [
+        func
+        for func, (_, _, _, _, callers) in entries.items()
+        if not any(caller in entries for caller in callers)
+    ]
+    for root in roots:
+        walk(root, entries[root][3], list(prefix))
+
+    return Counter({stack: value for stack, value in stacks.items() if value >= 1})
+
+
+class Profiler:
+    def __init__(self, directory, phase, sampler=None):
+        self.directory = directory
+        self.phases = ["train", "live"] if phase == "all" else [phase]
+        self.sampler = sampler  # Sampling interval in ms for the live phase
+
+        self._profiles = {}  # (name, phase) -> [profile, depth, calls]
+        self._samples = Counter()
+        self._sampling = False
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, phase, suffix=""):
+        return os.path.join(
+            self.directory, "{}.{}{}.pstats".format(_filename(name), phase, suffix)
+        )
+
+    def _parts(self, name, phase):
+        # Profiles written by worker processes
+        prefix = os.path.join(self.directory, "{}.{}.".format(_filename(name), phase))
+        return glob.glob(glob.escape(prefix) + "*.pstats")
+
+    def _profiled(self, function, name, phase):
+        entry = self._profiles.setdefault((name, phase), [cProfile.Profile(), 0, 0])
+
+        def profiled(*args, **kwargs):
+            if entry[1] > 0:  # Called from another profiled callback of the IDS
+                return function(*args, **kwargs)
+
+            entry[1] += 1
+            entry[2] += 1
+            entry[0].enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                entry[0].disable()
+                entry[1] -= 1
+
+        return profiled
+
+    def instrument(self, idss, phase, names=None):
+        # Profiles the callbacks of the IDSs (or of the IDSs with the given names)
+        if phase not in self.phases:
+            return
+
+        if phase == "live" and self.sampler is not None:
+            if not self._sampling:
+                signal.signal(signal.SIGPROF, self._sample)
+                signal.setitimer(
+                    signal.ITIMER_PROF, self.sampler / 1000, self.sampler / 1000
+                )
+                self._sampling = True
+            return
+
+        for ids in idss:
+            if names is not None and ids._name not in names:
+                continue
+
+            # Remove profiles of previous runs
+            if (ids._name, phase) not in self._profiles:
+                for path in [self._path(ids._name, phase)] + self._parts(
+                    ids._name, phase
+                ):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            for method in METHODS[phase]:
+                profiled = self._profiled(getattr(ids, method), ids._name, phase)
+                setattr(ids, method, profiled)
+
+    def _sample(self, signum, frame):
+        # Records the interrupted stack of the main thread
+        stack = []
+        ids = "other"  # Not within an IDS, e.g., reading or writing messages
+
+        while frame is not None:
+            code = frame.f_code
+            stack.append(_frame(code.co_filename, code.co_firstlineno, code.co_name))
+            if code.co_name in METHODS["live"]:
+                ids = getattr(frame.f_locals.get("self"), "_name", ids)
+            frame = frame.f_back
+
+        self._samples[";".join(["live", _filename(ids)] + stack[::-1])] += 1
+
+    def dump(self, phase, names=None, suffix=""):
+        # Writes the profiles of a phase that were recorded in this process
+        for (name, profile_phase), (profile, _, calls) in self._profiles.items():
+            if profile_phase != phase or calls == 0:
+                continue
+            if names is not None and name not in names:
+                continue
+            profile.dump_stats(self._path(name, phase, suffix))
+
+    def close(self):
+        if self._sampling:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+            with open(os.path.join(self.directory, SAMPLES), "w") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write("{} {}\n".format(stack, count))
+
+        for phase in self.phases:
+            self.dump(phase)
+
+        # Combine the profiles of worker processes and collapse all stacks
+        stacks = Counter()
+        for name, phase in sorted(self._profiles):
+            path = self._path(name, phase)
+            parts = self._parts(name, phase)
+            files = ([path] if os.path.exists(path) else []) + parts
+            if len(files) == 0:
+                continue
+
+            stats = pstats.Stats(*files)
+            stats.dump_stats(path)
+            for part in parts:
+                os.remove(part)
+
+            stacks.update(collapse(stats, [phase, _filename(name)]))
+
+        with open(os.path.join(self.directory, COLLAPSED), "w") as f:
+            for stack, value in sorted(stacks.items()):
+                f.write("{} {}\n".format(stack, int(value)))
+
+        settings.logger.info("Wrote profiles to {}".format(self.directory))
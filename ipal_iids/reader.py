@@ -0,0 +1,33 @@
+import numpy as np
+
+import ipal_iids.codec as codec
+
+# Streaming readers for training files. Messages are parsed line by line such that the
+# memory required for training depends on what an IDS keeps and not on the file size.
+
+
+def read_messages(fd):
+    # Yields the parsed messages of an open file, skipping empty lines
+    for line in fd:
+        if not line.strip():
+            continue
+        yield codec.loads(line)
+
+
+def read_chunks(msgs, extract, chunksize=65536, dtype=np.float64):
+    # Groups the values returned by extract(msg) into numpy blocks of up to chunksize
+    # rows. Messages for which extract returns None are skipped.
+    chunk = []
+
+    for msg in msgs:
+        value = extract(msg)
+        if value is None:
+            continue
+
+        chunk.append(value)
+        if len(chunk) >= chunksize:
+            yield np.array(chunk, dtype=dtype)
+            chunk = []
+
+    if len(chunk) > 0:
+        yield np.array(chunk, dtype=dtype)
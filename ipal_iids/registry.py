@@ -0,0 +1,26 @@
+import importlib
+from collections.abc import Mapping
+
+
+class LazyRegistry(Mapping):
+    # Maps the _name of an IDS, combiner, or preprocessor to the module and class
+    # implementing it. Modules are imported on first access only, such that heavy
+    # dependencies (e.g., tensorflow or gurobipy) are loaded only if they are used.
+
+    def __init__(self, entries):
+        self._entries = dict(entries)
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            module, cls = self._entries[name].rsplit(".", 1)
+            self._loaded[name] = getattr(importlib.import_module(module), cls)
+            assert self._loaded[name]._name == name
+
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
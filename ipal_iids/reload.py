@@ -0,0 +1,158 @@
+import os
+import queue
+import threading
+import traceback
+
+import ipal_iids.settings as settings
+
+# Hot reloading of IDS models for long-running (daemon) live detection. A ModelWatcher
+# polls the model files of the IDSs and requests a reload once a file changed and stayed
+# unchanged for one interval (i.e., it was written completely), or for all IDSs when
+# trigger() is called (e.g., on SIGHUP). A ModelReloader loads the new models into fresh
+# IDS instances in a background thread and swaps them into the list of running IDSs
+# between two batches, such that the detection continues with the old model until then.
+# Note that the live state of an IDS (e.g., the last seen timestamps) starts anew with
+# the reloaded model.
+
+
+def _model_file(ids):
+    if ids.settings.get("model-file") is None:
+        return None
+    return str(ids._resolve_model_file_path())
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModelReloader:
+    def __init__(self, idss):
+        self.idss = idss  # Modified in place by swap()
+
+        self._requests = queue.Queue()
+        self._loaded = {}  # Name -> IDS with the new model
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def reload(self, names):
+        for name in names:
+            self._requests.put(name)
+
+    def _run(self):
+        while True:
+            name = self._requests.get()
+
+            for ids in self.idss:
+                if ids._name == name:
+                    break
+            else:
+                continue
+
+            try:
+                new = type(ids)(name=name)
+                loaded = new.load_trained_model()
+            except Exception:
+                settings.logger.warning(
+                    "Reloading model of {} failed, keeping the current model".format(
+                        name
+                    )
+                )
+                settings.logger.warning(traceback.format_exc())
+                continue
+
+            if not loaded:
+                settings.logger.warning(
+                    "No model to reload for {}, keeping the current model".format(name)
+                )
+                continue
+
+            with self._lock:
+                self._loaded[name] = new
+
+    def swap(self):
+        # Replaces the IDSs whose new model is loaded. Returns the names of these IDSs.
+        if len(self._loaded) == 0:
+            return []
+
+        with self._lock:
+            loaded, self._loaded = self._loaded, {}
+
+        for i, ids in enumerate(self.idss):
+            if ids._name in loaded:
+                self.idss[i] = loaded[ids._name]
+                settings.logger.info("Swapped in new model of {}".format(ids._name))
+
+        return list(loaded)
+
+
+class ModelWatcher:
+    def __init__(self, idss, interval, reload):
+        self.interval = interval
+        self.reload = reload  # Called with a list of IDS names to reload
+
+        self._files = {}  # Name -> model file
+        for ids in idss:
+            path = _model_file(ids)
+            if path is not None:
+                self._files[ids._name] = path
+
+        self._stats = {name: _stat(path) for name, path in self._files.items()}
+        self._changed = {}  # Name -> stat when a change was seen
+        self._trigger = threading.Event()
+        self._stop = threading.Event()
+
+        settings.logger.info(
+            "Watching model files of {}".format(", ".join(self._files) or "no IDS")
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def trigger(self):
+        self._trigger.set()
+
+    def _poll(self):
+        names = []
+
+        for name, path in self._files.items():
+            stat = _stat(path)
+            if stat is None or stat == self._stats[name]:
+                self._changed.pop(name, None)
+                continue
+
+            # Wait for one more interval without changes before reloading
+            if self._changed.get(name) == stat:
+                del self._changed[name]
+                self._stats[name] = stat
+                names.append(name)
+            else:
+                self._changed[name] = stat
+
+        return names
+
+    def _run(self):
+        while not self._stop.is_set():
+            triggered = self._trigger.wait(self.interval)
+
+            if self._stop.is_set():
+                break
+            elif triggered:
+                self._trigger.clear()
+                self._stats = {n: _stat(p) for n, p in self._files.items()}
+                self._changed = {}
+                names = list(self._files)
+                settings.logger.info("Reloading all models")
+            else:
+                names = self._poll()
+
+            if len(names) > 0:
+                settings.logger.info("Reloading models of {}".format(", ".join(names)))
+                self.reload(names)
+
+    def close(self):
+        self._stop.set()
+        self._trigger.set()
+        self._thread.join()
@@ -5,22 +5,70 @@ from ids.utils import get_all_iidss
 
 version = "v1.4.10"
 
-# Gzip options
+# Compression options
 compresslevel = 9  # 0 no compress, 1 large/fast, 9 small/slow
+compress_threads = 1  # Threads compressing the output
+
+# JSON backend for messages (auto, orjson, ujson, json)
+json_backend = "json"
 
 # In and output
 config = None
 train_ipal = None
 train_state = None
 train_combiner = None
-live_ipal = None
-live_ipalfd: TextIOWrapper
-live_state = None
-live_statefd: TextIOWrapper
+live_ipal = None  # File or list of files
+live_ipalfds = []
+live_state = None  # File or list of files
+live_statefds = []
+live_reorder_window = 0  # Max. delay of out of order messages within a live input
+live_queue_size = 64  # Number of received chunks buffered per network input
 retrain = False
+train_cache = None  # Directory of the columnar training cache
+train_jobs = 1  # Number of processes training IDSs in parallel
 output = None
 outputfd: TextIOWrapper
 
+# Live batching
+batch_size = 1  # Number of messages handed to the IDSs at once
+batch_timeout = None  # Max. time in ms to wait for a batch to fill up
+live_workers = None  # Number of worker processes running the IDSs
+live_shards = None  # Number of worker processes running partitions of all IDSs
+shard_key = "ids"  # Partition key of stateful IDSs with live_shards
+
+# Daemon mode
+daemon = False  # Swap in changed models during the live detection
+reload_interval = 5  # Interval in s to check the model files for changes
+
+# Output writing
+flush = "always"  # always, every-N, every-Tms, on-alert
+flush_latency = 0  # Max. time in ms until an alert is flushed (with output queue)
+output_queue = 0  # Size of the background writer queue (0: no background writer)
+output_fields = None  # Fields written to the output (None: all fields)
+output_alerts_only = False  # Only write messages with an alert
+output_summary = 0  # Log summary counts every N messages (0: off)
+
+# Metrics
+stats_file = None  # JSON file the metrics are written to
+stats_interval = 10  # Interval in s to write the stats file
+metrics_port = None  # Port serving the metrics in the Prometheus text format
+metrics_sample = 64  # Time every N-th batch
+metrics = None  # Metrics of the live detection if enabled
+
+# Memory accounting
+memory_interval = 60  # Interval in s to check the memory of the IDSs (0: off)
+
+# Checkpoints
+checkpoint = None  # File the runtime state of the live detection is written to
+checkpoint_interval = 60  # Interval in s to write the checkpoint (0: at the end only)
+resume = False  # Restore the state of the checkpoint and skip processed messages
+
+# Profiling
+profile = None  # train, live, or all
+profile_dir = "profile"  # Directory the profiles are written to
+profile_sampler = None  # Sampling interval in ms for the live phase
+profiler = None  # Profiler of the IDSs if enabled
+
 # Logging settings
 hostname = False
 logger = logging.getLogger("ipal-iids")
@@ -29,7 +77,7 @@ logformat = "%(levelname)s:%(name)s:%(message)s"
 logfile = None
 
 # IDS parameters
-idss = {ids._name: {"_type": ids._name} for ids in get_all_iidss().values()}
+idss = {name: {"_type": name} for name in get_all_iidss()}
 
 combinerconfig = None
 combiner = None
@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import ipal_iids.codec as codec
+import ipal_iids.settings as settings
+from combiner.utils import get_all_combiner
+from ids.utils import get_all_iidss
+from ipal_iids.compression import is_compressed, open_compressed
+from ipal_iids.workload import Workload
+from preprocessors.utils import get_all_preprocessors
+
+# Throughput benchmark of the IDSs, preprocessors, and combiners on synthetic workloads
+# (see ipal_iids/workload.py). For each subject and scale, ipal-iids trains on a generated
+# training stream and runs the live detection on a generated test stream with injected
+# attacks, both of scale messages. Each run is a separate process, which reports the
+# training time (log), live messages/s and latency (--stats-file), and its peak RSS.
+#
+# Preprocessors are benchmarked as the only preprocessor of a MinMax IDS and combiners on
+# top of a MinMax and a Steadytime IDS. Subjects that fail, e.g., due to missing optional
+# dependencies, are recorded as failed. The results are written as JSON.
+
+ENSEMBLE = ["MinMax", "Steadytime"]  # IDSs the combiners are benchmarked with
+PREPROCESSOR_IDS = "MinMax"  # IDS the preprocessors are benchmarked with
+DISCRETE_PREPROCESSORS = ["categorical", "label"]  # Applied to discrete sensors only
+TRAINED = re.compile(r"Training of (.+?) (?:combiner )?ended at \S+ \(([0-9.e-]+)s\)")
+
+
+# Wrapper for hiding compressed files
+def open_file(filename, mode):
+    if filename == "-":
+        return sys.stdout
+    elif is_compressed(filename):
+        return open_compressed(filename, mode, compresslevel=settings.compresslevel)
+    else:
+        return open(filename, mode=mode)
+
+
+# Initialize logger
+def initialize_logger(args):
+    if args.log:
+        settings.log = getattr(logging, args.log.upper(), None)
+
+        if not isinstance(settings.log, int):
+            logging.getLogger("ipal-iids-bench").error(
+                "Option '--log' parameter not found"
+            )
+            exit(1)
+
+    if args.logfile:
+        settings.logfile = args.logfile
+        logging.basicConfig(
+            filename=settings.logfile, level=settings.log, format=settings.logformat
+        )
+    else:
+        logging.basicConfig(level=settings.log, format=settings.logformat)
+
+    settings.logger = logging.getLogger("ipal-iids-bench")
+
+
+def prepare_arg_parser(parser):
+    # Workload
+    parser.add_argument(
+        "--generate",
+        dest="generate",
+        metavar="FILE",
+        help="only write a workload of --messages messages to FILE ('-' stdout, '*.gz' compressed).",
+        required=False,
+    )
+    parser.add_argument(
+        "--messages",
+        dest="messages",
+        metavar="INT",
+        type=int,
+        default=10000,
+        help="number of messages written by --generate. Default is 10000.",
+        required=False,
+    )
+    parser.add_argument(
+        "--hosts",
+        dest="hosts",
+        metavar="INT",
+        type=int,
+        default=4,
+        help="number of polled hosts. Default is 4.",
+        required=False,
+    )
+    parser.add_argument(
+        "--sensors",
+        dest="sensors",
+        metavar="INT",
+        type=int,
+        default=16,
+        help="number of sensors of all hosts. Default is 16.",
+        required=False,
+    )
+    parser.add_argument(
+        "--discrete",
+        dest="discrete",
+        metavar="FLOAT",
+        type=float,
+        default=0.25,
+        help="fraction of discrete sensors. Default is 0.25.",
+        required=False,
+    )
+    parser.add_argument(
+        "--cycle",
+        dest="cycle",
+        metavar="INT",
+        type=int,
+        default=100,
+        help="length of the process cycle in polls of all hosts. Default is 100.",
+        required=False,
+    )
+    parser.add_argument(
+        "--attacks",
+        dest="attacks",
+        metavar="INT",
+        type=int,
+        default=5,
+        help="number of attacks injected into the workload. Default is 5.",
+        required=False,
+    )
+    parser.add_argument(
+        "--seed",
+        dest="seed",
+        metavar="INT",
+        type=int,
+        default=0,
+        help="seed of the workload. Default is 0.",
+        required=False,
+    )
+    parser.add_argument(
+        "--run",
+        dest="run",
+        metavar="INT",
+        type=int,
+        default=0,
+        help="stream of the workload written by --generate, e.g., 0 for training and 1 for testing. Default is 0.",
+        required=False,
+    )
+
+    # Benchmark
+    parser.add_argument(
+        "--scales",
+        dest="scales",
+        metavar="LIST",
+        default="1000,10000",
+        help="comma-separated numbers of training and live messages. Default is 1000,10000.",
+        required=False,
+    )
+    parser.add_argument(
+        "--ids",
+        dest="ids",
+        metavar="LIST",
+        help="comma-separated IDSs to benchmark ('' none). Default is all.",
+        required=False,
+    )
+    parser.add_argument(
+        "--preprocessors",
+        dest="preprocessors",
+        metavar="LIST",
+        help="comma-separated preprocessors to benchmark ('' none). Default is all.",
+        required=False,
+    )
+    parser.add_argument(
+        "--combiners",
+        dest="combiners",
+        metavar="LIST",
+        help="comma-separated combiners to benchmark ('' none). Default is all.",
+        required=False,
+    )
+    parser.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        metavar="INT",
+        type=int,
+        default=1,
+        help="live batch size of ipal-iids. Default is 1.",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-sample",
+        dest="metrics_sample",
+        metavar="INT",
+        type=int,
+        default=8,
+        help="time every N-th live batch for the latency (see ipal-iids). Default is 8.",
+        required=False,
+    )
+    parser.add_argument(
+        "--timeout",
+        dest="timeout",
+        metavar="SECONDS",
+        type=float,
+        default=1800,
+        help="time limit of a single run. Default is 1800.",
+        required=False,
+    )
+    parser.add_argument(
+        "--output",
+        dest="output",
+        metavar="FILE",
+        default="-",
+        help="file to write the JSON results to ('-' stdout). Default is stdout.",
+        required=False,
+    )
+
+    # Describe an IDS or combiner (internal, see describe_subject)
+    parser.add_argument("--describe", dest="describe", help=argparse.SUPPRESS)
+
+    # Logging
+    parser.add_argument(
+        "--log",
+        dest="log",
+        metavar="STR",
+        help="define logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL). Default is WARNING.",
+        required=False,
+    )
+    parser.add_argument(
+        "--logfile",
+        dest="logfile",
+        metavar="FILE",
+        default=False,
+        help="File to log to. Default is stderr.",
+        required=False,
+    )
+
+    # Version number
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {settings.version}"
+    )
+
+
+def parse_list(value, available, kind):
+    available = list(available)  # Names only, without importing the registered classes
+    if value is None:
+        return available
+
+    names = [name.strip() for name in value.split(",") if name.strip() != ""]
+    for name in names:
+        if name not in available:
+            settings.logger.error(
+                "{} {} not found! Use one of: {}".format(
+                    kind, name, ", ".join(available)
+                )
+            )
+            exit(1)
+    return names
+
+
+def write_workload(filename, workload, n, run=0):
+    with open_file(filename, "wt") as f:
+        for msg in workload.messages(n, run):
+            f.write(codec.dumps(msg) + "\n")
+
+
+def describe(kind, name):
+    # Default settings and requirements of an IDS or combiner
+    if kind == "ids":
+        settings.idss[name] = {"_type": name}
+        subject = get_all_iidss()[name](name=name)
+        requires_training = True
+    else:
+        settings.combiner = {"_type": name}
+        subject = get_all_combiner()[name]()
+        requires_training = subject._requires_training
+
+    return {
+        "defaults": {"_type": name, **subject._default_settings},
+        "requires": getattr(subject, "_requires", []),
+        "requires_training": requires_training,
+    }
+
+
+_descriptions = {}
+
+
+def describe_subject(kind, name):
+    # Runs describe in a separate process, such that the dependencies of the subject do
+    # not count towards the peak RSS of the runs (which child processes inherit on Linux)
+    if (kind, name) not in _descriptions:
+        process = subprocess.run(
+            [sys.executable, "-m", "ipal_iids.tools.bench"]
+            + ["--describe", "{}:{}".format(kind, name)],
+            env=_environment(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if process.returncode != 0:
+            lines = process.stderr.decode("utf-8", "replace").strip().splitlines()
+            _descriptions[kind, name] = RuntimeError(
+                lines[-1] if len(lines) > 0 else "describe failed"
+            )
+        else:
+            _descriptions[kind, name] = json.loads(process.stdout)
+
+    if isinstance(_descriptions[kind, name], Exception):
+        raise _descriptions[kind, name]
+    return _descriptions[kind, name]
+
+
+def ids_config(name, workload, preprocessors=None):
+    # Default config of an IDS on the features of the workload and its input format
+    description = describe_subject("ids", name)
+    config = dict(description["defaults"])
+
+    config["model-file"] = "./{}.model".format(name)
+    if "features" in config:
+        config["features"] = workload.features()
+    if preprocessors is not None:
+        config["preprocessors"] = preprocessors
+
+    # IDSs run on the state, if supported, and on the IPAL messages otherwise
+    fmt = "state" if "live.state" in description["requires"] else "ipal"
+    return config, fmt
+
+
+def combiner_config(name):
+    description = describe_subject("combiner", name)
+    config = dict(description["defaults"])
+
+    if "keys" in config:
+        config["keys"] = ENSEMBLE
+    if "matrix" in config:
+        config["matrix"] = [[1.0] for _ in ENSEMBLE]
+        config["threshold"] = 1
+
+    return config, description["requires_training"]
+
+
+def _environment():
+    # Makes ipal_iids importable in the child processes
+    root = str(Path(__file__).resolve().parents[2])
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [root] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    return env
+
+
+def run(args, directory, timeout):
+    # Runs ipal-iids and returns its exit code, peak RSS in MB, and wall time
+    start = time.time()
+    with open(os.path.join(directory, "log"), "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "ipal_iids.iids", "--log", "info"] + args,
+            cwd=directory,
+            env=_environment(),
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        if os.WIFEXITED(status):
+            process.returncode = os.WEXITSTATUS(status)
+        else:
+            process.returncode = -os.WTERMSIG(status)
+
+    return process.returncode, usage.ru_maxrss / 1024, time.time() - start
+
+
+def measure(subject, directory, args, timeout):
+    # Runs a subject, given by its kind, name, and the name of the trained IDS or combiner
+    kind, name, trained, stage, stagename = subject
+    result = {"kind": kind, "name": name, "status": "ok"}
+
+    errno, rss, duration = run(
+        args
+        + ["--retrain", "--output", "output.ipal", "--stats-file", "stats.json"]
+        + ["--stats-interval", "3600"],
+        directory,
+        timeout,
+    )
+    result["peak_rss_mb"] = round(rss, 1)
+    result["wall_seconds"] = round(duration, 3)
+
+    with open(os.path.join(directory, "log")) as f:
+        log = f.read()
+
+    if errno != 0 or not os.path.exists(os.path.join(directory, "stats.json")):
+        lines = [line for line in log.splitlines() if line.strip() != ""]
+        result["status"] = "failed"
+        result["error"] = lines[-1] if len(lines) > 0 else "exit code {}".format(errno)
+        return result
+
+    result["train_seconds"] = None
+    for match in TRAINED.finditer(log):
+        if match.group(1) == trained:
+            result["train_seconds"] = round(float(match.group(2)), 6)
+
+    with open(os.path.join(directory, "stats.json")) as f:
+        stats = json.load(f)
+
+    latency = stats["latency"].get(stage, {}).get(stagename, {})
+    result["live_messages"] = stats["messages"]
+    result["live_alerts"] = stats["alerts"]
+    result["messages_per_second"] = round(stats["messages_per_second"], 1)
+    result["p99_latency"] = latency.get("p99")
+    result["latency"] = stats["latency"]
+    return result
+
+
+def subjects(args, workload):
+    # Yields (subject, IDS configs or the exception raised, combiner config, input)
+    for name in parse_list(args.ids, get_all_iidss(), "IDS"):
+        subject = ("ids", name, name, "ids", name)
+        try:
+            config, fmt = ids_config(name, workload)
+        except RuntimeError as e:  # e.g., missing dependencies of the IDS
+            yield subject, e, None, None
+            continue
+        yield subject, {name: config}, None, fmt
+
+    for name in parse_list(args.preprocessors, get_all_preprocessors(), "Preprocessor"):
+        features = workload.features(
+            discrete=True if name in DISCRETE_PREPROCESSORS else None
+        )
+        pre = [{"method": name, "features": features}]
+        config, fmt = ids_config(PREPROCESSOR_IDS, workload, pre)
+        stagename = "{}.{}".format(PREPROCESSOR_IDS, name)
+        subject = ("preprocessor", name, PREPROCESSOR_IDS, "preprocessor", stagename)
+        yield subject, {PREPROCESSOR_IDS: config}, None, fmt
+
+    for name in parse_list(args.combiners, get_all_combiner(), "Combiner"):
+        subject = ("combiner", name, name, "combiner", name)
+        try:
+            combiner = combiner_config(name)
+        except RuntimeError as e:
+            yield subject, e, None, None
+            continue
+        configs = {ids: ids_config(ids, workload)[0] for ids in ENSEMBLE}
+        yield subject, configs, combiner, "state"
+
+
+def make_workload(args):
+    return Workload(
+        hosts=args.hosts,
+        sensors=args.sensors,
+        discrete=args.discrete,
+        cycle=args.cycle,
+        attacks=args.attacks,
+        seed=args.seed,
+    )
+
+
+def bench_scale(args, scale, directory):
+    # Training, live, and combiner training streams (runs 0, 1, 2) of scale messages
+    workload = make_workload(args)
+    files = {}
+    for i, name in enumerate(["train", "test", "combiner"]):
+        files[name] = os.path.join(directory, "{}.ipal".format(name))
+        write_workload(files[name], workload, scale, i)
+
+    results = []
+    for i, (subject, configs, combiner, fmt) in enumerate(subjects(args, workload)):
+        kind, name = subject[:2]
+        settings.logger.info("Benchmarking {} {} at {}".format(kind, name, scale))
+
+        if isinstance(configs, Exception):
+            result = {"kind": kind, "name": name, "status": "failed"}
+            result["error"] = str(configs)
+            results.append({**result, "scale": scale})
+            continue
+
+        rundir = os.path.join(directory, str(i))
+        os.makedirs(rundir)
+        with open(os.path.join(rundir, "ids.config"), "w") as f:
+            json.dump(configs, f, indent=4)
+
+        runargs = ["--config", "ids.config", "--batch-size", str(args.batch_size)]
+        runargs += ["--metrics-sample", str(args.metrics_sample)]
+        trainargs = ["--train.{}".format(fmt), files["train"]]
+
+        if combiner is not None:
+            combiner, requires_training = combiner
+            with open(os.path.join(rundir, "combiner.config"), "w") as f:
+                json.dump(combiner, f, indent=4)
+            runargs += ["--combiner.config", "combiner.config"]
+
+            # Combiners are trained on the output of the IDSs on a third stream
+            if requires_training:
+                if "combiner.train" not in files:
+                    files["combiner.train"] = combiner_training(
+                        rundir, runargs + trainargs, files["combiner"], fmt, args
+                    )
+                runargs += ["--train.combiner", files["combiner.train"]]
+
+        result = measure(
+            subject,
+            rundir,
+            runargs + trainargs + ["--live.{}".format(fmt), files["test"]],
+            args.timeout,
+        )
+        results.append({**result, "scale": scale})
+
+    return results
+
+
+def combiner_training(directory, runargs, live, fmt, args):
+    # Runs the IDSs of the combiners with the default combiner
+    filename = os.path.join(directory, "..", "combiner.train.ipal")
+    errno, _, _ = run(
+        [arg for arg in runargs if arg not in ["--combiner.config", "combiner.config"]]
+        + ["--retrain", "--live.{}".format(fmt), live, "--output", filename],
+        directory,
+        args.timeout,
+    )
+    if errno != 0:
+        settings.logger.warning("Creating the combiner training data failed")
+    return os.path.abspath(filename)
+
+
+def print_table(results):
+    print(
+        "{:<13} {:<20} {:>7} {:>9} {:>10} {:>12} {:>8}".format(
+            "kind", "name", "scale", "train s", "live msg/s", "p99 latency", "RSS MB"
+        ),
+        file=sys.stderr,
+    )
+    for result in results:
+        if result["status"] != "ok":
+            values = ["failed", "", "", ""]
+        else:
+            p99 = result["p99_latency"]
+            values = [
+                "-"
+                if result["train_seconds"] is None
+                else "{:.3f}".format(result["train_seconds"]),
+                "{:.1f}".format(result["messages_per_second"]),
+                "-" if p99 is None else "{:.1f}us".format(p99 * 1e6),
+                "{:.1f}".format(result["peak_rss_mb"]),
+            ]
+        print(
+            "{:<13} {:<20} {:>7} {:>9} {:>10} {:>12} {:>8}".format(
+                result["kind"], result["name"], result["scale"], *values
+            ),
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    prepare_arg_parser(parser)
+
+    args = parser.parse_args()
+    initialize_logger(args)
+
+    if args.describe:
+        kind, name = args.describe.split(":", 1)
+        print(json.dumps(describe(kind, name)))
+        exit(0)
+
+    try:
+        workload = make_workload(args)
+    except ValueError as e:
+        settings.logger.error(str(e))
+        exit(1)
+
+    if args.generate:
+        write_workload(args.generate, workload, args.messages, args.run)
+        exit(0)
+
+    try:
+        scales = [int(scale) for scale in args.scales.split(",")]
+    except ValueError:
+        settings.logger.error("Option '--scales' must list positive integers")
+        exit(1)
+    if len(scales) == 0 or any(scale < 1 for scale in scales):
+        settings.logger.error("Option '--scales' must list positive integers")
+        exit(1)
+
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as directory:
+            results.extend(bench_scale(args, scale, directory))
+
+    print_table(results)
+
+    report = {
+        "version": settings.version,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "workload": {
+            "hosts": args.hosts,
+            "sensors": args.sensors,
+            "discrete": args.discrete,
+            "cycle": args.cycle,
+            "attacks": args.attacks,
+            "seed": args.seed,
+            "batch-size": args.batch_size,
+        },
+        "results": results,
+    }
+    with open_file(args.output, "wt") as f:
+        f.write(json.dumps(report, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    main()
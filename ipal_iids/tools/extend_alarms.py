@@ -1,18 +1,19 @@
 #!/usr/bin/env python3
 import argparse
-import gzip
-import json
 import logging
 import sys
 
+import ipal_iids.codec as codec
 import ipal_iids.settings as settings
+from ipal_iids.compression import is_compressed, open_compressed
+from ipal_iids.reader import read_messages
 
 
 def open_file(filename, mode="r"):
     if filename is None:
         return None
-    elif filename.endswith(".gz"):
-        return gzip.open(filename, mode=mode, compresslevel=settings.compresslevel)
+    elif is_compressed(filename):
+        return open_compressed(filename, mode, compresslevel=settings.compresslevel)
     elif filename == "-":
         return sys.stdin
     else:
@@ -66,6 +67,18 @@ def prepare_arg_parser(parser):
         required=False,
     )
 
+    # JSON backend
+    parser.add_argument(
+        "--json-backend",
+        dest="json_backend",
+        metavar="STR",
+        default="json",
+        help="JSON library used for reading and writing messages ({}). Default is json.".format(
+            ", ".join(codec.BACKENDS)
+        ),
+        required=False,
+    )
+
     # Version number
     parser.add_argument(
         "--version", action="version", version=f"%(prog)s {settings.version}"
@@ -77,8 +90,7 @@ def extend_alarms(file):
 
     # Load file into memory
     with open_file(file, mode="r") as f:
-        for line in f.readlines():
-            ipal.append(json.loads(line))
+        ipal.extend(read_messages(f))
 
     # Extend alarms
     for i in range(len(ipal)):
@@ -98,16 +110,20 @@ def extend_alarms(file):
                     offset = -i
 
                 # TODO does not involve the decision of a combiner and uses simply OR!
-                ipal[i + offset]["ids"] = ipal[i + offset]["ids"] or alert
-                ipal[i + offset]["alerts"][ids] = alert
-                ipal[i + offset]["scores"][ids] = metric
+                # Alerts and scores may be missing in projected output (--output-fields)
+                target = ipal[i + offset]
+                target["ids"] = target.get("ids", False) or alert
+                if "alerts" in target:
+                    target["alerts"][ids] = alert
+                if "scores" in target:
+                    target["scores"][ids] = metric
 
         del ipal[i]["adjust"]
 
     # Write file to disc
     with open_file(file, "wt") as f:
         for out in ipal:
-            f.write(json.dumps(out) + "\n")
+            f.write(codec.dumps(out) + "\n")
 
 
 def main():
@@ -117,6 +133,15 @@ def main():
     args = parser.parse_args()
     initialize_logger(args)
 
+    settings.json_backend = args.json_backend
+    try:
+        codec.set_backend(settings.json_backend)
+    except (ValueError, ImportError):
+        settings.logger.error(
+            "JSON backend {} is not available".format(settings.json_backend)
+        )
+        exit(1)
+
     N = 0
     for file in args.files:
         N += 1
@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 import argparse
-import gzip
 import json
 import logging
 import sys
 
 import ipal_iids.settings as settings
 from ids.utils import get_all_iidss
+from ipal_iids.compression import is_compressed, open_compressed
 
 
-# Wrapper for hiding .gz files
+# Wrapper for hiding compressed files
 def open_file(filename, mode):
-    if filename.endswith(".gz"):
-        return gzip.open(filename, mode=mode, compresslevel=settings.compresslevel)
+    if is_compressed(filename):
+        return open_compressed(filename, mode, compresslevel=settings.compresslevel)
     else:
         return open(filename, mode=mode, buffering=1)
 
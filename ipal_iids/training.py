@@ -0,0 +1,114 @@
+import logging
+import multiprocessing
+import time
+import traceback
+
+import ipal_iids.settings as settings
+from ipal_iids.cache import open_cache
+
+_idss = []  # IDSs to train, inherited by the forked training processes
+
+
+class _IDSLogger(logging.LoggerAdapter):
+    # Prefixes the log messages of a training process with the IDS name
+    def process(self, msg, kwargs):
+        return "[{}] {}".format(self.extra["ids"], msg), kwargs
+
+
+def _train(i):
+    ids = _idss[i]
+    settings.logger = _IDSLogger(settings.logger, {"ids": ids._name})
+
+    start = time.time()
+    settings.logger.info("Training started at {}".format(start))
+
+    try:
+        ids.train(ipal=settings.train_ipal, state=settings.train_state)
+        saved = bool(ids.save_trained_model())
+    except NotImplementedError:
+        saved = False
+    except BaseException:  # Including exit() of the IDS
+        return i, None, traceback.format_exc(), time.time() - start
+
+    end = time.time()
+    settings.logger.info("Training ended at {} ({}s)".format(end, end - start))
+
+    if settings.profiler is not None:
+        settings.profiler.dump("train", [ids._name])
+    return i, saved, None, end - start
+
+
+def _load(ids):
+    try:
+        if not ids.load_trained_model():
+            return False
+    except NotImplementedError:
+        return False
+
+    # Keep the configuration output in line with training in this process
+    settings.idss[ids._name] = ids.settings
+    return True
+
+
+def train_parallel(idss, n):
+    # Trains and saves the IDSs in n processes and loads the saved models back. Returns
+    # the IDSs whose models could not be transferred and still need to be trained.
+    global _idss
+
+    # Models are transferred through their model files, which thus have to be distinct
+    models = {}
+    for ids in idss:
+        if ids.settings["model-file"] is not None:
+            path = str(ids._resolve_model_file_path())
+            models[path] = models.get(path, []) + [ids]
+
+    _idss = [group[0] for group in models.values() if len(group) == 1]
+    for ids in idss:
+        if ids not in _idss:
+            settings.logger.info(
+                "IDS {} has no model file of its own and is trained sequentially".format(
+                    ids._name
+                )
+            )
+
+    if len(_idss) < 2:
+        _idss = []
+        return idss
+
+    # Build training caches before the processes would all build them at once
+    open_cache(settings.train_ipal)
+    open_cache(settings.train_state)
+
+    n = min(n, len(_idss))
+    settings.logger.info("Training {} IDSs in {} processes".format(len(_idss), n))
+
+    context = multiprocessing.get_context("fork")
+    remaining = [ids for ids in idss if ids not in _idss]
+
+    with context.Pool(n, maxtasksperchild=1) as pool:
+        for i, saved, error, duration in pool.imap_unordered(_train, range(len(_idss))):
+            ids = _idss[i]
+
+            if error is not None:
+                settings.logger.error("Training of {} failed".format(ids._name))
+                settings.logger.error(error)
+                exit(1)
+
+            settings.logger.info(
+                "Training of {} ended after {}s".format(ids._name, duration)
+            )
+
+            if saved and _load(ids):
+                settings.logger.info(
+                    "Loaded model of {} trained in parallel.".format(ids._name)
+                )
+            else:
+                settings.logger.info(
+                    "Model of {} could not be transferred, training it again.".format(
+                        ids._name
+                    )
+                )
+                remaining.append(ids)
+
+    _idss = []
+    return [ids for ids in idss if ids in remaining]
@@ -0,0 +1,332 @@
+import multiprocessing
+import os
+import queue
+import traceback
+
+import ipal_iids.settings as settings
+from ipal_iids.checkpoint import checkpoint_idss
+from ipal_iids.memory import MemoryGuard
+from ipal_iids.metrics import instrument_idss
+from ipal_iids.reload import ModelReloader
+
+
+def _detect(idss, batch, is_ipal, rows=None):
+    # Run each IDS on the batch and collect everything the IDSs wrote back into the messages.
+    # If rows is given, each IDS only processes the messages at its rows of the batch.
+    results = {}
+    keys = [set(msg.keys()) for msg in batch]
+
+    for ids in idss:
+        if rows is None:
+            msgs = batch
+        elif ids._name in rows:
+            msgs = [batch[row] for row in rows[ids._name]]
+        else:
+            continue
+
+        if not ids.requires("live.ipal" if is_ipal else "live.state"):
+            continue
+        elif ids._disabled:  # Exceeded its hard memory limit
+            alerts = [(False, None)] * len(msgs)
+        elif is_ipal:
+            alerts = ids.new_ipal_batch(msgs)
+        else:
+            alerts = ids.new_state_batch(msgs)
+
+        assert len(alerts) == len(msgs)
+        adjust = [
+            msg["adjust"].get(ids._name) if "adjust" in msg else None for msg in msgs
+        ]
+        results[ids._name] = (alerts, adjust)
+
+    # Fields added to the messages by the IDSs, e.g., the message hash
+    added = [
+        {k: msg[k] for k in msg.keys() - before - {"adjust"}}
+        for msg, before in zip(batch, keys)
+    ]
+
+    # Metrics collected in this process since the last batch
+    metrics = settings.metrics.drain() if settings.metrics is not None else None
+
+    return results, added, metrics
+
+
+def _worker(idss, tasks, results):
+    reloader = None
+    guard = None
+    if settings.memory_interval > 0:
+        guard = MemoryGuard(idss, settings.memory_interval)
+
+    while True:
+        task = tasks.get()
+        if task is None:  # Shutdown
+            if settings.profiler is not None:
+                settings.profiler.dump("live", suffix=".{}".format(os.getpid()))
+            break
+
+        if task[0] == "reload":  # Load new models in the background of this worker
+            if reloader is None:
+                reloader = ModelReloader(idss)
+            reloader.reload(task[1])
+            continue
+
+        if task[0] == "checkpoint":  # Runtime state of the IDSs of this worker
+            try:
+                results.put((task[1], checkpoint_idss(idss)))
+            except Exception:
+                results.put((task[1], traceback.format_exc()))
+            continue
+
+        if reloader is not None:
+            swapped = reloader.swap()
+            if settings.profiler is not None:
+                settings.profiler.instrument(idss, "live", swapped)
+            if settings.metrics is not None:
+                instrument_idss(settings.metrics, idss, swapped)
+
+        seq, is_ipal, batch, rows = task
+        try:
+            if guard is not None:
+                guard.next_batch()
+            results.put((seq, _detect(idss, batch, is_ipal, rows)))
+            if settings.metrics is not None:
+                settings.metrics.next_batch()
+        except Exception:
+            results.put((seq, traceback.format_exc()))
+
+
+class WorkerError(RuntimeError):
+    # Raised in the main process if a live worker failed or exited
+    pass
+
+
+def _host(address):
+    return address.split(":")[0]
+
+
+# Seconds between liveness checks of a worker while waiting for results
+POLL_INTERVAL = 1
+
+# Partition keys overriding the keys of IDSs with per-host state in sharded mode
+SHARD_KEYS = {
+    "ids": None,  # Partition key of each IDS
+    "src": lambda msg: _host(msg.get("src", "")),
+    "dest": lambda msg: _host(msg.get("dest", "")),
+    "hosts": lambda msg: tuple(
+        sorted([_host(msg.get("src", "")), _host(msg.get("dest", ""))])
+    ),
+}
+
+
+class LiveWorkers:
+    # Distributes the IDSs across worker processes. Each batch of live messages is broadcast
+    # to all workers and their results are merged back into the messages in sequence order.
+
+    def __init__(self, idss, n):
+        self.idss = idss
+        self.seq = 0
+        self._start([idss[i::n] for i in range(min(n, len(idss)))])
+
+    def _start(self, groups):
+        # The workers are forked such that they inherit the trained models
+        context = multiprocessing.get_context("fork")
+
+        self.workers = []
+        self.groups = groups
+        for group in self.groups:
+            tasks = context.Queue()
+            results = context.Queue()
+            process = context.Process(
+                target=_worker, args=(group, tasks, results), daemon=True
+            )
+            process.start()
+            self.workers.append((process, tasks, results))
+
+            settings.logger.info(
+                "Live worker {} runs IDSs {}".format(
+                    process.pid, ", ".join(ids._name for ids in group)
+                )
+            )
+
+    def _get(self, worker, seq):
+        process, _, results = self.workers[worker]
+        while True:
+            try:
+                result_seq, result = results.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if not process.is_alive():  # e.g., killed by the OOM killer
+                    settings.logger.error(
+                        "Live worker {} exited with code {}".format(
+                            process.pid, process.exitcode
+                        )
+                    )
+                    raise WorkerError("Live worker failed")
+        assert result_seq == seq
+
+        if isinstance(result, str):
+            settings.logger.error("Live worker {} failed".format(process.pid))
+            settings.logger.error(result)
+            raise WorkerError("Live worker failed")
+        return result
+
+    def _result(self, worker, seq):
+        results, added, metrics = self._get(worker, seq)
+        if metrics is not None:
+            settings.metrics.merge(metrics)
+        return results, added
+
+    def detect(self, batch, is_ipal):
+        seq = self.seq
+        self.seq += 1
+
+        for _, tasks, _ in self.workers:
+            tasks.put((seq, is_ipal, batch, None))
+
+        # Gather results from all workers
+        merged = {}
+        added = [{} for _ in batch]
+
+        for worker in range(len(self.workers)):
+            results, worker_added = self._result(worker, seq)
+
+            merged.update(results)
+            for fields, worker_fields in zip(added, worker_added):
+                fields.update(worker_fields)
+
+        self._write_back(batch, merged, added)
+
+    def _write_back(self, batch, merged, added):
+        # Write results back in the order of the IDSs
+        for msg, fields in zip(batch, added):
+            msg.update(fields)
+
+        for ids in self.idss:
+            if ids._name not in merged:
+                continue
+
+            alerts, adjust = merged[ids._name]
+            for msg, (alert, score), adj in zip(batch, alerts, adjust):
+                msg["alerts"][ids._name] = alert
+                msg["scores"][ids._name] = score
+
+                if adj is not None:
+                    if "adjust" not in msg:
+                        msg["adjust"] = {}
+                    msg["adjust"][ids._name] = adj
+
+    def reload(self, names):
+        # Let the workers running the given IDSs swap in their new models
+        for group, (_, tasks, _) in zip(self.groups, self.workers):
+            group_names = [ids._name for ids in group if ids._name in names]
+            if len(group_names) > 0:
+                tasks.put(("reload", group_names))
+
+    def checkpoint(self):
+        # Collects the runtime state of the IDSs from all workers (see ipal_iids/checkpoint.py)
+        seq = self.seq
+        self.seq += 1
+
+        for _, tasks, _ in self.workers:
+            tasks.put(("checkpoint", seq))
+
+        checkpoints = {}
+        for worker in range(len(self.workers)):
+            checkpoints.update(self._get(worker, seq))
+        return checkpoints
+
+    def close(self):
+        for process, tasks, _ in self.workers:
+            if process.is_alive():
+                tasks.put(None)
+
+        for process, _, _ in self.workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+
+class ShardedWorkers(LiveWorkers):
+    # Runs all IDSs in each of n worker processes (shards). For each IDS, a message is handed
+    # to the shard owning its partition key (see MetaIDS.partition_key), such that the state
+    # an IDS keeps per key lives in a single shard and sees the messages of that key in
+    # order. Messages of IDSs without state are spread evenly. The results of all shards are
+    # merged back in the order of the messages.
+
+    def __init__(self, idss, n, key="ids"):
+        self.idss = idss
+        self.seq = 0
+        self.n = n
+        self.key = SHARD_KEYS[key]
+        self._next = 0  # Shard of the next message for stateless IDSs
+        self._start([idss] * n)
+
+    def _shard(self, ids, msg):
+        key = ids.partition_key(msg)
+        if key is None:
+            return None
+        if self.key is not None and (key != "" or ids._host_partitioned):
+            key = self.key(msg)
+        elif key == "":  # Single partition, spread the IDSs across the shards
+            key = ids._name
+        return hash(key) % self.n
+
+    def detect(self, batch, is_ipal):
+        seq = self.seq
+        self.seq += 1
+
+        dataformat = "live.ipal" if is_ipal else "live.state"
+        idss = [ids for ids in self.idss if ids.requires(dataformat)]
+
+        # Messages of the batch sent to each shard
+        members = [[] for _ in range(self.n)]
+        rows = [{} for _ in range(self.n)]  # IDS name -> rows of the shard's messages
+
+        for i, msg in enumerate(batch):
+            first = None  # Shard the message was sent to first
+            stateless = []
+
+            for ids in idss:
+                shard = self._shard(ids, msg)
+                if shard is None:
+                    stateless.append(ids._name)
+                    continue
+
+                if len(members[shard]) == 0 or members[shard][-1] != i:
+                    members[shard].append(i)
+                rows[shard].setdefault(ids._name, []).append(len(members[shard]) - 1)
+                if first is None:
+                    first = shard
+
+            # Stateless IDSs preferably run in a shard that receives the message anyway
+            if len(stateless) > 0:
+                if first is None:
+                    first = self._next
+                    self._next = (self._next + 1) % self.n
+                    members[first].append(i)
+
+                for name in stateless:
+                    rows[first].setdefault(name, []).append(len(members[first]) - 1)
+
+        shards = [shard for shard in range(self.n) if len(members[shard]) > 0]
+        for shard in shards:
+            self.workers[shard][1].put(
+                (seq, is_ipal, [batch[i] for i in members[shard]], rows[shard])
+            )
+
+        # Gather results from all shards and restore the order of the batch
+        merged = {ids._name: ([None] * len(batch), [None] * len(batch)) for ids in idss}
+        added = [{} for _ in batch]
+
+        for shard in shards:
+            results, shard_added = self._result(shard, seq)
+
+            for name, (alerts, adjust) in results.items():
+                for row, alert, adj in zip(rows[shard][name], alerts, adjust):
+                    merged[name][0][members[shard][row]] = alert
+                    merged[name][1][members[shard][row]] = adj
+
+            for i, fields in zip(members[shard], shard_added):
+                added[i].update(fields)
+
+        self._write_back(batch, merged, added)
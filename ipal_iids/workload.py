@@ -0,0 +1,154 @@
+import math
+import random
+
+# Synthetic IPAL workloads for benchmarks. A master polls a number of hosts (e.g., PLCs) in
+# a fixed order. Each poll is a request and a response, whose data holds the sensors of the
+# polled host. The messages also carry the state of all sensors (keys "<host>:<sensor>"),
+# such that the same stream serves as IPAL (--*.ipal) and state (--*.state) input.
+#
+# Sensors follow a physical process with a cycle of the given length (in polls of all
+# hosts): continuous sensors a sine with noise, discrete sensors (e.g., valves or pumps) a
+# few levels switched at fixed points of the cycle. During injected attacks, one sensor is
+# manipulated (a continuous value is offset, a discrete one is stuck) and the messages are
+# marked as malicious. The sensors only depend on the parameters and the seed, the stream
+# additionally on the run.
+
+MASTER = "10.0.0.1"
+
+
+class Workload:
+    def __init__(
+        self,
+        hosts=4,
+        sensors=16,
+        discrete=0.25,
+        cycle=100,
+        attacks=0,
+        attack_length=None,
+        interval=0.1,
+        seed=0,
+    ):
+        if hosts < 1 or sensors < hosts:
+            raise ValueError("A workload needs at least one sensor per host")
+        if not 0 <= discrete <= 1:
+            raise ValueError("The discrete fraction must be between 0 and 1")
+        if cycle < 2:
+            raise ValueError("The cycle must be at least 2 polls long")
+
+        self.hosts = hosts
+        self.sensors = sensors
+        self.discrete = discrete
+        self.cycle = cycle
+        self.attacks = attacks
+        self.attack_length = attack_length or max(1, cycle // 10)
+        self.interval = interval
+        self.seed = seed
+
+        # Sensors are distributed round-robin among the hosts
+        rng = random.Random(seed)
+        ndiscrete = round(sensors * discrete)
+        self._sensors = []
+        for i in range(sensors):
+            sensor = {
+                "host": i % hosts,
+                "key": "h{}:s{}".format(i % hosts, i),
+                "discrete": i < ndiscrete,
+                "phase": rng.random(),
+            }
+            if sensor["discrete"]:
+                sensor["levels"] = rng.randint(2, 4)
+            else:
+                sensor["offset"] = rng.uniform(-100, 100)
+                sensor["amplitude"] = rng.uniform(1, 50)
+                sensor["noise"] = sensor["amplitude"] * rng.uniform(0.001, 0.02)
+            self._sensors.append(sensor)
+
+    def features(self, discrete=None):
+        # State features of the (discrete or continuous) sensors, e.g., for an IDS config
+        return [
+            "state;{}".format(sensor["key"])
+            for sensor in self._sensors
+            if discrete is None or sensor["discrete"] == discrete
+        ]
+
+    def _value(self, sensor, step, rng):
+        position = (step / self.cycle + sensor["phase"]) % 1
+        if sensor["discrete"]:
+            return int(position * sensor["levels"])
+
+        value = sensor["offset"] + sensor["amplitude"] * math.sin(
+            2 * math.pi * position
+        )
+        return round(value + rng.gauss(0, sensor["noise"]), 3)
+
+    def _attacks(self, n, rng):
+        # Non-overlapping attack windows in polls: (start, end, manipulated sensor)
+        polls = n // (2 * self.hosts) + 1
+        slots = range(1, polls // (2 * self.attack_length))
+        count = min(self.attacks, len(slots))
+
+        attacks = []
+        for slot in sorted(rng.sample(slots, count)):
+            start = slot * 2 * self.attack_length
+            attacks.append(
+                (start, start + self.attack_length, rng.choice(self._sensors))
+            )
+        return attacks
+
+    def messages(self, n, run=0):
+        # Yields n messages of a run. Runs share the sensors but differ in noise, timing,
+        # and attacks, e.g., run 0 for training and run 1 for testing.
+        rng = random.Random("{}.{}".format(self.seed, run))
+        attacks = self._attacks(n, rng)
+
+        state = {}
+        timestamp = 0.0
+        i = 0
+        poll = 0
+        while True:
+            attack = next((a for a in attacks if a[0] <= poll < a[1]), None)
+
+            # Update the process once per poll of all hosts
+            for sensor in self._sensors:
+                state[sensor["key"]] = self._value(sensor, poll, rng)
+            if attack is not None:
+                sensor = attack[2]
+                if sensor["discrete"]:
+                    state[sensor["key"]] = self._value(sensor, attack[0], rng)
+                else:
+                    state[sensor["key"]] = round(
+                        state[sensor["key"]] + 3 * sensor["amplitude"], 3
+                    )
+
+            for host in range(self.hosts):
+                data = {
+                    s["key"]: state[s["key"]]
+                    for s in self._sensors
+                    if s["host"] == host
+                }
+                src = "{}:{}".format(MASTER, 40000 + host)
+                dest = "10.0.1.{}:502:1".format(host + 1)
+
+                for request in [True, False]:
+                    if i >= n:
+                        return
+
+                    timestamp += self.interval * rng.uniform(0.9, 1.1)
+                    yield {
+                        "id": i,
+                        "timestamp": round(timestamp, 6),
+                        "protocol": "modbus",
+                        "src": src if request else dest,
+                        "dest": dest if request else src,
+                        "length": 12 if request else 9 + 2 * len(data),
+                        "crc": True,
+                        "type": 3,
+                        "activity": "interrogate" if request else "inform",
+                        "responds to": [] if request else [i - 1],
+                        "data": {} if request else data,
+                        "state": dict(state),
+                        "malicious": attack is not None,
+                    }
+                    i += 1
+
+            poll += 1
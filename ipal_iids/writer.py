@@ -0,0 +1,287 @@
+import queue
+import threading
+import time
+
+import ipal_iids.codec as codec
+import ipal_iids.settings as settings
+
+# Flush policies for the live output. 'always' flushes after each message,
+# 'every-N' after N messages, 'every-Tms' after T milliseconds, and 'on-alert'
+# only when a message with an alert is written. Independent of the policy,
+# alerts reach the file within the configured alert latency.
+POLICIES = ["always", "every-N", "every-Tms", "on-alert"]
+
+
+def parse_flush_policy(policy):
+    # Returns (kind, value), e.g., ("every-ms", 100.0) for 'every-100ms'
+    if policy in ["always", "on-alert"]:
+        return policy, None
+
+    if policy.startswith("every-"):
+        value = policy[len("every-") :]
+        if value.endswith("ms"):
+            value = float(value[:-2])
+            if value >= 0:
+                return "every-ms", value
+        else:
+            value = int(value)
+            if value >= 1:
+                return "every-n", value
+
+    raise ValueError("Unknown flush policy {}".format(policy))
+
+
+# Output projection. With a list of fields, only these fields of each message are written.
+# The '_iids-config' of the first message and 'adjust' annotations are always kept, since
+# ipal-extend-alarms resolves the annotations on the written file. In alerts-only mode,
+# only messages with an alert ('ids' is true) or with 'adjust' annotations are written.
+# Since ipal-extend-alarms addresses messages by their position, the offsets of the
+# annotations are translated to positions in the written file. A skipped message that
+# receives a retroactive alert from an annotation is written right before the annotated
+# message, as long as it is among the last SKIPPED skipped messages. Annotations of other
+# messages that were not written are dropped.
+ALWAYS_KEPT = ["_iids-config", "adjust"]
+LOOKBACK = 1 << 16  # Number of written messages whose position is remembered
+SKIPPED = 1 << 12  # Number of skipped messages kept for retroactive alerts
+SYNC = object()  # Queued to flush all previous messages (see OutputWriter.sync)
+
+
+def parse_output_fields(fields):
+    fields = [field.strip() for field in fields.split(",") if field.strip()]
+    if len(fields) == 0:
+        raise ValueError("No output fields given")
+    return fields
+
+
+class OutputWriter:
+    # Serializes and writes live messages to the output file according to a flush policy.
+    # If queue_size > 0, serialization and writing happen in a background thread that is
+    # fed through a bounded queue, such that I/O overlaps with the detection. If summary
+    # > 0, the number of messages, alerts and written messages is logged every summary
+    # messages.
+
+    def __init__(
+        self,
+        fd,
+        policy="always",
+        alert_latency=0,
+        queue_size=0,
+        fields=None,
+        alerts_only=False,
+        summary=0,
+    ):
+        self.fd = fd
+        self.kind, self.value = parse_flush_policy(policy)
+        self.alert_latency = alert_latency / 1000
+
+        self.fields = None if fields is None else list(fields) + ALWAYS_KEPT
+        self.alerts_only = alerts_only
+        self.summary = summary
+
+        self._messages = 0
+        self._alerts = 0
+        self._written = 0
+        self._positions = {}  # Message number -> position in the written file
+        self._skipped = {}  # Message number -> message that was not written
+        self._config = None  # Configuration of a message that was not written
+
+        self._unflushed = 0
+        self._last_flush = time.time()
+        self._alert_deadline = None
+
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self._synced = threading.Event()
+
+        if queue_size > 0:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _flush(self):
+        self.fd.flush()
+        self._unflushed = 0
+        self._last_flush = time.time()
+        self._alert_deadline = None
+
+    def _log_summary(self):
+        settings.logger.info(
+            "Output summary: {} messages, {} alerts, {} written".format(
+                self._messages, self._alerts, self._written
+            )
+        )
+
+    def _adjust_positions(self, number, adjust):
+        # Translates offsets relative to the message number to offsets in the written file
+        translated = {}
+        for name, entries in adjust.items():
+            translated[name] = []
+            for offset, alert, metric in entries:
+                position = self._positions.get(number + offset)
+                if position is not None:
+                    translated[name].append([position - self._written, alert, metric])
+        return translated
+
+    def _targets(self, number, adjust):
+        # Skipped messages that receive a retroactive alert and have to be written as well
+        targets = set()
+        for entries in adjust.values():
+            for offset, alert, _ in entries:
+                if alert and number + offset in self._skipped:
+                    targets.add(number + offset)
+        return sorted(targets)
+
+    def _place(self, number, msg):
+        # Assigns the next position in the written file to a message
+        self._positions[number] = self._written
+        if len(self._positions) > LOOKBACK:
+            del self._positions[next(iter(self._positions))]
+
+        if self._config is not None:
+            msg.setdefault("_iids-config", self._config)
+            self._config = None
+        if "adjust" in msg:
+            msg["adjust"] = self._adjust_positions(number, msg["adjust"])
+
+        self._written += 1
+        return msg
+
+    def _project(self, msg):
+        # Returns the messages to write, i.e., none if the message is skipped
+        alert = msg.get("ids") is True
+        number = self._messages
+        self._messages += 1
+        self._alerts += alert
+        if self.summary > 0 and self._messages % self.summary == 0:
+            self._log_summary()
+
+        if self.fields is not None:
+            msg = {field: msg[field] for field in self.fields if field in msg}
+        elif self.alerts_only:
+            msg = dict(msg)
+
+        if not self.alerts_only:
+            self._written += 1
+            return [msg]
+
+        if not alert and "adjust" not in msg:
+            if "_iids-config" in msg:
+                config = msg.pop("_iids-config")
+                if self._config is None:
+                    self._config = config
+
+            self._skipped[number] = msg
+            if len(self._skipped) > SKIPPED:
+                del self._skipped[next(iter(self._skipped))]
+            return []
+
+        msgs = [
+            self._place(target, self._skipped.pop(target))
+            for target in self._targets(number, msg.get("adjust", {}))
+        ]
+        return msgs + [self._place(number, msg)]
+
+    def _write(self, msg):
+        alert = msg.get("ids") is True
+        if self.fields is not None or self.alerts_only or self.summary > 0:
+            msgs = self._project(msg)
+        else:
+            msgs = [msg]
+        if len(msgs) == 0:
+            return
+
+        for msg in msgs:
+            self.fd.write(codec.dumps(msg) + "\n")
+        self._unflushed += len(msgs)
+
+        if self.kind == "always":
+            self._flush()
+        elif self.kind == "every-n" and self._unflushed >= self.value:
+            self._flush()
+        elif self.kind == "every-ms":
+            if time.time() - self._last_flush >= self.value / 1000:
+                self._flush()
+
+        # Alerts have to reach the file in time
+        if alert and self._unflushed > 0:
+            if self.kind == "on-alert" or self._thread is None:
+                self._flush()
+            elif self._alert_deadline is None:
+                self._alert_deadline = time.time() + self.alert_latency
+
+    def _timeout(self):
+        # Time until the next flush is due without further messages
+        deadlines = []
+        if self._alert_deadline is not None:
+            deadlines.append(self._alert_deadline)
+        if self.kind == "every-ms" and self._unflushed > 0:
+            deadlines.append(self._last_flush + self.value / 1000)
+
+        if len(deadlines) == 0:
+            return None
+        return max(0, min(deadlines) - time.time())
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    msg = self._queue.get(timeout=self._timeout())
+                except queue.Empty:  # Flush is due
+                    self._flush()
+                    continue
+
+                if msg is None:  # Shutdown
+                    break
+                elif msg is SYNC:
+                    self._flush()
+                    self._synced.set()
+                    continue
+                self._write(msg)
+
+                if self._timeout() == 0:
+                    self._flush()
+
+        except Exception as e:
+            self._error = e
+
+            # Keep consuming to not block the producer
+            while True:
+                msg = self._queue.get()
+                if msg is None:
+                    break
+                elif msg is SYNC:
+                    self._synced.set()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, msg):
+        if self._thread is None:
+            self._write(msg)
+        else:
+            self._check()
+            self._queue.put(msg)
+
+    def sync(self):
+        # Writes and flushes all messages handed to the writer so far
+        if self._thread is not None:
+            self._synced.clear()
+            self._queue.put(SYNC)
+            self._synced.wait()
+            self._check()
+        elif self._unflushed > 0:
+            self._flush()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._check()
+
+        if self._unflushed > 0:
+            self._flush()
+
+        if self.alerts_only or self.summary > 0:
+            self._log_summary()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Compares the write and read throughput of the supported compressed file formats.
+#
+# Usage: ./misc/benchmarks/compression.py [--lines N] [--threads N] [FILE]
+# Without a file, the bundled misc/ipal/test.ipal is repeated up to the given number of lines.
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ipal_iids.compression import open_compressed  # noqa: E402
+
+
+def read_lines(filename, n):
+    with open(filename, "rb") as f:
+        lines = [line for line in f if line.strip()]
+    return (lines * (n // len(lines) + 1))[:n] if n else lines
+
+
+def write(filename, lines, level, threads):
+    start = time.perf_counter()
+    with open_compressed(filename, "wt", compresslevel=level, threads=threads) as f:
+        for line in lines:
+            f.write(line)
+    return time.perf_counter() - start
+
+
+def read(opener):
+    start = time.perf_counter()
+    with opener() as f:
+        for _ in f:
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", metavar="FILE", nargs="?")
+    parser.add_argument("--lines", type=int, default=500000)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    filename = args.file or str(Path(__file__).resolve().parents[1] / "ipal/test.ipal")
+    lines = [line.decode("utf-8") for line in read_lines(filename, args.lines)]
+    size = sum(len(line) for line in lines) / 1e6
+
+    configurations = [
+        ("gz", 9, 1),
+        ("gz", 6, 1),
+        ("gz", 1, 1),
+        ("gz", 6, args.threads),
+        ("zst", 3, 1),
+        ("zst", 3, args.threads),
+        ("lz4", 0, 1),
+    ]
+
+    print("{} lines, {:.1f} MB uncompressed".format(len(lines), size))
+    print(
+        "{:<4} {:>5} {:>7} {:>10} {:>11} {:>11} {:>11}".format(
+            "ext", "level", "threads", "ratio", "write MB/s", "read MB/s", "rt MB/s"
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for extension, level, threads in configurations:
+            path = os.path.join(tmp, "bench.ipal.{}".format(extension))
+            try:
+                duration = write(path, lines, level, threads)
+            except ImportError:
+                print("{:<4} {:>5} {:>7} {:>10}".format(extension, level, threads, "not installed"))
+                continue
+
+            # Binary lines through a large buffer and text lines as read by gzip.open
+            binary = read(lambda: open_compressed(path, "r"))
+            if extension == "gz":
+                text = read(lambda: gzip.open(path, "rt"))
+            else:
+                text = read(lambda: open_compressed(path, "rt"))
+
+            print(
+                "{:<4} {:>5} {:>7} {:>10.2f} {:>11.1f} {:>11.1f} {:>11.1f}".format(
+                    extension,
+                    level,
+                    threads,
+                    size * 1e6 / os.path.getsize(path),
+                    size / duration,
+                    size / binary,
+                    size / text,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
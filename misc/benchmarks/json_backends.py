@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# Compares the throughput of the available JSON backends on IPAL and state files.
+#
+# Usage: ./misc/benchmarks/json_backends.py [--repeat N] [FILE ...]
+# Without files, the bundled misc/ipal/*.ipal files are used.
+import argparse
+import gzip
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import ipal_iids.codec as codec  # noqa: E402
+
+
+def read_lines(filename):
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt") as f:
+        return [line for line in f if line.strip()]
+
+
+def benchmark(lines, repeat):
+    # Parse all lines
+    start = time.perf_counter()
+    for _ in range(repeat):
+        msgs = [codec.loads(line) for line in lines]
+    loads = time.perf_counter() - start
+
+    # Serialize all messages
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for msg in msgs:
+            codec.dumps(msg)
+    dumps = time.perf_counter() - start
+
+    n = len(lines) * repeat
+    return n / loads, n / dumps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", metavar="FILE", nargs="*")
+    parser.add_argument("--repeat", type=int, default=None)
+    args = parser.parse_args()
+
+    files = args.files or sorted(
+        str(p) for p in (Path(__file__).resolve().parents[1] / "ipal").glob("*.ipal")
+    )
+
+    print("{:<40} {:<8} {:>14} {:>14}".format("file", "backend", "loads msg/s", "dumps msg/s"))
+    for filename in files:
+        lines = read_lines(filename)
+        repeat = args.repeat or max(1, 100000 // max(1, len(lines)))
+
+        for backend in codec.BACKENDS[1:]:
+            try:
+                codec.set_backend(backend)
+            except ImportError:
+                print("{:<40} {:<8} {:>14}".format(Path(filename).name, backend, "not installed"))
+                continue
+
+            loads, dumps = benchmark(lines, repeat)
+            print(
+                "{:<40} {:<8} {:>14.0f} {:>14.0f}".format(
+                    Path(filename).name, backend, loads, dumps
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import numpy as np
+
+from .preprocessor import to_rows
+
+# Consecutive affine preprocessors (see Preprocessor.affine) are fused into one AffineChain
+# for the live detection. Per-feature stages (mean, minmax) are applied to the whole vector
+# at once in the same order of operations as their transform, such that the results are
+# identical. Starting with the first stage mixing the features (pca), the rest of a chain is
+# folded into one precomputed matrix and offset and applied with a single product, which
+# differs from the separate stages only by rounding.
+#
+# A stage with a trained range (minmax) checks its input before. If a value is out of range,
+# the affected stages are applied one by one, such that they report the value as before.
+# The same holds for rows with values the chain cannot handle, e.g., None before a pca.
+
+
+class AffineChain:
+    def __init__(self):
+        self.preprocessors = []
+        self.affines = []  # (shift, transform, bounds) of each preprocessor
+
+        self.steps = []  # Per-feature stages applied separately: (shift, scale, bounds)
+        self.folded = 0  # Index of the first preprocessor folded into the matrix
+        self.bounds = None  # Input range of the folded part
+        self.matrix = None
+        self.offset = None
+
+    def accepts(self, affine):
+        # Stages fit if they take the output of the chain. Ranges are checked in front of
+        # the matrix only, since its intermediate values are not computed.
+        if len(self.affines) == 0:
+            return True
+
+        shift, transform, bounds = affine
+        previous = self.affines[-1][1]
+        width = len(previous) if previous.ndim == 1 else previous.shape[1]
+        mixed = any(t.ndim == 2 for _, t, _ in self.affines)
+        return len(shift) == width and not (mixed and bounds is not None)
+
+    def append(self, preprocessor, affine):
+        self.preprocessors.append(preprocessor)
+        self.affines.append(affine)
+        self._compile()
+
+    @property
+    def _name(self):
+        return "+".join(preprocessor._name for preprocessor in self.preprocessors)
+
+    def _compile(self):
+        mixing = [i for i, (_, t, _) in enumerate(self.affines) if t.ndim == 2]
+        if len(mixing) == 0:
+            self.steps = list(self.affines)
+            self.folded = len(self.affines)
+            self.bounds = self.matrix = self.offset = None
+            return
+
+        # Fold from the last range check in front of the first mixing stage on
+        bounded = [i for i in range(mixing[0]) if self.affines[i][2] is not None]
+        self.folded = bounded[-1] if len(bounded) > 0 else 0
+        self.steps = self.affines[: self.folded]
+        self.bounds = self.affines[self.folded][2]
+
+        width = len(self.affines[self.folded][0])
+        matrix = np.eye(width)
+        offset = np.zeros(width)
+        for shift, transform, _ in self.affines[self.folded :]:
+            if transform.ndim == 1:
+                matrix = matrix / transform
+                offset = (offset - shift) / transform
+            else:
+                matrix = matrix @ transform
+                offset = (offset - shift) @ transform
+        self.matrix = matrix
+        self.offset = offset
+
+    def transform(self, value):
+        try:
+            x = np.array(value, dtype=np.float64)
+        except (ValueError, TypeError):  # Non-numeric values
+            return self._transform_unfused(value, 0)
+        if x.ndim != 1 or len(x) != len(self.affines[0][0]):
+            return self._transform_unfused(value, 0)
+
+        for i, (shift, scale, bounds) in enumerate(self.steps):
+            if bounds is not None and self._out_of_range(x, bounds):
+                x = self._stage_unfused(i, x)
+            else:
+                x = (x - shift) / scale
+
+        if self.matrix is not None:
+            if np.isnan(x).any() or (
+                self.bounds is not None and self._out_of_range(x, self.bounds)
+            ):
+                return self._transform_unfused(to_rows(x[np.newaxis])[0], self.folded)
+            x = x @ self.matrix + self.offset
+
+        return to_rows(x[np.newaxis])[0]
+
+    def _out_of_range(self, x, bounds):
+        lower, upper = bounds
+        return bool(((x < lower) | (upper < x)).any())
+
+    def _stage_unfused(self, i, x):
+        value = self.preprocessors[i].transform(to_rows(x[np.newaxis])[0])
+        return np.array(value, dtype=np.float64)
+
+    def _transform_unfused(self, value, start):
+        for preprocessor in self.preprocessors[start:]:
+            value = preprocessor.transform(value)
+        return value
+
+    def reset(self):
+        pass  # Nothing to reset
+
+
+def fuse_affine(preprocessors):
+    # Returns the stages of the live preprocessing with consecutive affine preprocessors
+    # replaced by an AffineChain
+    stages = []
+    for preprocessor in preprocessors:
+        affine = preprocessor.affine()
+        if affine is None:
+            stages.append(preprocessor)
+            continue
+
+        if len(stages) == 0 or not (
+            isinstance(stages[-1], AffineChain) and stages[-1].accepts(affine)
+        ):
+            stages.append(AffineChain())
+        stages[-1].append(preprocessor, affine)
+
+    return stages
@@ -1,11 +1,16 @@
+import numpy as np
+
 import ipal_iids.settings as settings
 
-from .preprocessor import Preprocessor
+from .preprocessor import Preprocessor, to_rows
 
 
 class AggregatePreprocessor(Preprocessor):
     _name = "aggregate"
     _description = "Aggregates multiple vectors into one feature"
+    _stateful = True
+    _vectorized = True
+    _checkpoint_attributes = ["N", "aggregate"]
 
     def __init__(self, features):
         super().__init__(features)
@@ -29,6 +34,30 @@ class AggregatePreprocessor(Preprocessor):
         else:
             return None
 
+    def transform_batch(self, values):
+        # Each group of num rows, including the rows aggregated before, becomes one row
+        width = values.shape[1]
+        if self.N > 0:
+            pending = np.array(self.aggregate, dtype=values.dtype).reshape(
+                self.N, width
+            )
+            rows = np.concatenate([pending, values])
+        else:
+            rows = values
+
+        groups = len(rows) // self.num
+        out = rows[: groups * self.num].reshape(groups, self.num * width)
+
+        valid = (np.arange(len(values)) + self.N + 1) % self.num == 0
+        rest = rows[groups * self.num :]
+        self.N = len(rest)
+        self.aggregate = [v for row in to_rows(rest) for v in row]
+
+        return out, valid
+
+    def output_widths(self, widths):
+        return widths * self.num
+
     def reset(self):
         self.N = 0
         self.aggregate = []
@@ -46,6 +46,20 @@ class CategoricalPreprocessor(Preprocessor):
 
         return value
 
+    def output_widths(self, widths):
+        if len(widths) != len(self.features):
+            return None
+
+        widths = list(widths)
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+            if widths[i] is not None:  # Encoding lists is not supported
+                return None
+            widths[i] = len(self.encoder[i])
+
+        return widths
+
     def reset(self):
         pass  # Nothing to reset
 
@@ -1,9 +1,14 @@
+import numpy as np
+
 from .preprocessor import Preprocessor
 
 
 class GradientPreprocessor(Preprocessor):
     _name = "gradient"  # NOTE Does not consider time!
     _description = "Calculate gradient"
+    _stateful = True
+    _vectorized = True
+    _checkpoint_attributes = ["last_value", "sliding_window"]
 
     def __init__(self, features, window_size=1):
         super().__init__(features)
@@ -36,6 +41,42 @@ class GradientPreprocessor(Preprocessor):
 
         return value
 
+    def transform_batch(self, values):
+        # None (NaN) interrupts the gradients, which is left to the per-value transform
+        selected = values[:, [i for i in range(len(self.features)) if self.features[i]]]
+        if values.dtype == object or np.isnan(selected).any():
+            return super().transform_batch(values)
+
+        values = values.copy()
+        for i in range(len(self.features)):
+            if self.features[i] and len(values) > 0:
+                values[:, i] = self._transform_column(i, values[:, i])
+
+        return values, np.ones(len(values), dtype=bool)
+
+    def _transform_column(self, i, X):
+        # Gradients of the column appended to the ones still in the sliding window
+        if self.last_value[i] is None:
+            diffs = np.diff(X)
+        else:
+            diffs = np.diff(np.concatenate([[self.last_value[i]], X]))
+        previous = self.sliding_window[i]
+        previous = previous[max(0, len(previous) - self.window_size + 1) :]
+        window = np.concatenate([previous, diffs])
+
+        # Sum each window from left to right, such that the results equal transform
+        out = np.full(len(X), np.nan)
+        n = len(window) - self.window_size + 1
+        if n > 0:
+            sums = np.zeros(n)
+            for j in range(self.window_size):
+                sums = sums + window[j : j + n]
+            out[len(X) - n :] = sums / self.window_size
+
+        self.last_value[i] = float(X[-1])
+        self.sliding_window[i] = window[-self.window_size :].tolist()
+        return out
+
     def reset(self):
         self.last_value = [None] * len(self.features)
         self.sliding_window = [[] for _ in range(len(self.features))]
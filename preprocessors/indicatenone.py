@@ -28,6 +28,20 @@ class IndicateNonePreprocessor(Preprocessor):
 
         return value
 
+    def output_widths(self, widths):
+        if len(widths) != len(self.features):
+            return None
+
+        widths = list(widths)
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+            if widths[i] is not None:  # Indicating None in lists is not supported
+                return None
+            widths[i] = 2
+
+        return widths
+
     def reset(self):
         pass  # Nothing to reset
 
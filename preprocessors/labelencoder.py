@@ -1,34 +1,64 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
-from sklearn.preprocessing import LabelEncoder
+import numpy as np
 
 import ipal_iids.settings as settings
 
 from .preprocessor import Preprocessor
 
+# Values not seen during training are encoded as UNKNOWN ("code"), replaced by None
+# ("none"), or the message is dropped ("drop")
+UNKNOWN = -1.0
+POLICIES = ["code", "none", "drop"]
+
 
 class LabelEncoderPreprocessor(Preprocessor):
     _name = "label"
     _description = "Encode as labels"
-    encoder: List[Optional[LabelEncoder]]
+    _default_settings = {"unknown": "code"}
+    _vectorized = True
+    codes: List[Optional[Dict[Any, float]]]
     fitdata: List[Optional[List[set]]]
 
     def __init__(self, features):
         super().__init__(features)
-        self.encoder = [None] * len(self.features)
+        self.codes = [None] * len(self.features)
+        self.classes = [None] * len(self.features)  # Sorted numeric classes or None
         self.fitdata = [None] * len(self.features)
 
     def fit(self, values):
         if len(values[0]) != len(self.features):
             settings.logger.critical("Feature length does not match data length!")
+        if self.settings["unknown"] not in POLICIES:
+            settings.logger.error(
+                "Unknown value policy of the label preprocessor must be one of {}".format(
+                    ", ".join(POLICIES)
+                )
+            )
+            exit(1)
 
         for i in range(len(self.features)):
             if not self.features[i]:
                 continue
 
-            self.encoder[i] = LabelEncoder()
             self.fitdata[i] = list(set([v[i] for v in values]))
-            self.encoder[i].fit(self.fitdata[i])
+        self._build_codes()
+
+    def _build_codes(self):
+        # Codes are the indices of the sorted values as with sklearn's LabelEncoder
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+
+            classes = sorted(v for v in self.fitdata[i] if v is not None)
+            self.codes[i] = {v: float(code) for code, v in enumerate(classes)}
+
+            numeric = all(isinstance(v, (int, float)) for v in classes)
+            self.classes[i] = np.array(classes, dtype=np.float64) if numeric else None
+
+    def _unknown(self, value):
+        settings.logger.warning("Value {} not in trained categories".format(value))
+        return UNKNOWN if self.settings["unknown"] == "code" else None
 
     def transform(self, value):
         if len(value) != len(self.features):
@@ -38,31 +68,68 @@ class LabelEncoderPreprocessor(Preprocessor):
             if not self.features[i] or value[i] is None:
                 continue
 
-            try:
-                value[i] = float(self.encoder[i].transform([value[i]])[0])
-            except ValueError:
-                settings.logger.critical(
-                    "Value {} not in trained categories".format(value[i])
-                )
+            code = self.codes[i].get(value[i])
+            if code is None:
+                code = self._unknown(value[i])
+                if self.settings["unknown"] == "drop":
+                    return None
+            value[i] = code
 
         return value
 
+    def transform_batch(self, values):
+        if values.shape[1] != len(self.features):
+            settings.logger.critical("Feature length does not match data length!")
+
+        values = values.copy()
+        valid = np.ones(len(values), dtype=bool)
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+
+            X = values[:, i]
+            if values.dtype != object and self.classes[i] is not None:
+                # Binary search in the sorted classes
+                rows = np.flatnonzero(~np.isnan(X))
+                index = np.searchsorted(self.classes[i], X[rows])
+                found = index < len(self.classes[i])
+                found[found] = self.classes[i][index[found]] == X[rows[found]]
+                X[rows[found]] = index[found]
+                unknown = rows[~found]
+
+            else:
+                unknown = []
+                for j in range(len(X)):
+                    if X[j] is None or X[j] != X[j]:  # None or NaN
+                        continue
+                    code = self.codes[i].get(X[j])
+                    if code is None:
+                        unknown.append(j)
+                    else:
+                        X[j] = code
+
+            for j in unknown:
+                code = self._unknown(X[j])
+                X[j] = np.nan if code is None and values.dtype != object else code
+            if self.settings["unknown"] == "drop":
+                valid[unknown] = False
+
+        return values[valid], valid
+
     def reset(self):
         pass  # Nothing to reset
 
     def get_fitted_model(self):
-        return {"features": self.features, "fitdata": self.fitdata}
+        return {
+            "features": self.features,
+            "fitdata": self.fitdata,
+            "unknown": self.settings["unknown"],
+        }
 
     @classmethod
     def from_fitted_model(cls, model):
         labelencoder = LabelEncoderPreprocessor(model["features"])
         labelencoder.fitdata = model["fitdata"]
-
-        for i in range(len(labelencoder.features)):
-            if not labelencoder.features[i]:
-                continue
-
-            labelencoder.encoder[i] = LabelEncoder()
-            labelencoder.encoder[i].fit(labelencoder.fitdata[i])
-
+        labelencoder.settings["unknown"] = model.get("unknown", "code")
+        labelencoder._build_codes()
         return labelencoder
@@ -10,6 +10,7 @@ from .preprocessor import Preprocessor
 class MeanPreprocessor(Preprocessor):
     _name = "mean"
     _description = "Scale by mean-standard deviation"
+    _vectorized = True
     means: List[float]
     stds: List[float]
 
@@ -26,17 +27,32 @@ class MeanPreprocessor(Preprocessor):
             if not self.features[i]:
                 continue
 
-            X = [v[i] for v in values if v[i] is not None]
-            self.means[i] = float(np.mean(X))
-            self.stds[i] = float(np.std(X))
+            self._fit_feature(i, [v[i] for v in values if v[i] is not None])
 
-            if self.stds[i] == 0:
-                settings.logger.info(
-                    "Standard deviation is zero. Adjusting values of {} to std 1.0".format(
-                        i
-                    )
+    def fit_batch(self, values):
+        if values.dtype == object:
+            return super().fit_batch(values)
+        if values.shape[1] != len(self.features):
+            settings.logger.critical("Feature length does not match data length!")
+
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+
+            X = values[:, i]
+            self._fit_feature(i, X[~np.isnan(X)])
+
+    def _fit_feature(self, i, X):
+        self.means[i] = float(np.mean(X))
+        self.stds[i] = float(np.std(X))
+
+        if self.stds[i] == 0:
+            settings.logger.info(
+                "Standard deviation is zero. Adjusting values of {} to std 1.0".format(
+                    i
                 )
-                self.stds[i] = 1
+            )
+            self.stds[i] = 1
 
     def transform(self, value):
         if len(value) != len(self.features):
@@ -50,6 +66,28 @@ class MeanPreprocessor(Preprocessor):
 
         return value
 
+    def transform_batch(self, values):
+        if values.dtype == object:
+            return super().transform_batch(values)
+        if values.shape[1] != len(self.features):
+            settings.logger.critical("Feature length does not match data length!")
+
+        values = values.copy()
+        for i in range(len(self.features)):
+            if self.features[i]:
+                values[:, i] = (values[:, i] - self.means[i]) / self.stds[i]
+
+        return values, np.ones(len(values), dtype=bool)
+
+    def affine(self):
+        shift = [m if f else 0.0 for f, m in zip(self.features, self.means)]
+        scale = [s if f else 1.0 for f, s in zip(self.features, self.stds)]
+        return (
+            np.array(shift, dtype=np.float64),
+            np.array(scale, dtype=np.float64),
+            None,
+        )
+
     def reset(self):
         pass  # Nothing to reset
 
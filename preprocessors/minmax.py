@@ -10,6 +10,7 @@ from .preprocessor import Preprocessor
 class MinMaxPreprocessor(Preprocessor):
     _name = "minmax"
     _description = "Scale by mininum and maximum"
+    _vectorized = True
     mins: List[float]
     maxs: List[float]
 
@@ -26,20 +27,33 @@ class MinMaxPreprocessor(Preprocessor):
             if not self.features[i]:
                 continue
 
-            X = [v[i] for v in values if v[i] is not None]
-            self.mins[i] = float(np.min(X))
-            self.maxs[i] = float(np.max(X))
+            self._fit_feature(i, [v[i] for v in values if v[i] is not None])
 
-            if self.mins[i] == self.maxs[i]:
-                settings.logger.info(
-                    "Min Max is the same. Adjusting values of feature {} to 0.5".format(
-                        i
-                    )
-                )
-                self.mins[i] -= 1
-                self.maxs[i] += 1
+    def fit_batch(self, values):
+        if values.dtype == object:
+            return super().fit_batch(values)
+        if values.shape[1] != len(self.features):
+            settings.logger.critical("Feature length does not match data length!")
 
-            assert self.maxs[i] - self.mins[i] > 0
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+
+            X = values[:, i]
+            self._fit_feature(i, X[~np.isnan(X)])
+
+    def _fit_feature(self, i, X):
+        self.mins[i] = float(np.min(X))
+        self.maxs[i] = float(np.max(X))
+
+        if self.mins[i] == self.maxs[i]:
+            settings.logger.info(
+                "Min Max is the same. Adjusting values of feature {} to 0.5".format(i)
+            )
+            self.mins[i] -= 1
+            self.maxs[i] += 1
+
+        assert self.maxs[i] - self.mins[i] > 0
 
     def transform(self, value):
         if len(value) != len(self.features):
@@ -60,6 +74,49 @@ class MinMaxPreprocessor(Preprocessor):
 
         return value
 
+    def transform_batch(self, values):
+        if values.dtype == object:
+            return super().transform_batch(values)
+        if values.shape[1] != len(self.features):
+            settings.logger.critical("Feature length does not match data length!")
+
+        values = values.copy()
+        for i in range(len(self.features)):
+            if not self.features[i]:
+                continue
+
+            X = values[:, i]
+            for v in X[(X < self.mins[i]) | (self.maxs[i] < X)]:
+                settings.logger.warning(
+                    "Value {} out of trained range ({} - {})".format(
+                        float(v), self.mins[i], self.maxs[i]
+                    )
+                )
+
+            values[:, i] = (X - self.mins[i]) / (self.maxs[i] - self.mins[i])
+
+        return values, np.ones(len(values), dtype=bool)
+
+    def affine(self):
+        shift = np.array(
+            [m if f else 0.0 for f, m in zip(self.features, self.mins)],
+            dtype=np.float64,
+        )
+        scale = np.array(
+            [
+                M - m if f else 1.0
+                for f, m, M in zip(self.features, self.mins, self.maxs)
+            ],
+            dtype=np.float64,
+        )
+        lower = np.where(self.features, shift, -np.inf)
+        upper = np.where(
+            self.features,
+            [M if f else 0.0 for f, M in zip(self.features, self.maxs)],
+            np.inf,
+        )
+        return shift, scale, (lower, upper)
+
     def reset(self):
         pass  # Nothing to reset
 
@@ -2,6 +2,7 @@ import os
 import random
 
 import joblib
+import numpy as np
 from sklearn.decomposition import PCA
 
 import ipal_iids.settings as settings
@@ -12,6 +13,7 @@ from .preprocessor import Preprocessor
 class PCAPreprocessor(Preprocessor):
     _name = "pca"
     _description = "Performs a principal component analysis"
+    _vectorized = True
 
     def __init__(self, features):
         super().__init__(features)
@@ -30,6 +32,24 @@ class PCAPreprocessor(Preprocessor):
 
         return self.encoder.transform([value])[0]
 
+    def fit_batch(self, values):
+        self.fit(values)
+
+    def transform_batch(self, values):
+        if values.shape[1] != len(self.features):
+            settings.logger.critical("Feature length does not match data length!")
+
+        return self.encoder.transform(values), np.ones(len(values), dtype=bool)
+
+    def output_widths(self, widths):
+        return [None] * self.encoder.n_components_
+
+    def affine(self):
+        matrix = self.encoder.components_.T
+        if self.encoder.whiten:
+            matrix = matrix / np.sqrt(self.encoder.explained_variance_)
+        return self.encoder.mean_, matrix, None
+
     def reset(self):
         pass  # Nothing to reset
 
@@ -1,16 +1,52 @@
 from typing import List
 
+import numpy as np
+
+
+def to_array(rows):
+    # 2D array of a list of rows for the batch functions of the preprocessors. Numeric rows
+    # become a float array with NaN for None, all others an object array.
+    if isinstance(rows, np.ndarray) and rows.dtype != object:
+        return rows
+    if len(rows) == 0:
+        return np.empty((0, 0))
+
+    try:
+        return np.array(rows, dtype=np.float64)
+    except (ValueError, TypeError):
+        values = np.empty((len(rows), len(rows[0])), dtype=object)
+        try:
+            values[:] = rows
+        except ValueError:  # Values that are sequences themselves
+            for i, row in enumerate(rows):
+                for j, value in enumerate(row):
+                    values[i, j] = value
+        return values
+
+
+def to_rows(values):
+    # Inverse of to_array
+    rows = values.tolist()
+    if values.dtype != object and np.isnan(values).any():
+        rows = [[None if v != v else v for v in row] for row in rows]
+    return rows
+
 
 class Preprocessor:
     _name = None
     _description = ""
-    _default_settings = {}
+    _default_settings = {}  # Options given with the method and features in the config
+    _stateful = False  # Whether transform depends on previously transformed values
+    # State of stateful preprocessors saved in checkpoints
+    _checkpoint_attributes = []
+    _vectorized = False  # Whether fit_batch and transform_batch keep the rows 2D arrays
 
     features: List[bool]
 
     # Features is a list of booleans. True indicates preprocessing on this feature.
     def __init__(self, features: List[bool]):
         self.features = features
+        self.settings = dict(self._default_settings)
 
     def fit(self, values):
         raise NotImplementedError
@@ -18,12 +54,44 @@ class Preprocessor:
     def transform(self, values):
         raise NotImplementedError
 
+    # Batch versions of fit and transform used for training on a 2D array with one row per
+    # value (see to_array). transform_batch returns the transformed rows that were not dropped
+    # (e.g., by aggregate) and a boolean mask of these rows. The results are the same as
+    # calling transform on each row in order. By default, the rows are transformed one by one.
+    def fit_batch(self, values):
+        self.fit(to_rows(values))
+
+    def transform_batch(self, values):
+        rows = [self.transform(row) for row in to_rows(values)]
+        valid = np.array([row is not None for row in rows], dtype=bool)
+        return to_array([row for row in rows if row is not None]), valid
+
+    # Given the widths of the values in a row (None for single values, the length for lists),
+    # returns the widths of the transformed row or None if unknown. Most preprocessors keep
+    # the layout, others replace values by lists (e.g., categorical) or concatenate rows.
+    def output_widths(self, widths):
+        return widths
+
+    # Affine preprocessors return their transform as (shift, transform, bounds), which is
+    # either (x - shift) / transform for a vector or (x - shift) @ transform for a matrix,
+    # and the (lower, upper) range of x they report values outside of or None. Consecutive
+    # affine preprocessors are fused for the live detection (see preprocessors/affine.py).
+    def affine(self):
+        return None
+
     def get_fitted_model(self):
         raise NotImplementedError
 
     def reset(self):
         pass
 
+    def get_checkpoint(self):
+        return {attr: getattr(self, attr) for attr in self._checkpoint_attributes}
+
+    def restore_checkpoint(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
     @classmethod
     def from_fitted_model(cls, model):
         raise NotImplementedError
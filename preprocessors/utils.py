@@ -1,23 +1,19 @@
-from .aggregate import AggregatePreprocessor
-from .categorical import CategoricalPreprocessor
-from .gradient import GradientPreprocessor
-from .indicatenone import IndicateNonePreprocessor
-from .labelencoder import LabelEncoderPreprocessor
-from .mean import MeanPreprocessor
-from .minmax import MinMaxPreprocessor
-from .pca import PCAPreprocessor
+from ipal_iids.registry import LazyRegistry
 
-preprocessors = [
-    AggregatePreprocessor,
-    CategoricalPreprocessor,
-    GradientPreprocessor,
-    IndicateNonePreprocessor,
-    LabelEncoderPreprocessor,
-    MeanPreprocessor,
-    MinMaxPreprocessor,
-    PCAPreprocessor,
-]
+# Preprocessors are only imported once they are used (name -> module.class)
+preprocessors = LazyRegistry(
+    {
+        "aggregate": "preprocessors.aggregate.AggregatePreprocessor",
+        "categorical": "preprocessors.categorical.CategoricalPreprocessor",
+        "gradient": "preprocessors.gradient.GradientPreprocessor",
+        "indicate-none": "preprocessors.indicatenone.IndicateNonePreprocessor",
+        "label": "preprocessors.labelencoder.LabelEncoderPreprocessor",
+        "mean": "preprocessors.mean.MeanPreprocessor",
+        "minmax": "preprocessors.minmax.MinMaxPreprocessor",
+        "pca": "preprocessors.pca.PCAPreprocessor",
+    }
+)
 
 
 def get_all_preprocessors():
-    return {preprocessor._name: preprocessor for preprocessor in preprocessors}
+    return preprocessors
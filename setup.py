@@ -4,7 +4,12 @@ setup(
     name="ipal-iids",
     version="1.4.10",
     packages=find_packages(exclude="tests"),
-    scripts=["ipal-iids", "ipal-extend-alarms", "ipal-visualize-model"],
+    scripts=[
+        "ipal-iids",
+        "ipal-extend-alarms",
+        "ipal-visualize-model",
+        "ipal-iids-bench",
+    ],
     install_requires=[
         "numpy",
         "tensorflow",
@@ -2,6 +2,8 @@ import json
 from pathlib import Path
 from subprocess import PIPE, Popen
 
+import pytest
+
 # Exclude output paths
 collect_ignore = ["snapshots"]
 
@@ -45,6 +47,58 @@ def metaids(args):
     return p.returncode, stdout, stderr
 
 
+def without_config(output):
+    # Parsed messages of an output without the configuration of the first message
+    if isinstance(output, bytes):
+        output = output.decode("utf-8")
+    msgs = [json.loads(line) for line in output.splitlines()]
+    for msg in msgs:
+        msg.pop("_iids-config", None)
+    return msgs
+
+
+def load_config(name):
+    with open("misc/configs/{}.config".format(name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    # Writes a configuration of misc/configs (or the given one) to tmp_path and returns its
+    # path. Model files are relative to the configuration and are written to tmp_path too.
+    def write(name, config=None):
+        if config is None:
+            config = load_config(name)
+        path = tmp_path / "{}.config".format(name)
+        with open(path, "w") as f:
+            json.dump(config, f, indent=4)
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def workload_args(tmp_path, config_file):
+    # Writes the training (and live) messages, e.g., of a Workload, and a configuration of
+    # IDSs to tmp_path. Returns the arguments to train (and run) the IDSs on the state.
+    def write(config, train, live=None):
+        args = []
+        for name, msgs in [("train", train), ("live", live)]:
+            if msgs is None:
+                continue
+            with open(tmp_path / "{}.ipal".format(name), "w") as f:
+                f.writelines(json.dumps(msg) + "\n" for msg in msgs)
+            args += ["--{}.state".format(name), str(tmp_path / "{}.ipal".format(name))]
+        if live is not None:
+            args += ["--output", "-"]
+
+        for name, ids in config.items():
+            ids.setdefault("model-file", "./{}.model".format(name))
+        return args + ["--config", config_file("workload", config)]
+
+    return write
+
+
 ########################
 # Helper methods
 ########################
@@ -0,0 +1,66 @@
+import json
+from subprocess import PIPE, Popen
+
+BENCH = "./ipal-iids-bench"
+
+
+def bench(args):
+    p = Popen([BENCH] + args, stdout=PIPE, stderr=PIPE)
+    stdout, stderr = p.communicate()
+    return p.returncode, stdout, stderr
+
+
+def test_generate(tmp_path):
+    args = ["--messages", "2000", "--cycle", "20", "--attacks", "3"]
+
+    outputs = []
+    for name, run in [("a", "0"), ("b", "0"), ("c", "1")]:
+        errno, _, _ = bench(args + ["--generate", str(tmp_path / name), "--run", run])
+        assert errno == 0
+        with open(tmp_path / name) as f:
+            outputs.append([json.loads(line) for line in f])
+
+    # Streams are reproducible, other runs share the sensors only
+    assert outputs[0] == outputs[1]
+    assert outputs[0] != outputs[2]
+    assert outputs[0][0]["state"].keys() == outputs[2][0]["state"].keys()
+
+    msgs = outputs[0]
+    assert len(msgs) == 2000
+    assert len(msgs[0]["state"]) == 16
+    assert 0 < sum(msg["malicious"] for msg in msgs) < len(msgs)
+
+
+def test_bench(tmp_path):
+    errno, _, stderr = bench(
+        ["--scales", "200,400", "--ids", "MinMax,Autoregression"]
+        + ["--preprocessors", "minmax", "--combiners", "Any"]
+        + ["--output", str(tmp_path / "bench.json")]
+    )
+    assert errno == 0
+
+    with open(tmp_path / "bench.json") as f:
+        results = json.load(f)["results"]
+
+    subjects = [(r["kind"], r["name"], r["scale"]) for r in results]
+    assert subjects == [
+        (kind, name, scale)
+        for scale in [200, 400]
+        for kind, name in [
+            ("ids", "MinMax"),
+            ("ids", "Autoregression"),
+            ("preprocessor", "minmax"),
+            ("combiner", "Any"),
+        ]
+    ]
+
+    for result in results:
+        if result["name"] == "Autoregression":
+            continue  # Depends on the optional ar package
+
+        assert result["status"] == "ok"
+        assert result["live_messages"] == result["scale"]
+        assert result["train_seconds"] > 0
+        assert result["messages_per_second"] > 0
+        assert result["p99_latency"] > 0
+        assert result["peak_rss_mb"] > 0
@@ -0,0 +1,62 @@
+import gzip
+import json
+
+import pytest
+
+from ipal_iids.compression import open_compressed
+
+from .conftest import metaids, without_config
+
+
+@pytest.mark.parametrize("threads", ["1", "2"])
+@pytest.mark.parametrize("extension", ["gz", "zst", "lz4"])
+def test_compressed_files(extension, threads, tmp_path, config_file):
+    if extension == "zst":
+        pytest.importorskip("zstandard")
+    elif extension == "lz4":
+        pytest.importorskip("lz4")
+
+    args = ["--retrain", "--config", config_file("MinMax"), "--output"]
+
+    errno, expected, _ = metaids(
+        args
+        + ["-", "--train.state", "misc/ipal/train.ipal"]
+        + ["--live.state", "misc/ipal/test.ipal"]
+    )
+    assert errno == 0
+
+    # Compress the training and live input
+    for name in ["train", "test"]:
+        with open("misc/ipal/{}.ipal".format(name), "rb") as fin:
+            with open_compressed(
+                tmp_path / "{}.ipal.{}".format(name, extension), "w"
+            ) as fout:
+                fout.write(fin.read())
+
+    output = str(tmp_path / "output.ipal.{}".format(extension))
+    errno, stdout, stderr = metaids(
+        args
+        + [output, "--compress-threads", threads]
+        + ["--train.state", str(tmp_path / "train.ipal.{}".format(extension))]
+        + ["--live.state", str(tmp_path / "test.ipal.{}".format(extension))]
+    )
+    assert errno == 0
+
+    with open_compressed(output, "rt") as f:
+        assert without_config(f.read()) == without_config(expected.decode("utf-8"))
+
+
+def test_parallel_gzip(tmp_path):
+    lines = [
+        "{}\n".format(json.dumps({"id": i, "value": i * 0.5})) for i in range(50000)
+    ]
+
+    # Flushed and unflushed blocks form a single gzip stream
+    with open_compressed(tmp_path / "out.gz", "wt", compresslevel=6, threads=3) as f:
+        for i, line in enumerate(lines):
+            f.write(line)
+            if i % 10000 == 0:
+                f.flush()
+
+    with gzip.open(tmp_path / "out.gz", "rt") as f:
+        assert f.read() == "".join(lines)
@@ -0,0 +1,960 @@
+import json
+import os
+import signal
+import socket
+import time
+from subprocess import PIPE, Popen
+from urllib.request import urlopen
+
+import pytest
+
+from ids.featureids import FeaturePlan
+from ipal_iids.workload import Workload
+from ipal_iids.writer import OutputWriter
+
+from .conftest import (
+    METAIDS,
+    check_with_validation_file,
+    load_config,
+    metaids,
+    without_config,
+)
+
+EXTENDALARMS = "./ipal-extend-alarms"
+
+# IDSs whose live output has to be independent of how messages are handed over
+LIVEIDSNAMES = [
+    "DecisionTree",
+    "Exists",
+    "Histogram",
+    "IsolationForest",
+    "MinMax",
+    "NaiveBayes",
+    "RandomForest",
+    "Steadytime",
+    "inter-arrival-mean",
+]
+
+
+@pytest.mark.parametrize("idsname", LIVEIDSNAMES)
+@pytest.mark.parametrize("batchargs", [["--batch-size", "4"], ["--batch-size", "100"]])
+def test_batch_size(idsname, batchargs):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/{}.config".format(idsname),
+        "--output",
+        "-",
+    ] + batchargs
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    # Batched output has to be identical to the message by message output
+    check_with_validation_file(
+        "{}.ipal".format(idsname),
+        stdout.decode("utf-8"),
+        "test_default_config_ipal",
+    )
+
+
+def test_batch_timeout():
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.state",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/MinMax.config",
+        "--output",
+        "-",
+        "--batch-size",
+        "8",
+        "--batch-timeout",
+        "5",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    check_with_validation_file(
+        "MinMax.state",
+        stdout.decode("utf-8"),
+        "test_default_config_state",
+    )
+
+
+def test_batch_size_invalid():
+    errno, stdout, stderr = metaids(
+        ["--config", "misc/configs/MinMax.config", "--batch-size", "0"]
+    )
+    assert errno == 1
+    assert b"Option '--batch-size' must be a positive integer" in stderr
+
+
+@pytest.mark.parametrize("idsname", ["MinMax", "RandomForest", "Steadytime"])
+def test_live_workers(idsname):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/{}.config".format(idsname),
+        "--output",
+        "-",
+        "--live-workers",
+        "2",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    check_with_validation_file(
+        "{}.ipal".format(idsname),
+        stdout.decode("utf-8"),
+        "test_default_config_ipal",
+    )
+
+
+@pytest.mark.parametrize(
+    "idsname",
+    ["inter-arrival-mean", "inter-arrival-range", "Exists", "MinMax", "RandomForest"],
+)
+@pytest.mark.parametrize("shardkey", ["ids", "hosts"])
+def test_live_shards(idsname, shardkey):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/{}.config".format(idsname),
+        "--output",
+        "-",
+        "--live-shards",
+        "3",
+        "--shard-key",
+        shardkey,
+        "--batch-size",
+        "8",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    # The state of these IDSs is partitioned by the key, such that the output is unchanged
+    check_with_validation_file(
+        "{}.ipal".format(idsname),
+        stdout.decode("utf-8"),
+        "test_default_config_ipal",
+    )
+
+
+@pytest.mark.parametrize("idsname", ["inter-arrival-mean", "inter-arrival-range"])
+def test_live_shards_partitioned(idsname, tmp_path, config_file):
+    # Interleave the traffic of several hosts, each with its own inter-arrival times
+    for name in ["train", "test"]:
+        with open("misc/ipal/{}.ipal".format(name)) as f:
+            msgs = [json.loads(line) for line in f]
+
+        with open(tmp_path / "{}.ipal".format(name), "w") as f:
+            for msg in msgs:
+                timestamp = msg["timestamp"]
+                for host in range(1, 5):
+                    msg["src"] = "1.1.1.{}:1".format(host)
+                    msg["timestamp"] = timestamp + host / 10
+                    f.write(json.dumps(msg) + "\n")
+
+    args = [
+        "--retrain",
+        "--train.ipal",
+        str(tmp_path / "train.ipal"),
+        "--live.ipal",
+        str(tmp_path / "test.ipal"),
+        "--config",
+        config_file(idsname),
+        "--output",
+        "-",
+    ]
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+
+    errno, stdout, stderr = metaids(args + ["--live-shards", "3", "--batch-size", "8"])
+    assert errno == 0
+    assert stdout == expected
+
+
+@pytest.mark.parametrize("shardkey", ["src", "hosts"])
+def test_live_shards_single_partition(shardkey, workload_args):
+    # The state of Steadytime is shared by all hosts and must not be split by host
+    workload = Workload(hosts=4, sensors=8, discrete=0.5, cycle=20, attacks=3)
+    config = load_config("Steadytime")
+    del config["Steadytime"]["model-file"]
+    config["Steadytime"]["features"] = workload.features(discrete=True)
+
+    args = ["--retrain"] + workload_args(
+        config, workload.messages(2000), workload.messages(2000, run=1)
+    )
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+
+    args += ["--live-shards", "2", "--shard-key", shardkey, "--batch-size", "8"]
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+    assert stdout == expected
+
+
+def test_live_workers_killed(config_file):
+    p = Popen(
+        [METAIDS, "--retrain", "--train.ipal", "misc/ipal/train.ipal"]
+        + ["--live.ipal", "-", "--config", config_file("MinMax")]
+        + ["--output", "-", "--live-workers", "1", "--log", "info"],
+        stdin=PIPE,
+        stdout=PIPE,
+        stderr=PIPE,
+    )
+
+    # A worker that dies without reporting a result does not block the detection
+    for line in p.stderr:
+        if b"Live worker" in line and b"runs IDSs" in line:
+            os.kill(int(line.split(b"Live worker ")[1].split()[0]), signal.SIGKILL)
+            break
+    with open("misc/ipal/test.ipal", "rb") as f:
+        stdout, stderr = p.communicate(f.read(), timeout=60)
+
+    assert p.returncode == 1
+    assert b"exited with code -9" in stderr
+    assert (
+        b"CRITICAL:ipal-iids:Live worker failed. Stopping the live detection" in stderr
+    )
+
+
+def test_live_shards_invalid():
+    errno, stdout, stderr = metaids(
+        [
+            "--config",
+            "misc/configs/MinMax.config",
+            "--live-shards",
+            "2",
+            "--live-workers",
+            "2",
+        ]
+    )
+    assert errno == 1
+    assert b"cannot be combined" in stderr
+
+
+@pytest.mark.parametrize("combinername", ["Any", "Matrix"])
+def test_live_workers_combiner(combinername):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--train.combiner",
+        "misc/ipal/train-combiner.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/combiner-ids.config",
+        "--combiner.config",
+        "misc/configs/combiner-{}.config".format(combinername),
+        "--output",
+        "-",
+        "--live-workers",
+        "3",
+        "--batch-size",
+        "4",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    # Results are merged in order and have to match the single process output
+    check_with_validation_file(
+        "{}.ipal".format(combinername),
+        stdout.decode("utf-8"),
+        "test_default_config_combiner",
+    )
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson", "ujson"])
+def test_json_backend(backend):
+    if backend != "json":
+        pytest.importorskip(backend)
+
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.state",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/Steadytime.config",
+        "--output",
+        "-",
+        "--json-backend",
+        backend,
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    check_with_validation_file(
+        "Steadytime.state",
+        stdout.decode("utf-8"),
+        "test_default_config_state",
+    )
+
+
+def test_json_backend_default(config_file):
+    # The output does not depend on the installed JSON libraries
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.state",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("Steadytime"),
+        "--output",
+        "-",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+    errno, expected, stderr = metaids(args + ["--json-backend", "json"])
+    assert errno == 0
+    assert stdout == expected
+
+
+@pytest.mark.parametrize(
+    "flushargs",
+    [
+        ["--flush", "every-10"],
+        ["--flush", "every-5ms"],
+        ["--flush", "on-alert"],
+        ["--flush", "every-10", "--output-queue", "16", "--flush-latency", "50"],
+    ],
+)
+def test_flush_policy(flushargs):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        "misc/configs/MinMax.config",
+        "--output",
+        "-",
+    ] + flushargs
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    check_with_validation_file(
+        "MinMax.ipal",
+        stdout.decode("utf-8"),
+        "test_default_config_ipal",
+    )
+
+
+def test_flush_policy_invalid():
+    errno, stdout, stderr = metaids(
+        ["--config", "misc/configs/MinMax.config", "--flush", "every-0"]
+    )
+    assert errno == 1
+    assert b"Option '--flush' must be one of" in stderr
+
+
+def test_output_fields(config_file):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("Steadytime"),
+        "--output",
+        "-",
+    ]
+    fields = ["id", "timestamp", "ids", "alerts", "scores"]
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+    errno, stdout, _ = metaids(args + ["--output-fields", ",".join(fields)])
+    assert errno == 0
+
+    expected = without_config(expected)
+    projected = [json.loads(line) for line in stdout.decode("utf-8").splitlines()]
+    assert "_iids-config" in projected[0]
+    assert without_config(stdout) == [
+        {field: msg[field] for field in fields} for msg in expected
+    ]
+
+
+def test_output_alerts_only(config_file):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("Steadytime"),
+        "--output",
+        "-",
+    ]
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+    errno, stdout, stderr = metaids(
+        args + ["--output-alerts-only", "--output-summary", "10", "--log", "info"]
+    )
+    assert errno == 0
+
+    alerts = [msg for msg in without_config(expected) if msg["ids"]]
+    assert len(alerts) > 0
+    assert without_config(stdout) == alerts
+    assert "_iids-config" in json.loads(stdout.splitlines()[0])
+
+    assert b"Output summary: 10 messages" in stderr
+    assert "Output summary: 29 messages, {} alerts, {} written".format(
+        len(alerts), len(alerts)
+    ) in stderr.decode("utf-8")
+
+
+def test_output_alerts_only_extend_alarms(tmp_path):
+    msgs = [
+        {"id": i, "ids": i in [3, 8], "alerts": {}, "scores": {}} for i in range(10)
+    ]
+    msgs[6]["adjust"] = {"X": [[-3, True, 0.9], [-2, False, 0.1], [0, False, 0.2]]}
+    msgs[7]["adjust"] = {"X": [[-2, True, 0.8], [0, False, 0.3]]}
+
+    # Adjustments resolve to the same alerts as on the full output
+    for name, alerts_only in [("full", False), ("alerts", True)]:
+        with open(tmp_path / name, "w") as f:
+            writer = OutputWriter(f, alerts_only=alerts_only)
+            for msg in msgs:
+                writer.write(msg)
+            writer.close()
+
+        p = Popen([EXTENDALARMS, str(tmp_path / name)], stdout=PIPE, stderr=PIPE)
+        p.communicate()
+        assert p.returncode == 0
+
+    with open(tmp_path / "full") as f:
+        full = [json.loads(line) for line in f]
+    with open(tmp_path / "alerts") as f:
+        alerts = [json.loads(line) for line in f]
+
+    # Message 5 only alerts retroactively and is written right before message 7
+    assert [msg["id"] for msg in alerts] == [3, 6, 5, 7, 8]
+    assert alerts == [full[3], full[6], full[5], full[7], full[8]]
+    assert alerts[0]["alerts"] == {"X": True}
+    assert alerts[2]["alerts"] == {"X": True}
+
+
+def test_output_fields_invalid():
+    errno, stdout, stderr = metaids(
+        ["--config", "misc/configs/MinMax.config", "--output-fields", ","]
+    )
+    assert errno == 1
+    assert b"Option '--output-fields' must list at least one field" in stderr
+
+
+@pytest.mark.parametrize("swap", [False, True])
+def test_merge_live_inputs(swap, tmp_path, config_file):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--config",
+        config_file("Steadytime"),
+        "--output",
+        "-",
+    ]
+
+    errno, expected, _ = metaids(args + ["--live.ipal", "misc/ipal/test.ipal"])
+    assert errno == 0
+
+    # Split the live input into two taps
+    with open("misc/ipal/test.ipal") as f:
+        lines = f.readlines()
+    taps = [lines[0::2], lines[1::2]]
+
+    if swap:  # Slightly out of order within the second tap
+        taps[1][2], taps[1][3] = taps[1][3], taps[1][2]
+
+    for i, tap in enumerate(taps):
+        with open(tmp_path / "tap{}.ipal".format(i), "w") as f:
+            f.writelines(tap)
+
+    live = ["--live.ipal", str(tmp_path / "tap0.ipal")]
+    live += ["--live.ipal", str(tmp_path / "tap1.ipal")]
+    live += ["--live.reorder-window", "2"] if swap else []
+
+    errno, stdout, stderr = metaids(args + live)
+    assert errno == 0
+    assert without_config(stdout) == without_config(expected)
+
+
+def test_merge_ipal_and_state(config_file):
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--live.state",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("MinMax"),
+        "--output",
+        "-",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    # Each message is delivered as IPAL and as state message in timestamp order
+    timestamps = [msg["timestamp"] for msg in without_config(stdout)]
+    assert len(timestamps) == 2 * 29
+    assert timestamps == sorted(timestamps)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def connect(scheme, address):
+    # Wait until the live input listens for producers
+    for _ in range(300):
+        try:
+            if scheme == "unix":
+                s = socket.socket(socket.AF_UNIX)
+                s.connect(address)
+                return s
+            return socket.create_connection(address)
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError("Live input is not listening")
+
+
+@pytest.mark.parametrize("scheme", ["tcp", "unix"])
+def test_network_input(scheme, tmp_path, config_file):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--config",
+        config_file("Steadytime"),
+        "--output",
+        "-",
+    ]
+    errno, expected, _ = metaids(args + ["--live.ipal", "misc/ipal/test.ipal"])
+    assert errno == 0
+
+    if scheme == "unix":
+        address = str(tmp_path / "ipal.sock")
+        live = "unix://" + address
+    else:
+        address = ("127.0.0.1", free_port())
+        live = "tcp://127.0.0.1:{}".format(address[1])
+
+    p = Popen([METAIDS] + args + ["--live.ipal", live], stdout=PIPE, stderr=PIPE)
+
+    # Send the messages in pieces that do not align with the lines
+    with open("misc/ipal/test.ipal", "rb") as f:
+        data = f.read()
+    with connect(scheme, address) as s:
+        for i in range(0, len(data), 37):
+            s.sendall(data[i : i + 37])
+
+    time.sleep(1)
+    p.send_signal(signal.SIGTERM)
+    stdout, stderr = p.communicate(timeout=60)
+
+    assert p.returncode == 0
+    assert without_config(stdout) == without_config(expected)
+
+
+def test_network_input_producers(config_file):
+    port = free_port()
+    p = Popen(
+        [
+            METAIDS,
+            "--retrain",
+            "--train.ipal",
+            "misc/ipal/train.ipal",
+            "--live.ipal",
+            "tcp://127.0.0.1:{}".format(port),
+            "--live.queue-size",
+            "1",
+            "--config",
+            config_file("Exists"),
+            "--output",
+            "-",
+        ],
+        stdout=PIPE,
+        stderr=PIPE,
+    )
+
+    with open("misc/ipal/test.ipal", "rb") as f:
+        lines = f.readlines()
+
+    # Several concurrent producers, throttled by the small queue
+    producers = [connect("tcp", ("127.0.0.1", port)) for _ in range(3)]
+    for _ in range(50):
+        for s in producers:
+            s.sendall(b"".join(lines))
+    for s in producers:
+        s.close()
+
+    time.sleep(1)
+    p.send_signal(signal.SIGINT)
+    stdout, stderr = p.communicate(timeout=60)
+
+    assert p.returncode == 0
+    assert len(without_config(stdout)) == 3 * 50 * len(lines)
+
+
+@pytest.mark.parametrize("workers", [[], ["--live-workers", "1"]])
+def test_metrics(workers, tmp_path):
+    config = load_config("MinMax")
+    config["MinMax"]["model-file"] = str(tmp_path / "model")
+    config["MinMax"]["preprocessors"] = [
+        {"method": "minmax", "features": ["state;switch"]}
+    ]
+    with open(tmp_path / "MinMax.config", "w") as f:
+        json.dump(config, f)
+
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.state",
+        "-",
+        "--config",
+        str(tmp_path / "MinMax.config"),
+        "--output",
+        "-",
+    ] + workers
+
+    with open("misc/ipal/test.ipal", "rb") as f:
+        lines = f.read()
+
+    p = Popen([METAIDS] + args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    expected, _ = p.communicate(lines, timeout=60)
+    assert p.returncode == 0
+
+    port = free_port()
+    p = Popen(
+        [METAIDS]
+        + args
+        + ["--stats-file", str(tmp_path / "stats.json"), "--stats-interval", "0.1"]
+        + ["--metrics-port", str(port), "--metrics-sample", "1"],
+        stdin=PIPE,
+        stdout=PIPE,
+        stderr=PIPE,
+    )
+    p.stdin.write(lines)
+    p.stdin.flush()
+
+    # Metrics are served while the input is still open
+    for _ in range(300):
+        try:
+            with urlopen("http://127.0.0.1:{}/metrics".format(port)) as response:
+                metrics = response.read().decode("utf-8")
+            if "ipal_iids_messages_total 29" in metrics:
+                break
+        except OSError:
+            pass
+        time.sleep(0.1)
+    else:
+        pytest.fail("metrics endpoint did not report all messages")
+
+    # Time every batch
+    assert 'ipal_iids_latency_seconds_count{stage="ids",name="MinMax"} 29' in metrics
+    assert 'stage="preprocessor",name="MinMax.minmax"' in metrics
+    assert 'stage="decode",name="json"' in metrics
+
+    stdout, _ = p.communicate(timeout=60)
+    assert p.returncode == 0
+    assert without_config(stdout) == without_config(expected)
+
+    with open(tmp_path / "stats.json") as f:
+        stats = json.load(f)
+    assert stats["messages"] == 29
+    for stage in ["combiner", "decode", "encode", "ids", "preprocessor"]:
+        assert stage in stats["latency"]
+    assert stats["latency"]["ids"]["MinMax"]["count"] == 29
+    assert (
+        stats["latency"]["ids"]["MinMax"]["p50"]
+        <= stats["latency"]["ids"]["MinMax"]["max"]
+    )
+
+
+def test_metrics_nested_batches(tmp_path, config_file):
+    # new_ipal_batch of the classifiers calls new_state_batch, messages are timed once
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("RandomForest"),
+        "--output",
+        "-",
+        "--stats-file",
+        str(tmp_path / "stats.json"),
+        "--metrics-sample",
+        "1",
+    ]
+
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+
+    with open(tmp_path / "stats.json") as f:
+        stats = json.load(f)
+    assert stats["messages"] == 29
+    assert stats["latency"]["ids"]["RandomForest"]["count"] == 29
+
+
+def test_feature_plan_retry():
+    # The plan pauses after consecutive uncovered messages and is tried again afterwards
+    plan = FeaturePlan([["state", "a"]])
+    for _ in range(FeaturePlan.MISSES):
+        assert plan.extract({"state": {"a": "on"}}) is None
+
+    for _ in range(FeaturePlan.PAUSE):
+        assert plan.extract({"state": {"a": 1}}) is None
+    assert plan.extract({"state": {"a": 1}}) == [1.0]
+
+
+@pytest.mark.parametrize("batchargs", [["--batch-size", "1"], ["--batch-size", "8"]])
+def test_feature_extraction(batchargs, tmp_path):
+    # Values the compiled feature extraction does not cover fall back to the lookup of
+    # each feature: missing and None values, NaN (replaced by 0), and numeric strings
+    special = {3: "missing", 5: None, 7: "NaN", 9: "12", 11: 20}
+
+    for name in ["train", "test"]:
+        with open("misc/ipal/{}.ipal".format(name)) as f:
+            msgs = [json.loads(line) for line in f]
+        with open(tmp_path / "{}.ipal".format(name), "w") as f:
+            for i, msg in enumerate(msgs):
+                msg["state"]["level"] = 10 + i % 5
+                if name == "test" and i in special:
+                    msg["state"]["level"] = special[i]
+                    if special[i] == "missing":
+                        del msg["state"]["level"]
+                f.write(json.dumps(msg) + "\n")
+
+    config = load_config("MinMax")
+    config["MinMax"]["model-file"] = str(tmp_path / "model")
+    config["MinMax"]["features"] = ["state;switch", "state;level"]
+    config["MinMax"]["allow-none"] = True
+    with open(tmp_path / "MinMax.config", "w") as f:
+        json.dump(config, f)
+
+    errno, stdout, stderr = metaids(
+        ["--retrain", "--train.state", str(tmp_path / "train.ipal")]
+        + ["--live.state", str(tmp_path / "test.ipal")]
+        + ["--config", str(tmp_path / "MinMax.config"), "--output", "-"]
+        + batchargs
+    )
+    assert errno == 0
+    assert b"Found Nan in data" in stderr
+
+    msgs = [json.loads(line) for line in stdout.splitlines()]
+    assert [msg["id"] for msg in msgs if msg["alerts"]["MinMax"]] == [7, 11]
+    assert [msg["scores"]["MinMax"] for msg in msgs[:12]] == [0] * 7 + [10, 0, 0, 0, 6]
+
+
+@pytest.mark.parametrize("workers", [[], ["--live-workers", "1"]])
+def test_memory_limits(workers, tmp_path):
+    config = {}
+    for name in ["Exists", "MinMax"]:
+        config.update(load_config(name))
+        config[name]["model-file"] = str(tmp_path / name)
+    config["Exists"]["memory-soft-limit"] = "1"  # Evicts all keys
+    config["MinMax"]["memory-hard-limit"] = "1"  # Disables the IDS
+    with open(tmp_path / "memory.config", "w") as f:
+        json.dump(config, f)
+
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.state",
+        "misc/ipal/test.ipal",
+        "--config",
+        str(tmp_path / "memory.config"),
+        "--output",
+        "-",
+        "--memory-interval",
+        "0.000001",
+        "--stats-file",
+        str(tmp_path / "stats.json"),
+    ] + workers
+    errno, stdout, stderr = metaids(args)
+    assert errno == 0
+    assert b"Exists no longer checks" in stderr
+    assert b"MinMax exceeds its hard memory limit" in stderr
+
+    # The disabled IDS neither raises alerts nor scores messages
+    msgs = [json.loads(line) for line in stdout.splitlines()]
+    assert len(msgs) == 29
+    assert not any(msg["alerts"]["MinMax"] for msg in msgs)
+    assert msgs[-1]["scores"]["MinMax"] is None
+
+    with open(tmp_path / "stats.json") as f:
+        memory = json.load(f)["memory"]
+    assert memory["Exists"]["evictions"] >= 1
+    assert memory["Exists"]["bytes"] > 0
+    assert memory["MinMax"]["disabled"]
+
+    # Invalid limits are rejected
+    config["MinMax"]["memory-hard-limit"] = "lots"
+    with open(tmp_path / "memory.config", "w") as f:
+        json.dump(config, f)
+    errno, _, stderr = metaids(args)
+    assert errno == 1
+    assert b"memory-hard-limit" in stderr
+
+
+@pytest.mark.parametrize(
+    "workers,checkpoint",
+    [([], "checkpoint"), (["--live-workers", "2"], "checkpoint.gz")],
+)
+def test_checkpoint_resume(workers, checkpoint, tmp_path):
+    # Inter-arrival times and steady times of the workload depend on the previous messages
+    workload = Workload(hosts=2, sensors=4, discrete=0.5, cycle=20, attacks=2)
+    with open(tmp_path / "train.ipal", "w") as f:
+        f.writelines(json.dumps(msg) + "\n" for msg in workload.messages(2000))
+    live = [json.dumps(msg) + "\n" for msg in workload.messages(200, run=1)]
+    for name, lines in [("live", live), ("first", live[:100]), ("rest", live[100:])]:
+        with open(tmp_path / "{}.ipal".format(name), "w") as f:
+            f.writelines(lines)
+
+    config = {}
+    for name in ["Steadytime", "inter-arrival-mean"]:
+        config.update(load_config(name))
+        config[name]["model-file"] = str(tmp_path / name)
+    config["Steadytime"]["features"] = workload.features(discrete=True)
+    with open(tmp_path / "checkpoint.config", "w") as f:
+        json.dump(config, f)
+
+    def run(live, output, args=[]):
+        errno, _, stderr = metaids(
+            ["--train.ipal", str(tmp_path / "train.ipal")]
+            + ["--live.ipal", str(tmp_path / live)]
+            + ["--config", str(tmp_path / "checkpoint.config")]
+            + ["--output", str(tmp_path / output)]
+            + workers
+            + args
+        )
+        assert errno == 0
+        with open(tmp_path / output, "rb") as f:
+            return without_config(f.read())
+
+    expected = run("live.ipal", "expected.ipal", ["--retrain"])
+
+    # Restarting without the state of the IDSs misses the windows of the first run
+    cold = run("first.ipal", "cold.ipal") + run("rest.ipal", "cold.ipal")
+    assert len(cold) == len(expected)
+    assert cold != expected
+
+    # The resumed run skips the messages of the first run and continues its output
+    args = ["--checkpoint", str(tmp_path / checkpoint), "--checkpoint-interval", "0"]
+    run("first.ipal", "resumed.ipal", args)
+    assert run("live.ipal", "resumed.ipal", args + ["--resume"]) == expected
+
+    # A retrained model starts without its old state
+    run("first.ipal", "retrained.ipal", ["--retrain"] + args)
+    errno, _, stderr = metaids(
+        ["--retrain", "--train.ipal", str(tmp_path / "rest.ipal")]
+        + ["--live.ipal", str(tmp_path / "rest.ipal")]
+        + ["--config", str(tmp_path / "checkpoint.config")]
+        + args
+        + ["--resume"]
+    )
+    assert errno == 0
+    assert b"Model of Steadytime changed since the checkpoint" in stderr
+
+
+@pytest.mark.parametrize(
+    "trigger,workers", [("watch", False), ("sighup", False), ("watch", True)]
+)
+def test_daemon_reload(trigger, workers, tmp_path):
+    config = load_config("MinMax")
+    config["MinMax"]["model-file"] = "./MinMax.model"
+    with open(tmp_path / "daemon.config", "w") as f:
+        json.dump(config, f)
+
+    # Model B only knows the switch to be off
+    with open("misc/ipal/train.ipal") as f:
+        off = [line for line in f if json.loads(line)["state"]["switch"] == 0]
+    with open(tmp_path / "off.ipal", "w") as f:
+        f.writelines(off)
+
+    args = ["--config", str(tmp_path / "daemon.config"), "--output", "-"]
+    train_a = ["--retrain", "--train.state", "misc/ipal/train.ipal"]
+    train_b = ["--retrain", "--train.state", str(tmp_path / "off.ipal")]
+    live = ["--live.state", "misc/ipal/test.ipal"]
+
+    # Reference output of both models
+    errno, expected_b, _ = metaids(args + train_b + live)
+    assert errno == 0
+    errno, expected_a, _ = metaids(args + train_a + live)
+    assert errno == 0
+    assert without_config(expected_a) != without_config(expected_b)
+
+    reload = ["--reload-interval", "0.1" if trigger == "watch" else "1000"]
+    reload += ["--live-workers", "1"] if workers else []
+    p = Popen(
+        [METAIDS] + args + ["--live.state", "-", "--daemon"] + reload,
+        stdin=PIPE,
+        stdout=PIPE,
+        stderr=PIPE,
+    )
+
+    with open("misc/ipal/test.ipal", "rb") as f:
+        lines = f.readlines()
+    half = len(lines) // 2
+
+    # Detect the first half with model A
+    p.stdin.write(b"".join(lines[:half]))
+    p.stdin.flush()
+    stdout = [p.stdout.readline() for _ in range(half)]
+
+    # Retrain model B while the daemon keeps running
+    errno, _, _ = metaids(args + train_b)
+    assert errno == 0
+    if trigger == "sighup":
+        p.send_signal(signal.SIGHUP)
+    time.sleep(2)
+
+    # Detect the second half with model B
+    p.stdin.write(b"".join(lines[half:]))
+    p.stdin.close()
+    stdout = b"".join(stdout) + p.stdout.read()
+    p.wait(timeout=60)
+    assert p.returncode == 0
+
+    expected = without_config(expected_a)[:half] + without_config(expected_b)[half:]
+    assert without_config(stdout) == expected
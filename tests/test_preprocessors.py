@@ -0,0 +1,188 @@
+import copy
+import json
+
+import pytest
+
+from ipal_iids.workload import Workload
+from preprocessors.affine import fuse_affine
+from preprocessors.utils import get_all_preprocessors
+
+from .conftest import load_config, metaids
+
+
+def minmax_config(features, preprocessors):
+    return {"_type": "MinMax", "features": features, "preprocessors": preprocessors}
+
+
+@pytest.mark.parametrize("cacheargs", [[], ["--train-cache"]])
+def test_preprocessor_batches(cacheargs, tmp_path, workload_args):
+    workload = Workload(hosts=2, sensors=6, discrete=0.34, cycle=20)
+    messages = list(workload.messages(1000))
+
+    continuous = workload.features(discrete=False)
+    discrete = workload.features(discrete=True)
+    features = continuous + discrete
+    chains = {
+        "Scaled": [
+            {"method": "mean", "features": continuous},
+            {"method": "gradient", "features": continuous[:2]},
+            {"method": "label", "features": discrete},
+            {"method": "minmax", "features": features},
+        ],
+        "Aggregated": [
+            {"method": "minmax", "features": features},
+            {"method": "aggregate", "features": []},
+        ],
+        "Encoded": [
+            {"method": "categorical", "features": discrete},
+            {"method": "indicate-none", "features": continuous[:2]},
+            {"method": "aggregate", "features": []},
+        ],
+    }
+
+    config = {}
+    for name, chain in chains.items():
+        config[name] = minmax_config(features, chain)
+        config[name]["allow-none"] = True
+        config[name]["save-training"] = str(tmp_path / "{}.training".format(name))
+    args = ["--retrain"] + workload_args(config, messages)
+    if len(cacheargs) > 0:
+        args += cacheargs + [str(tmp_path / "cache")]
+    errno, _, _ = metaids(args)
+    assert errno == 0
+
+    # Training on batches is identical to preprocessing the messages one by one
+    for name, chain in chains.items():
+        events = [[float(msg["state"][f[6:]]) for f in features] for msg in messages]
+        for pre in chain:
+            preprocessor = get_all_preprocessors()[pre["method"]](
+                [f in pre["features"] for f in features]
+            )
+            preprocessor.fit(events)
+            events = [preprocessor.transform(e) for e in events]
+            events = [e for e in events if e is not None]
+
+        # Encoded values are flattened into the feature vector
+        events = [
+            [v for value in e for v in (value if isinstance(value, list) else [value])]
+            for e in events
+        ]
+
+        with open(tmp_path / "{}.training".format(name)) as f:
+            training = [list(json.loads(line)["state"].values()) for line in f]
+        assert training == events
+
+
+@pytest.mark.parametrize(
+    "chain,stages",
+    [
+        (["mean", "minmax"], ["mean+minmax"]),
+        (["minmax", "pca"], ["minmax+pca"]),
+        (["mean", "minmax", "pca", "mean"], ["mean+minmax+pca+mean"]),
+        (["pca", "minmax"], ["pca", "minmax"]),
+        (["mean", "gradient", "minmax"], ["mean", "gradient", "minmax"]),
+    ],
+)
+def test_fused_preprocessors(chain, stages):
+    # Live values of the attacks exceed the trained ranges of the minmax preprocessors
+    workload = Workload(hosts=2, sensors=6, discrete=0.34, cycle=20, attacks=3)
+    features = workload.features()
+    values = [
+        [msg["state"][f[6:]] for f in features] for msg in workload.messages(1000)
+    ]
+    live = [
+        [msg["state"][f[6:]] for f in features] for msg in workload.messages(200, run=1)
+    ]
+
+    preprocessors = []
+    for method in chain:
+        preprocessor = get_all_preprocessors()[method]([True] * len(features))
+        preprocessor.fit(values)
+        values = [preprocessor.transform(v) for v in values]
+        preprocessors.append(preprocessor)
+        preprocessor.reset()
+
+    fused = fuse_affine(copy.deepcopy(preprocessors))
+    assert [stage._name for stage in fused] == stages
+
+    # Per-feature stages give identical results, matrices differ by rounding only
+    for value in live:
+        expected = list(value)
+        for preprocessor in preprocessors:
+            expected = preprocessor.transform(expected)
+        for stage in fused:
+            value = stage.transform(value)
+
+        if "pca" in chain:
+            assert value == pytest.approx(list(expected))
+        else:
+            assert value == expected
+
+
+@pytest.mark.parametrize(
+    "policy,alerts", [("code", [10, 20]), ("none", [20]), ("drop", [])]
+)
+def test_label_unknown_values(policy, alerts, workload_args):
+    # Message 10 holds an unknown label, message 20 additionally an out of range value
+    workload = Workload(hosts=2, sensors=4, discrete=0.5, cycle=20)
+    train = list(workload.messages(400))
+    discrete = workload.features(discrete=True)
+    continuous = workload.features(discrete=False)
+
+    live = copy.deepcopy(train[:50])
+    for i in [10, 20]:
+        live[i]["state"][discrete[0][6:]] = 99
+    live[20]["state"][continuous[0][6:]] = 1e6
+
+    # MinMax ignores None values if allowed, such that message 20 still alerts
+    label = {"method": "label", "features": discrete, "unknown": policy}
+    config = {"MinMax": minmax_config(discrete + continuous, [label])}
+    config["MinMax"]["allow-none"] = True
+    args = workload_args(config, train, live)
+
+    # Policies apply to models loaded from disk as well
+    for retrain in [["--retrain"], []]:
+        errno, stdout, stderr = metaids(retrain + args)
+        assert errno == 0
+        assert b"Value 99.0 not in trained categories" in stderr
+
+        msgs = [json.loads(line) for line in stdout.splitlines()]
+        assert [msg["id"] for msg in msgs if msg["alerts"]["MinMax"]] == alerts
+
+    # Unknown policies are rejected
+    label["unknown"] = "ignore"
+    errno, _, stderr = metaids(["--retrain"] + workload_args(config, train, live))
+    assert errno == 1
+    assert b"Unknown value policy" in stderr
+
+
+@pytest.mark.parametrize("idsname", ["NaiveBayes", "RandomForest"])
+def test_label_unknown_none_classifier(idsname, workload_args):
+    # Classifiers cannot handle None, messages with unknown labels are skipped
+    workload = Workload(hosts=2, sensors=4, discrete=0.5, cycle=20)
+    train = list(workload.messages(400))
+    for i, msg in enumerate(train):
+        msg["malicious"] = i % 7 == 0
+    discrete = workload.features(discrete=True)
+
+    live = copy.deepcopy(train[:50])
+    live[10]["state"][discrete[0][6:]] = 99
+
+    config = load_config(idsname)
+    del config[idsname]["model-file"]
+    config[idsname]["features"] = discrete
+    config[idsname]["preprocessors"] = [
+        {"method": "label", "features": discrete, "unknown": "none"}
+    ]
+    for batchargs in [[], ["--batch-size", "8"]]:
+        errno, stdout, stderr = metaids(
+            ["--retrain", "--log", "info"]
+            + workload_args(config, train, live)
+            + batchargs
+        )
+        assert errno == 0
+        assert b"None in preprocessed state. Skipping message" in stderr
+
+        msgs = [json.loads(line) for line in stdout.splitlines()]
+        assert len(msgs) == 50
+        assert msgs[10]["alerts"][idsname] is False
@@ -0,0 +1,49 @@
+import sys
+from subprocess import PIPE, Popen
+
+import pytest
+
+from .conftest import METAIDS
+
+HEAVY_MODULES = ["tensorflow", "keras", "torch", "gurobipy", "sklearn"]
+CONFIG = "misc/configs/MinMax.config"  # Written to tmp_path by the test
+
+
+def imported_modules(args):
+    # Run ipal-iids with python's import tracing and collect all top-level modules
+    p = Popen(
+        [sys.executable, "-X", "importtime", METAIDS] + args, stdout=PIPE, stderr=PIPE
+    )
+    stdout, stderr = p.communicate()
+
+    modules = set()
+    for line in stderr.decode("utf-8").splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.split("|")[-1].strip().split(".")[0])
+
+    return p.returncode, modules
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--version"],
+        ["--default.config", "MinMax"],
+        [
+            "--retrain",
+            "--train.state",
+            "misc/ipal/train.ipal",
+            "--live.state",
+            "misc/ipal/test.ipal",
+            "--config",
+            CONFIG,
+        ],
+    ],
+)
+def test_startup_without_heavy_imports(args, config_file):
+    args = [config_file("MinMax") if arg == CONFIG else arg for arg in args]
+    errno, modules = imported_modules(args)
+
+    assert errno == 0
+    for module in HEAVY_MODULES:
+        assert module not in modules, "{} imported during startup".format(module)
@@ -0,0 +1,187 @@
+import json
+import pstats
+from subprocess import PIPE, Popen
+
+import pytest
+
+from .conftest import METAIDS, load_config, metaids, without_config
+
+
+@pytest.mark.parametrize("combinername", ["Any", "Matrix"])
+def test_shared_training_stdin(combinername, config_file):
+    args = [
+        "--retrain",
+        "--train.combiner",
+        "misc/ipal/train-combiner.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("combiner-ids"),
+        "--combiner.config",
+        config_file("combiner-" + combinername),
+        "--output",
+        "-",
+        "--log",
+        "info",
+    ]
+
+    errno, expected, _ = metaids(args + ["--train.ipal", "misc/ipal/train.ipal"])
+    assert errno == 0
+
+    # All IDSs train on a single pass over stdin without a temporary copy
+    with open("misc/ipal/train.ipal", "rb") as f:
+        p = Popen(
+            [METAIDS] + args + ["--train.ipal", "-"], stdin=f, stdout=PIPE, stderr=PIPE
+        )
+        stdout, stderr = p.communicate()
+
+    assert p.returncode == 0
+    assert b"Copying training stdin to temporary file" not in stderr
+    assert b"on a shared pass over -" in stderr
+    assert without_config(stdout) == without_config(expected)
+
+
+@pytest.mark.parametrize("idsname", ["Exists", "Kitsune", "MinMax", "RandomForest"])
+def test_train_cache(idsname, tmp_path, config_file):
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file(idsname),
+        "--output",
+        "-",
+        "--log",
+        "info",
+    ]
+    cache = ["--train-cache", str(tmp_path)]
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+
+    # The first run builds the cache, the second one reuses it
+    errno, stdout, stderr = metaids(args + cache)
+    assert errno == 0
+    assert b"Building training cache" in stderr
+    assert stdout == expected
+
+    errno, stdout, stderr = metaids(args + cache)
+    assert errno == 0
+    assert b"Using training cache" in stderr
+    assert stdout == expected
+
+
+def test_train_jobs(config_file):
+    # Combine several IDSs with a model file each into one configuration
+    config = {}
+    for idsname in ["Exists", "Histogram", "MinMax", "RandomForest", "Steadytime"]:
+        for name, ids in load_config(idsname).items():
+            ids["model-file"] = "./{}.model".format(name)
+            config[name] = ids
+
+    args = [
+        "--retrain",
+        "--train.ipal",
+        "misc/ipal/train.ipal",
+        "--live.ipal",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("train-jobs", config),
+        "--output",
+        "-",
+        "--log",
+        "info",
+    ]
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+
+    # Models trained in parallel are loaded back for the live detection
+    errno, stdout, stderr = metaids(args + ["--train-jobs", "3"])
+    assert errno == 0
+    assert b"Training 5 IDSs in 3 processes" in stderr
+    assert stdout == expected
+
+
+@pytest.mark.parametrize(
+    "profileargs",
+    [[], ["--train-jobs", "2", "--live-workers", "2"], ["--live-shards", "2"]],
+)
+def test_profile(profileargs, tmp_path, config_file):
+    config = {}
+    for idsname in ["Histogram", "MinMax"]:
+        for name, ids in load_config(idsname).items():
+            ids["model-file"] = "./{}.model".format(name)
+            config[name] = ids
+
+    args = [
+        "--retrain",
+        "--train.state",
+        "misc/ipal/train.ipal",
+        "--live.state",
+        "misc/ipal/test.ipal",
+        "--config",
+        config_file("profile", config),
+        "--output",
+        "-",
+    ]
+
+    errno, expected, _ = metaids(args)
+    assert errno == 0
+
+    profiledir = tmp_path / "profile"
+    errno, stdout, _ = metaids(
+        args + profileargs + ["--profile", "all", "--profile-dir", str(profiledir)]
+    )
+    assert errno == 0
+    assert without_config(stdout) == without_config(expected)
+
+    # One profile per IDS and phase, including those of worker processes
+    assert sorted(p.name for p in profiledir.iterdir()) == [
+        "Histogram.live.pstats",
+        "Histogram.train.pstats",
+        "MinMax.live.pstats",
+        "MinMax.train.pstats",
+        "profile.collapsed",
+    ]
+
+    stats = pstats.Stats(str(profiledir / "MinMax.live.pstats"))
+    calls = {func[2]: entry[1] for func, entry in stats.stats.items()}
+    assert calls["new_state_msg"] == 29
+
+    with open(profiledir / "profile.collapsed") as f:
+        stacks = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+    assert {stack.split(";")[0] for stack, _ in stacks} == {"train", "live"}
+    assert {stack.split(";")[1] for stack, _ in stacks} == {"Histogram", "MinMax"}
+    assert all(int(value) >= 1 for _, value in stacks)
+
+
+def test_profile_sampler(tmp_path, config_file):
+    errno, _, _ = metaids(
+        [
+            "--retrain",
+            "--train.state",
+            "misc/ipal/train.ipal",
+            "--live.state",
+            "misc/ipal/test.ipal",
+            "--config",
+            config_file("MinMax"),
+            "--profile",
+            "live",
+            "--profile-sampler",
+            "1",
+            "--profile-dir",
+            str(tmp_path),
+        ]
+    )
+    assert errno == 0
+    assert (tmp_path / "live-samples.collapsed").exists()
+    assert not (tmp_path / "MinMax.live.pstats").exists()
+
+    errno, _, stderr = metaids(
+        ["--config", "misc/configs/MinMax.config", "--profile-sampler", "1"]
+    )
+    assert errno == 1
+    assert b"Option '--profile-sampler' requires" in stderr